@@ -0,0 +1,210 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Benchmarks of the data handling in the example scripts, no P1125 is required.
+
+    $python3 p1125_bench.py serialize
+    $python3 p1125_bench.py serialize --points 24000 720000 --json
+    $python3 p1125_bench.py stats --captures 100
+
+serialize:
+    bokeh document serialization time (standalone html, as used by show()) and
+    websocket bytes/time per ColumnDataSource update (bokeh serve), for plot data
+    as Python lists, float64 and float32 numpy arrays, see p1125_decimate.bokeh_arrays()
+
+stats:
+    capture statistics (min, max, avg, sigma, pass/fail) per capture, the Python
+    list/statistics.pstdev implementation of p1125_example_plot_cal_loads.py versus
+    p1125_stats.capture_stats(), one capture at a time and as a batch
+
+Requirements:
+1) Python 3.6+, numpy and bokeh 2.4.3 (pip3 install bokeh) or greater installed.
+"""
+import json
+import statistics
+import time
+import argparse
+import logging
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+FORMAT = "%(asctime)s: %(funcName)20s %(lineno)4s - %(levelname)-5.5s : %(message)s"
+formatter = logging.Formatter(FORMAT)
+consoleHandler = logging.StreamHandler()
+consoleHandler.setFormatter(formatter)
+logger.addHandler(consoleHandler)
+
+
+def _timeit(func, repeat):
+    """ best of repeat runs
+
+    :return: seconds, result of last run
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best: best = elapsed
+
+    return best, result
+
+
+def _plot_data(points, kind):
+    """ synthetic mAhr window, 10ms samples
+
+    :param points: number of samples
+    :param kind: 'list', 'float64' or 'float32'
+    :return: dict {'t': ..., 'i': ..., 'i_max': ...}
+    """
+    from p1125_decimate import bokeh_arrays
+
+    rng = np.random.default_rng(0)
+    i = rng.lognormal(3, 2, points)
+    data = {"t": np.arange(points) * 0.01, "i": i, "i_max": i * 1.5}
+    if kind == "list": return {key: value.tolist() for key, value in data.items()}
+    if kind == "float32": return bokeh_arrays(data)
+    return data
+
+
+def serialize(args):
+    from bokeh.document import Document
+    from bokeh.embed import file_html
+    from bokeh.models import ColumnDataSource
+    from bokeh.plotting import figure
+    from bokeh.protocol import Protocol
+    from bokeh.resources import CDN
+
+    results = []
+    for points in args._points:
+        for kind in ["list", "float64", "float32"]:
+            data = _plot_data(points, kind)
+
+            # standalone, as used by show()
+            plot = figure()
+            plot.line(x="t", y="i", source=ColumnDataSource(data=data))
+            html_s, html = _timeit(lambda: file_html(plot, CDN), args._repeat)
+
+            # bokeh serve, one ColumnDataSource update
+            doc = Document()
+            source = ColumnDataSource(data={key: [] for key in data})
+            plot = figure()
+            plot.line(x="t", y="i", source=source)
+            doc.add_root(plot)
+            events = []
+            doc.on_change(lambda event: events.append(event))
+            source.data = data
+
+            ws_s, msg = _timeit(lambda: Protocol().create("PATCH-DOC", events), args._repeat)
+            ws_bytes = len(msg.header_json) + len(msg.metadata_json) + len(msg.content_json) + \
+                       sum(len(payload) for _, payload in msg.buffers)
+
+            results.append({"points": points, "kind": kind, "html_s": html_s, "html_bytes": len(html),
+                            "ws_s": ws_s, "ws_bytes": ws_bytes})
+
+    if args._json:
+        for r in results: print(json.dumps(r))
+        return True
+
+    print("{:>9} {:>8} {:>10} {:>12} {:>10} {:>12}".format("points", "kind", "html s", "html bytes", "ws s", "ws bytes"))
+    for r in results:
+        print("{points:9d} {kind:>8} {html_s:10.4f} {html_bytes:12d} {ws_s:10.4f} {ws_bytes:12d}".format(**r))
+
+    return True
+
+
+def _stats_python(i, expected_ua, avg_samples):
+    """ capture statistics as computed before p1125_stats.capture_stats() """
+    _min, _max = min(i), max(i)
+    avg = sum(i[0:avg_samples]) / avg_samples
+    sigma = statistics.pstdev(i)
+    avg_error_percent = abs(avg - expected_ua) / expected_ua * 100.0
+    return _min, _max, avg, sigma, avg_error_percent <= 5.0 and sigma * 100.0 / expected_ua <= 2.0
+
+
+def stats(args):
+    from p1125_stats import capture_stats, AVG_NUM_SAMPLES
+
+    rng = np.random.default_rng(0)
+    expected = rng.uniform(10.0, 100000.0, args._captures)
+    batch = expected[:, None] * (1.0 + rng.standard_normal((args._captures, args._points)) * 0.01)
+    lists = [row.tolist() for row in batch]
+
+    python_s, _ = _timeit(lambda: [_stats_python(i, e, AVG_NUM_SAMPLES) for i, e in zip(lists, expected)], args._repeat)
+    single_s, _ = _timeit(lambda: [capture_stats(i, e) for i, e in zip(lists, expected)], args._repeat)
+    batch_s, _ = _timeit(lambda: capture_stats(batch, expected), args._repeat)
+
+    results = [{"method": method, "points": args._points, "captures": args._captures, "s": elapsed,
+                "per_capture_ms": elapsed / args._captures * 1000.0, "speedup": python_s / elapsed}
+               for method, elapsed in [("python", python_s), ("capture_stats", single_s), ("capture_stats_batch", batch_s)]]
+
+    if args._json:
+        for r in results: print(json.dumps(r))
+        return True
+
+    print("{:>20} {:>9} {:>9} {:>10} {:>14} {:>8}".format("method", "points", "captures", "s", "ms/capture", "speedup"))
+    for r in results:
+        print("{method:>20} {points:9d} {captures:9d} {s:10.4f} {per_capture_ms:14.4f} {speedup:8.1f}".format(**r))
+
+    return True
+
+
+if __name__ == "__main__":
+    epilog = """
+    Usage examples:
+       python3 p1125_bench.py serialize
+       python3 p1125_bench.py serialize --points 24000 720000 --json
+       python3 p1125_bench.py stats --captures 100
+    """
+    parser = argparse.ArgumentParser(description='p1125 benchmarks',
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=epilog)
+    parser.add_argument("-r", "--repeat", dest="_repeat", default=3, type=int, help='repeat each benchmark, best is reported')
+    parser.add_argument("--json", dest="_json", action='store_true', help='output JSON lines')
+
+    subp = parser.add_subparsers(dest="_cmd", help='benchmarks')
+
+    serialize_parser = subp.add_parser('serialize')
+    serialize_parser.add_argument('-p', '--points', dest="_points", nargs='+', type=int, default=[24000, 720000],
+                                  help='samples per window')
+
+    stats_parser = subp.add_parser('stats')
+    stats_parser.add_argument('-p', '--points', dest="_points", type=int, default=24000, help='samples per capture')
+    stats_parser.add_argument('-c', '--captures', dest="_captures", type=int, default=100, help='number of captures')
+
+    args = parser.parse_args()
+
+    if args._cmd == 'serialize':
+        success = serialize(args)
+
+    elif args._cmd == 'stats':
+        success = stats(args)
+
+    else:
+        parser.print_help()
+        success = True
+
+    if not success: logger.error("failed")
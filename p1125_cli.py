@@ -39,7 +39,34 @@ Typical sequence of commands,
     $python3 p1125_cli.py acquire --start
     $python3 p1125_cli.py acquire --triggered   # continue only if triggered
     $python3 p1125_cli.py probe --disconnect
-    $python3 p1125_cli.py plot_data
+    $python3 p1125_cli.py plot_data --out capture.csv
+
+plot_data and intcurr --data log a summary of the data, --out writes the arrays
+to a .csv, .npy or compact float32 .bin file, optionally downsampled,
+
+    $python3 p1125_cli.py intcurr --set 600
+    $python3 p1125_cli.py intcurr --complete    # continue only if complete
+    $python3 p1125_cli.py intcurr --data --out window.bin --downsample 10
+
+Many commands can be run in one process, over one keep-alive connection, from
+a file, stdin or interactively, with the time of every command logged,
+
+    $python3 p1125_cli.py --script flow.txt     # one command per line, '#' comments
+    $cat flow.txt | python3 p1125_cli.py --script -
+    $python3 p1125_cli.py repl                  # 'quit' or Ctrl-D to exit
+
+Any command can be run on many P1125s at the same time, the results are printed
+as a table, one row per P1125, or as JSON lines,
+
+    $python3 p1125_cli.py --hosts p1125-a12b.local,p1125-c34d.local status
+    $python3 p1125_cli.py --hosts-file lab.txt --json probe --disconnect
+    $python3 p1125_cli.py --discover ping      # P1125s found with zeroconf, see p1125_find.py
+
+bench times read only methods, latency percentiles, requests/s, response size
+and decode time, on P1125_URL, each of --hosts, or a local stand-in server,
+
+    $python3 p1125_cli.py bench --methods ping status plot_data --iterations 200 --concurrency 1 4 16
+    $python3 p1125_cli.py --json bench --standin --methods intcurr_data >> bench.jsonl
 
 Help is available,
 
@@ -49,11 +76,20 @@ Help is available,
     ...
 
 """
+import os
+import sys
+import json
+import time
+import shlex
+import datetime
+import threading
 import requests
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
-from p1125api import P1125API
+from P1125 import P1125API
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -68,13 +104,41 @@ P1125_URL = "p115-####.local"  # for example, p115-a12b.local, or 192.168.0.123
 P1125_API = "/api/V1"
 URL = "http://" + P1125_URL + P1125_API
 
+FLEET_JOBS = 32           # default maximum number of P1125s accessed at the same time with --hosts/--discover
+DISCOVER_TIME_S = 3.0     # default time to listen for P1125 zeroconf announcements, see p1125_find.py
+FLEET_TIMEOUT_S = 5.0     # default request timeout with --hosts/--discover, so one dead P1125 does not hang the run
+
+
+EXPORT_FORMATS = [".csv", ".npy", ".bin"]  # plot_data/intcurr --out file extensions
 
-if "p115-####.local" in P1125_URL:
-    logger.error("Please set P1125_URL with valid IP/Hostname")
-    exit(1)
+_sessions = {}                # url: requests.Session, keep-alive, shared by every command of a --script or repl run
+_sessions_lock = threading.Lock()
+_context = threading.local()  # per thread, with --hosts: url, response and fleet=True
+timeout_s = None              # --timeout, seconds, None for the default, see _post()
+
+
+def _post(payload):
+    url = getattr(_context, "url", URL)
+    with _sessions_lock:
+        if url not in _sessions: _sessions[url] = requests.Session()
+        session = _sessions[url]
+
+    timeout = FLEET_TIMEOUT_S if timeout_s is None and getattr(_context, "fleet", False) else timeout_s
+    response = session.post(url, json=payload, timeout=timeout).json()
+    _context.response = response
+    return response
+
+
+def _result(response):
+    """ The result of a response as a dict, the P1125 returns it JSON encoded, see P1125._response() """
+    result = response.get("result", {})
+    return json.loads(result) if isinstance(result, str) else result
 
 
 def _log_response(response):
+    if getattr(_context, "fleet", False):  # the fleet table shows the response
+        return "error" not in response
+
     if "error" in response:
         logger.error(response['error'])
         return False
@@ -85,13 +149,13 @@ def _log_response(response):
 
 def ping(args):
     payload = {"method": "V1.ping", "jsonrpc": "2.0", "id": 0,}
-    response = requests.post(URL, json=payload).json()
+    response = _post(payload)
     return _log_response(response)
 
 
 def status(args):
     payload = {"method": "V1.status", "jsonrpc": "2.0", "id": 0,}
-    response = requests.post(URL, json=payload).json()
+    response = _post(payload)
     return _log_response(response)
 
 
@@ -99,17 +163,17 @@ def cal(args):
 
     if args._start:
         payload = {"method": "V1.cal", "jsonrpc": "2.0", "id": 0, }
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
     elif args._status:
         payload = {"method": "V1.cal_status", "jsonrpc": "2.0", "id": 0, }
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
     elif args._values:
         payload = {"method": "V1.cal_values", "jsonrpc": "2.0", "id": 0, }
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
     else:
@@ -120,26 +184,26 @@ def vout(args):
     if args._set:
         payload = {"method": "V1.vout", "jsonrpc": "2.0", "id": 0,
                    "params": {"value": args._set}}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
 
 def probe(args):
     if args._status:
         payload = {"method": "V1.probe_status", "jsonrpc": "2.0", "id": 0,}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
     elif args._connect:
         payload = {"method": "V1.probe_connect", "jsonrpc": "2.0", "id": 0,
                    "params": {"value": True}}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
     elif args._disconnect:
         payload = {"method": "V1.probe_connect", "jsonrpc": "2.0", "id": 0,
                    "params": {"value": False}}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
 
@@ -150,31 +214,165 @@ def trig(args):
                           "slope": args._slope,
                           "level": float(args._level)}
                }
-    response = requests.post(URL, json=payload).json()
+    response = _post(payload)
     return _log_response(response)
 
 
 def acquire(args):
     if args._start:
         payload = {"method": "V1.acquire_start", "jsonrpc": "2.0", "id": 0,}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
     elif args._stop:
         payload = {"method": "V1.acquire_stop", "jsonrpc": "2.0", "id": 0,}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
     elif args._triggered:
         payload = {"method": "V1.acquire_is_triggered", "jsonrpc": "2.0", "id": 0,}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
 
+def _downsample(data, factor):
+    """ Reduce every factor samples to one, 't' is the first of each block,
+    'i_max' the max, and any other key the mean
+
+    :param data: dict of numpy arrays
+    :param factor: samples per block
+    :return: dict of numpy arrays
+    """
+    import numpy as np
+
+    n = len(data["t"])
+    if factor <= 1 or n == 0: return data
+
+    starts = np.arange(0, n, factor)
+    counts = np.diff(np.append(starts, n))
+    out = {}
+    for key, values in data.items():
+        if key == "t": out[key] = values[starts]
+        elif key == "i_max": out[key] = np.maximum.reduceat(values, starts)
+        else: out[key] = (np.add.reduceat(values.astype(np.float64), starts) / counts).astype(values.dtype)
+
+    return out
+
+
+def _export(data, path, downsample=1):
+    """ Write plot arrays to a file, the format is chosen by the extension
+
+    - .csv, a header line of the keys, then one row per sample
+    - .npy, numpy structured array, one float32 field per key, np.load(path)
+    - .bin, a JSON header line {"columns": [...], "dtype": "<f4", "rows": N},
+      then the rows as little endian float32, see load_bin()
+
+    :param data: plot data, {'t': [...], 'i': [...], ...}
+    :param path: output file
+    :param downsample: keep one sample in downsample, see _downsample()
+    :return: rows written
+    """
+    import numpy as np
+    from p1125_decimate import bokeh_arrays
+
+    ext = os.path.splitext(path)[1].lower()
+    data = _downsample(bokeh_arrays(data), downsample)
+    keys = list(data.keys())
+    rows = np.empty(len(data["t"]), dtype=[(key, "<f4") for key in keys])
+    for key in keys: rows[key] = data[key]
+
+    if ext == ".csv":
+        np.savetxt(path, rows.view("<f4").reshape(-1, len(keys)), fmt="%.7g", delimiter=",",
+                   header=",".join(keys), comments="")
+
+    elif ext == ".npy":
+        np.save(path, rows)
+
+    else:
+        with open(path, "wb") as f:
+            f.write((json.dumps({"columns": keys, "dtype": "<f4", "rows": int(rows.size)}) + "\n").encode())
+            rows.tofile(f)
+
+    return rows.size
+
+
+def _out_path(path):
+    """ argparse type of --out, the extension must be one of EXPORT_FORMATS """
+    if os.path.splitext(path)[1].lower() not in EXPORT_FORMATS:
+        raise argparse.ArgumentTypeError("unknown format {}, one of {}".format(path, EXPORT_FORMATS))
+    return path
+
+
+def load_bin(path):
+    """ Read a .bin file written by _export()
+
+    :param path: file
+    :return: dict of numpy arrays
+    """
+    import numpy as np
+
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        rows = np.fromfile(f, dtype=[(key, header["dtype"]) for key in header["columns"]], count=header["rows"])
+
+    return {key: rows[key] for key in header["columns"]}
+
+
+def _log_data(response, data, args):
+    """ Log a data response, or export its arrays with --out, instead of logging every sample
+
+    :param response: JSON-RPC response
+    :param data: the plot arrays of the result, {'t': [...], 'i': [...], ...}
+    :param args: with _out and _downsample
+    :return: success <True/False>
+    """
+    if "error" in response:
+        logger.error(response['error'])
+        return False
+
+    fleet = getattr(_context, "fleet", False)
+    scalars = {key: value for key, value in _result(response).items() if not isinstance(value, (list, dict))}
+    t = data.get("t", [])
+    if not fleet: logger.info("{}, {} samples{}".format(scalars, len(t), ", t {} - {}".format(t[0], t[-1]) if t else ""))
+    if not args._out: return True
+
+    path = args._out
+    if fleet:  # one file per P1125, <name>_<host>.<ext>
+        name, ext = os.path.splitext(path)
+        path = "{}_{}{}".format(name, _context.host.replace(":", "_"), ext)
+
+    start = time.perf_counter()
+    rows = _export({key: data[key] for key in data if len(data[key]) == len(t)}, path, args._downsample)
+    if not fleet: logger.info("{} rows written to {} in {:.3f} s".format(rows, path, time.perf_counter() - start))
+    return True
+
+
 def plotdata(args):
     payload = {"method": "V1.plot_data", "jsonrpc": "2.0", "id": 0,}
-    response = requests.post(URL, json=payload).json()
-    return _log_response(response)
+    response = _post(payload)
+    result = _result(response)
+    return _log_data(response, {key: result[key] for key in ["t", "i"] if key in result}, args)
+
+
+def intcurr(args):
+    if args._set:
+        payload = {"method": "V1.intcurr_set", "jsonrpc": "2.0", "id": 0,
+                   "params": {"time_stop_s": int(args._set)}}
+        response = _post(payload)
+        return _log_response(response)
+
+    elif args._complete:
+        payload = {"method": "V1.intcurr_complete", "jsonrpc": "2.0", "id": 0,}
+        response = _post(payload)
+        return _log_response(response)
+
+    elif args._data:
+        payload = {"method": "V1.intcurr_data", "jsonrpc": "2.0", "id": 0,}
+        response = _post(payload)
+        return _log_data(response, _result(response).get("plot", {}), args)
+
+    else:
+        logger.error("unknown argument: {}".format(args))
 
 
 def timebase(args):
@@ -182,7 +380,7 @@ def timebase(args):
         payload = {"method": "V1.timebase", "jsonrpc": "2.0", "id": 0,
                    "params": {"span": args._span,}
                   }
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
 
@@ -191,15 +389,358 @@ def calload(args):
         loads = args._load.split(',')
         payload = {"method": "V1.cal_load", "jsonrpc": "2.0", "id": 0,
                    "params": {"loads": loads}}
-        response = requests.post(URL, json=payload).json()
+        response = _post(payload)
         return _log_response(response)
 
 
-if __name__ == "__main__":
+BENCH_METHODS = ["V1.ping", "V1.status", "V1.cal_status", "V1.probe_status", "V1.acquire_is_triggered",
+                 "V1.intcurr_complete", "V1.plot_data", "V1.intcurr_data"]  # read only, safe to repeat
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ Local stand-in for a P1125, answers BENCH_METHODS with synthetic results,
+    JSON encoded like a P1125 (see P1125._response()), sized like a 100ms plot_data
+    capture and a 30s intcurr_data window
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+    bodies = {}                    # method: response body, built once
+
+    @classmethod
+    def build(cls):
+        t_ms = [n / 48.0 for n in range(4800)]
+        t_s = [n * 0.01 for n in range(3000)]
+        results = {
+            "V1.ping": {"success": True, "version": "stand-in", "rpi_serial": "00000000", "url": "127.0.0.1"},
+            "V1.status": {"success": True, "aqc_in_progress": False, "cal_done": True, "probe_connected": False},
+            "V1.cal_status": {"success": True, "cal_done": True},
+            "V1.probe_status": {"success": True, "connected": False},
+            "V1.acquire_is_triggered": {"success": True, "triggered": True},
+            "V1.intcurr_complete": {"success": True, "complete": True, "time_s": 30.0, "time_stop_s": 30},
+            "V1.plot_data": {"success": True, "t": t_ms, "i": [100.0 + (n % 7) for n in range(len(t_ms))]},
+            "V1.intcurr_data": {"success": True, "time_s": 30.0, "time_stop_s": 30, "ucoulombs": 3000.0,
+                                "samples": 1440000, "mahr": 0.0277,
+                                "plot": {"t": t_s, "i": [100.0] * len(t_s), "i_max": [150.0] * len(t_s)},
+                                "plot_d0": {"t": [], "d0": []}, "plot_d1": {"t": [], "d1": []},
+                                "plot_trig": {"t": [], "trig": []}},
+        }
+        cls.bodies = {method: json.dumps({"jsonrpc": "2.0", "id": 0, "result": json.dumps(result)}).encode()
+                      for method, result in results.items()}
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        body = self.bodies.get(request.get("method"))
+        if body is None:
+            body = json.dumps({"jsonrpc": "2.0", "id": 0, "error": {"code": -32601, "message": "Method not found"}}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def standin_server():
+    """ Start the stand-in P1125 on a free localhost port, in a daemon thread
+
+    :return: server, url
+    """
+    if not StandInHandler.bodies: StandInHandler.build()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}{}".format(server.server_port, P1125_API)
+
+
+def _positive_int(value):
+    """ argparse type of a count that must be at least 1 """
+    n = int(value)
+    if n < 1: raise argparse.ArgumentTypeError("{} is not >= 1".format(value))
+    return n
+
+
+def _non_negative_int(value):
+    """ argparse type of a count that can be 0 """
+    n = int(value)
+    if n < 0: raise argparse.ArgumentTypeError("{} is not >= 0".format(value))
+    return n
+
+
+def _bench_run(url, method, iterations, concurrency, warmup):
+    """ Time iterations requests of method, over concurrency keep-alive sessions
+
+    :return: dict of the results, see bench(), the latency, size and decode values are None without responses
+    """
+    import numpy as np
+
+    payload = json.dumps({"method": method, "jsonrpc": "2.0", "id": 0}).encode()
+    headers = {"Content-Type": "application/json"}
+
+    def worker(count):
+        session = requests.Session()
+        latency, decode, nbytes, errors = [], [], [], 0
+        for n in range(warmup + count):
+            start = time.perf_counter()
+            try:
+                raw = session.post(url, data=payload, headers=headers, timeout=timeout_s).content
+                received = time.perf_counter()
+                response = json.loads(raw)
+                if "result" in response: _result(response)
+
+            except (requests.exceptions.RequestException, ValueError, TypeError, AttributeError):
+                # no response, or not a JSON-RPC response, for example a proxy error page
+                if n >= warmup: errors += 1
+                continue
+
+            decoded = time.perf_counter()
+            if n < warmup: continue
+
+            latency.append(received - start)
+            decode.append(decoded - received)
+            nbytes.append(len(raw))
+            if "error" in response: errors += 1
+
+        session.close()
+        return latency, decode, nbytes, errors
+
+    counts = [iterations // concurrency + (1 if n < iterations % concurrency else 0) for n in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        parts = list(pool.map(worker, counts))
+    wall_s = time.perf_counter() - start
+
+    latency = np.concatenate([np.asarray(p[0]) for p in parts]) * 1000.0
+    decode = np.concatenate([np.asarray(p[1]) for p in parts]) * 1000.0
+    nbytes = np.concatenate([np.asarray(p[2]) for p in parts])
+    row = {"method": method, "concurrency": concurrency, "requests": int(latency.size),
+           "errors": sum(p[3] for p in parts), "rps": latency.size / wall_s,
+           "p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None, "bytes": None, "decode_ms": None}
+    if latency.size:
+        p50, p90, p99 = np.percentile(latency, [50, 90, 99])
+        row.update({"p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99), "max_ms": float(latency.max()),
+                    "bytes": float(nbytes.mean()), "decode_ms": float(decode.mean())})
+    return row
+
+
+def bench(args, hosts=()):
+    """ Benchmark read only methods, latency percentiles, requests/s, response size and decode time
+
+    - every method is run iterations times at every concurrency level, after warmup requests
+    - latency is request sent to response received, decode is the JSON decoding of the
+      response (and of the JSON encoded result), not included in the latency
+    - the P1125 is P1125_URL, or each of --hosts in turn, or with --standin a local stand-in server
+
+    :param args: parsed arguments
+    :param hosts: hosts from --hosts/--hosts-file/--discover
+    :return: success <True/False>
+    """
+    import platform
+
+    server = None
+    if args._standin:
+        server, url = standin_server()
+        urls = [("stand-in", url)]
+
+    elif hosts:
+        urls = [(host, "http://" + host + P1125_API) for host in hosts]
+
+    elif "p115-####.local" in P1125_URL:
+        logger.error("Please set P1125_URL with valid IP/Hostname, or use --hosts or --standin")
+        return False
+
+    else:
+        urls = [(P1125_URL, URL)]
+
+    methods = [m if m.startswith("V1.") else "V1." + m for m in args._methods]
+    unknown = [m for m in methods if m not in BENCH_METHODS]
+    if unknown:
+        logger.error("not benchmarked {}, one of {}".format(unknown, BENCH_METHODS))
+        return False
+
+    stamp = {"datetime": datetime.datetime.now().isoformat(timespec="seconds"),
+             "client": "python {}, requests {}".format(platform.python_version(), requests.__version__)}
+    rows = []
+    try:
+        for host, url in urls:
+            for method in methods:
+                for concurrency in args._concurrency:
+                    row = {"host": host}
+                    row.update(_bench_run(url, method, args._iterations, concurrency, args._warmup))
+                    row.update(stamp)
+                    rows.append(row)
+                    if args._json: print(json.dumps(row), flush=True)
+
+    finally:
+        if server is not None: server.shutdown()
+
+    if not args._json:
+        print("{:<24} {:<24} {:>4} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9} {:>11} {:>9} {:>6}".format(
+              "host", "method", "conc", "reqs", "rps", "p50 ms", "p90 ms", "p99 ms", "max ms", "bytes", "decode ms", "errors"))
+        for r in rows:
+            values = ["-" if r[key] is None else format(r[key], spec) for key, spec in
+                      [("p50_ms", ".2f"), ("p90_ms", ".2f"), ("p99_ms", ".2f"), ("max_ms", ".2f"), ("bytes", ".0f"),
+                       ("decode_ms", ".3f")]]
+            print("{:<24} {:<24} {:>4} {:>6} {:>9.1f} {:>9} {:>9} {:>9} {:>9} {:>11} {:>9} {:>6}".format(
+                  r["host"], r["method"], r["concurrency"], r["requests"], r["rps"], *values, r["errors"]))
+        print(stamp["client"])
+
+    return all(r["errors"] == 0 for r in rows)
+
+
+COMMANDS = {  # subcommand: handler(args)
+    "ping": ping,
+    "status": status,
+    "cal": cal,
+    "vout": vout,
+    "probe": probe,
+    "trig": trig,
+    "acquire": acquire,
+    "plot_data": plotdata,
+    "intcurr": intcurr,
+    "timebase": timebase,
+    "cal_load": calload,
+    "bench": bench,
+}
+
+
+def discover(listen_s=DISCOVER_TIME_S):
+    """ Find the P1125s announced with zeroconf (avahi/bonjour), see p1125_find.py
+
+    - requires zeroconf (pip3 install zeroconf)
+    - a P1125 is announced before its application is running, failing commands show up in the results
+
+    :param listen_s: time to listen for announcements, seconds
+    :return: sorted list of hostnames
+    """
+    from zeroconf import ServiceBrowser, Zeroconf
+
+    hosts = set()
+
+    class Listener:
+
+        def add_service(self, zeroconf, type, name):
+            info = zeroconf.get_service_info(type, name)
+            if info is not None and info.server: hosts.add(info.server.rstrip("."))
+
+        def remove_service(self, zeroconf, type, name):
+            pass
+
+        def update_service(self, zeroconf, type, name):
+            pass
+
+    zeroconf = Zeroconf()
+    try:
+        ServiceBrowser(zeroconf, "_p1125._tcp.local.", Listener())
+        time.sleep(listen_s)
+
+    finally:
+        zeroconf.close()
+
+    return sorted(hosts)
+
+
+def read_hosts(args):
+    """ P1125s of --hosts, --hosts-file and --discover
+
+    :param args: parsed arguments
+    :return: list of hosts, in the given order without duplicates, empty if none of the options is given,
+             None if discovery is not possible
+    """
+    hosts = []
+    for host in args._hosts or []:
+        hosts.extend(h for h in host.split(",") if h)
+
+    if args._hosts_file:
+        with open(args._hosts_file) as f:
+            for line in f:
+                host = line.split("#")[0].strip()
+                if host: hosts.append(host)
+
+    if args._discover is not None:
+        try:
+            found = discover(args._discover)
+
+        except ImportError:
+            logger.error("--discover requires zeroconf, pip3 install zeroconf")
+            return None
+
+        logger.info("discovered {} P1125s: {}".format(len(found), found))
+        hosts.extend(found)
+
+    return list(dict.fromkeys(hosts))
+
+
+def _format_value(value):
+    if isinstance(value, (list, dict)): return "<{} items>".format(len(value))
+    return str(value)
+
+
+def run_fleet(handler, args, hosts, jobs=FLEET_JOBS, json_lines=False):
+    """ Run a command on every host concurrently, and print one result per host
+
+    - at most jobs hosts are accessed at the same time, each over its own keep-alive session
+    - prints an aligned table, one row per host and one column per result key,
+      or with json_lines one JSON object per host
+
+    :param handler: from COMMANDS
+    :param args: parsed arguments of the command
+    :param hosts: list of P1125 hostnames/IPs
+    :param jobs: maximum concurrency
+    :param json_lines: print JSON lines instead of a table
+    :return: success <True/False>, True if the command succeeded on every host
+    """
+    def one(host):
+        _context.url, _context.host, _context.fleet, _context.response = "http://" + host + P1125_API, host, True, None
+        start = time.perf_counter()
+        try:
+            success = bool(handler(args))
+            response = _context.response or {}
+            error = response.get("error")
+
+        except Exception as e:
+            success, response, error = False, {}, "{}: {}".format(type(e).__name__, e)
+
+        finally:
+            _context.fleet = False
+            del _context.url
+
+        return {"host": host, "success": success, "ms": (time.perf_counter() - start) * 1000.0,
+                "result": _result(response) if "result" in response else None, "error": error}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(hosts)))) as pool:
+        rows = list(pool.map(one, hosts))
+
+    if json_lines:
+        for row in rows: print(json.dumps(row, default=str))
+        return all(row["success"] for row in rows)
+
+    keys = []
+    for row in rows:
+        if isinstance(row["result"], dict): keys.extend(key for key in row["result"] if key not in keys)
+
+    table = [["host", "ok", "ms"] + keys + ["error"]]
+    for row in rows:
+        result = row["result"] if isinstance(row["result"], dict) else {}
+        table.append([row["host"], "ok" if row["success"] else "FAIL", "{:.1f}".format(row["ms"])] +
+                     [_format_value(result[key]) if key in result else "" for key in keys] +
+                     [str(row["error"] or "")])
+
+    widths = [max(len(line[col]) for line in table) for col in range(len(table[0]))]
+    for line in table:
+        print("  ".join(value.ljust(width) for value, width in zip(line, widths)).rstrip())
+
+    return all(row["success"] for row in rows)
+
+
+def build_parser():
     epilog = """
     Usage examples:
-       python3 test_rpc.py [OPTIONS] ping
-
+       python3 p1125_cli.py [OPTIONS] ping
+       python3 p1125_cli.py --script flow.txt
+       python3 p1125_cli.py repl
     """
     parser = argparse.ArgumentParser(description='p1125r rpc CLI',
                                      formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -208,9 +749,26 @@ if __name__ == "__main__":
     parser.add_argument("-v", '--verbose', dest='verbose', default=0, action='count', help='Increase verbosity')
     parser.add_argument("-d", '--debug', dest='debug', default=False, action='store_true', help='Enable debug prints on pyboard')
     parser.add_argument("--version", dest="show_version", action='store_true', help='Show version and exit')
+    parser.add_argument("--script", dest="_script", action='store', default=None,
+                        help='run the commands in a file, one per line, - for stdin')
+    parser.add_argument("--keep-going", dest="_keep_going", action='store_true',
+                        help='with --script, continue after a failed command')
+    parser.add_argument("--hosts", dest="_hosts", action='append', default=None,
+                        help='run the command on these P1125s, comma separated hostnames/IPs, instead of P1125_URL')
+    parser.add_argument("--hosts-file", dest="_hosts_file", action='store', default=None,
+                        help='run the command on the P1125s in a file, one per line, # comments')
+    parser.add_argument("--discover", dest="_discover", nargs='?', type=float, const=DISCOVER_TIME_S, default=None,
+                        help='run the command on the P1125s found with zeroconf, optional listen time in seconds')
+    parser.add_argument("-j", "--jobs", dest="_jobs", type=int, default=FLEET_JOBS,
+                        help='maximum number of P1125s accessed at the same time, default {}'.format(FLEET_JOBS))
+    parser.add_argument("--json", dest="_json", action='store_true', help='with several P1125s, print JSON lines')
+    parser.add_argument("--timeout", dest="_timeout", type=float, default=None,
+                        help='request timeout, seconds, default none, {} with several P1125s'.format(FLEET_TIMEOUT_S))
 
     subp = parser.add_subparsers(dest="_cmd", help='commands')
 
+    subp.add_parser('repl', help='interactive, run commands over one connection')
+
     ping_parser = subp.add_parser('ping')
 
     status_parser = subp.add_parser('status')
@@ -251,6 +809,19 @@ if __name__ == "__main__":
     acquire_parser.add_argument('-f', '--stop',      dest="_stop",      help='acquire stop',  action='store_true')
 
     plotdata_parser = subp.add_parser('plot_data')
+    plotdata_parser.add_argument('-o', '--out', dest="_out", action='store', default=None, type=_out_path,
+                                 help='write the data to a file, one of {}'.format(EXPORT_FORMATS))
+    plotdata_parser.add_argument('-n', '--downsample', dest="_downsample", action='store', type=int, default=1,
+                                 help='with --out, keep one sample in N')
+
+    intcurr_parser = subp.add_parser('intcurr')
+    intcurr_parser.add_argument('-s', '--set',      dest="_set",      help='intcurr set <seconds>, 10-7200', action='store')
+    intcurr_parser.add_argument('-c', '--complete', dest="_complete", help='intcurr complete', action='store_true')
+    intcurr_parser.add_argument('-d', '--data',     dest="_data",     help='intcurr data', action='store_true')
+    intcurr_parser.add_argument('-o', '--out', dest="_out", action='store', default=None, type=_out_path,
+                                help='with --data, write the data to a file, one of {}'.format(EXPORT_FORMATS))
+    intcurr_parser.add_argument('-n', '--downsample', dest="_downsample", action='store', type=int, default=1,
+                                help='with --out, keep one sample in N')
 
     tbase_parser = subp.add_parser('timebase')
     tbase_parser.add_argument('-s', '--span',     dest="_span",
@@ -263,7 +834,36 @@ if __name__ == "__main__":
                                 help='calibration load set, comma separated list of {}'.format(P1125API.DEMO_CAL_LOAD_LIST),
                                 action='store')
 
-    args = parser.parse_args()
+    bench_parser = subp.add_parser('bench', help='benchmark read only methods')
+    bench_parser.add_argument('-m', '--methods', dest="_methods", nargs='+', default=["V1.ping", "V1.status"],
+                              help='methods to benchmark, V1. is optional, from {}'.format(BENCH_METHODS))
+    bench_parser.add_argument('-n', '--iterations', dest="_iterations", type=_positive_int, default=100,
+                              help='requests per method and concurrency level')
+    bench_parser.add_argument('-c', '--concurrency', dest="_concurrency", type=_positive_int, nargs='+', default=[1],
+                              help='concurrency levels, for example 1 4 16')
+    bench_parser.add_argument('-w', '--warmup', dest="_warmup", type=_non_negative_int, default=3,
+                              help='requests per session before timing')
+    bench_parser.add_argument('--standin', dest="_standin", action='store_true',
+                              help='benchmark a local stand-in server instead of a P1125')
+
+    return parser
+
+
+def run_command(parser, argv, fleet=None):
+    """ Run one command line, as given to p1125_cli.py
+
+    :param parser: from build_parser()
+    :param argv: list of arguments, for example ['vout', '--set', '3000']
+    :param fleet: default {'hosts': [...], 'jobs': ..., 'json': ...}, when the command line has no hosts
+    :return: success <True/False>
+    """
+    global timeout_s
+
+    try:
+        args = parser.parse_args(argv)
+
+    except SystemExit:  # argparse error or --help, already printed
+        return False
 
     if args.verbose > 0:
         logger.setLevel(logging.DEBUG)
@@ -271,35 +871,106 @@ if __name__ == "__main__":
     if args._cmd is not None:
         logger.debug(parser)
 
-    if args._cmd == 'ping':
-        success = ping(args)
+    handler = COMMANDS.get(args._cmd)
+    if handler is None:
+        parser.print_help()
+        return True
+
+    if args._timeout is not None: timeout_s = args._timeout
 
-    elif args._cmd == 'status':
-        success = status(args)
+    hosts = read_hosts(args)
+    if hosts is None: return False
 
-    elif args._cmd == 'cal':
-        success = cal(args)
+    if handler is bench:  # one P1125 at a time, so the P1125s do not compete for the client
+        return bench(args, hosts or (fleet["hosts"] if fleet else []))
 
-    elif args._cmd == 'vout':
-        success = vout(args)
+    if hosts:
+        return run_fleet(handler, args, hosts, jobs=args._jobs, json_lines=args._json)
 
-    elif args._cmd == 'probe':
-        success = probe(args)
+    if fleet and fleet["hosts"]:
+        return run_fleet(handler, args, fleet["hosts"], jobs=fleet["jobs"], json_lines=fleet["json"])
 
-    elif args._cmd == 'trig':
-        success = trig(args)
+    if "p115-####.local" in P1125_URL:
+        logger.error("Please set P1125_URL with valid IP/Hostname, or use --hosts")
+        return False
 
-    elif args._cmd == 'acquire':
-        success = acquire(args)
+    return bool(handler(args))
 
-    elif args._cmd == 'plot_data':
-        success = plotdata(args)
 
-    elif args._cmd == 'timebase':
-        success = timebase(args)
+def run_lines(parser, lines, keep_going=False, prompt=None, fleet=None):
+    """ Run commands, one per line, over the shared session
 
-    elif args._cmd == 'cal_load':
-        success = calload(args)
+    - blank lines and lines starting with '#' are skipped
+    - the time of every command is logged, and the total at the end
 
-    elif args._cmd in ['help']:
-        parser.print_help()
+    :param parser: from build_parser()
+    :param lines: iterable of command lines, for example 'vout --set 3000'
+    :param keep_going: continue after a failed command
+    :param prompt: prompt printed before every line, for interactive use
+    :param fleet: see run_command()
+    :return: success <True/False>
+    """
+    start = time.perf_counter()
+    count, failed = 0, 0
+    for number, line in enumerate(lines, 1):
+        argv = shlex.split(line, comments=True)
+        if not argv:
+            if prompt: print(prompt, end="", flush=True)
+            continue
+
+        if argv[0] in ["quit", "exit"]: break
+
+        cmd_start = time.perf_counter()
+        success = run_command(parser, argv, fleet)
+        count += 1
+        logger.info("{:4d} {:<40} {:8.1f} ms {}".format(number, line.strip()[:40], (time.perf_counter() - cmd_start) * 1000.0,
+                                                         "" if success else "FAILED"))
+        if not success:
+            failed += 1
+            if not keep_going: break
+
+        if prompt: print(prompt, end="", flush=True)
+
+    logger.info("{} commands, {} failed, in {:.3f} s".format(count, failed, time.perf_counter() - start))
+    return failed == 0
+
+
+def repl(parser, fleet=None):
+    """ Interactive mode, commands are typed without 'python3 p1125_cli.py'
+
+    :param fleet: see run_command()
+    :return: success <True/False>
+    """
+    prompt = "p1125> "
+    print(prompt, end="", flush=True)
+    run_lines(parser, sys.stdin, keep_going=True, prompt=prompt, fleet=fleet)
+    print()
+    return True
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+    timeout_s = args._timeout
+
+    if args._script is not None or args._cmd == 'repl':
+        # hosts are found once, and used by every command without its own hosts
+        fleet = {"hosts": read_hosts(args), "jobs": args._jobs, "json": args._json}
+
+        if fleet["hosts"] is None:
+            success = False
+
+        elif args._script is None:
+            success = repl(parser, fleet)
+
+        elif args._script == "-":
+            success = run_lines(parser, sys.stdin, keep_going=args._keep_going, fleet=fleet)
+
+        else:
+            with open(args._script) as f:
+                success = run_lines(parser, f, keep_going=args._keep_going, fleet=fleet)
+
+    else:
+        success = run_command(parser, sys.argv[1:])
+
+    if not success: exit(1)
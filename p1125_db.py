@@ -0,0 +1,422 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Results database, SQLite, for calibration load sweeps and mAhr logs of many units.
+
+Rows are keyed by the unit serial and firmware version (from p1125.ping()),
+VOUT, load and timestamp, with indexes for trend queries, for example how
+sigma% at 3000 mV / 2K drifted across all units over the last 3 months,
+
+    db = ResultsDB("p1125_results.db")
+    rows = db.cal_trend(vout=3000, resistance=2000.0, since=time.time() - 90 * 86400)
+    rows = db.cal_drift(vout=3000, resistance=2000.0, since=time.time() - 90 * 86400)  # daily average per unit
+
+Ingest, one transaction per file, files already ingested and unchanged are skipped,
+
+    $python3 p1125_db.py ingest ./logs ./sweeps
+    $python3 p1125_db.py cal --vout 3000 --res 2000 --days 90 --daily
+    $python3 p1125_db.py mahr --serial 10000000abcdef12 --days 7
+
+- calibration load sweep CSVs, p1125_<serial>, from p1125_example_plot_cal_loads.py,
+  which also writes its results directly when RESULTS_DB is set
+- mAhr logs, <YYYYMMDD-HHMMSS>.py, from p1125_example_mahrs_logging.py
+
+Requirements:
+1) Python 3.6+ and numpy
+"""
+import os
+import re
+import time
+import sqlite3
+import argparse
+import logging
+
+logger = logging.getLogger()
+
+DB_FILE = "p1125_results.db"
+CAL_CSV_PATTERN = re.compile(r"^p1125_[^.]+$")      # as named by p1125_example_plot_cal_loads.py
+MAHR_LOG_PATTERN = re.compile(r"^\d{8}-\d{6}\.py$")  # as named by p1125_example_mahrs_logging.py
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cal_points (
+    serial TEXT NOT NULL,
+    firmware TEXT,
+    timestamp REAL NOT NULL,
+    vout INTEGER NOT NULL,
+    load TEXT NOT NULL,
+    resistance REAL NOT NULL,
+    expected_ua REAL,
+    avg_ua REAL,
+    min_ua REAL,
+    max_ua REAL,
+    sigma_ua REAL,
+    sigma_percent REAL,
+    avg_error_percent REAL,
+    passed INTEGER,
+    settle_s REAL,
+    source TEXT,
+    UNIQUE (serial, vout, resistance, timestamp)
+);
+-- covers cal_drift(), no table lookups
+CREATE INDEX IF NOT EXISTS cal_points_vout_resistance ON cal_points (vout, resistance, timestamp, serial,
+                                                                     avg_error_percent, sigma_percent, passed);
+CREATE INDEX IF NOT EXISTS cal_points_serial ON cal_points (serial, timestamp);
+
+CREATE TABLE IF NOT EXISTS mahr_windows (
+    serial TEXT NOT NULL,
+    firmware TEXT,
+    timestamp REAL NOT NULL,
+    vout INTEGER,
+    time_s REAL,
+    mahr REAL,
+    i_max_ua REAL,
+    samples INTEGER,
+    source TEXT NOT NULL,
+    UNIQUE (source, timestamp)
+);
+CREATE INDEX IF NOT EXISTS mahr_windows_serial ON mahr_windows (serial, timestamp);
+CREATE INDEX IF NOT EXISTS mahr_windows_vout ON mahr_windows (vout, timestamp);
+
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    rows INTEGER
+);
+"""
+
+CAL_COLUMNS = ["serial", "firmware", "timestamp", "vout", "load", "resistance", "expected_ua", "avg_ua", "min_ua",
+               "max_ua", "sigma_ua", "sigma_percent", "avg_error_percent", "passed", "settle_s", "source"]
+MAHR_COLUMNS = ["serial", "firmware", "timestamp", "vout", "time_s", "mahr", "i_max_ua", "samples", "source"]
+
+# a data line of the cal load sweep CSV,
+#   vout, resistance, expected_i_ua, avg, err%/limit% RMSNoise%/limit%, pass/fail[, detail][, settle_s]
+_CAL_CSV_LINE = re.compile(r"^\s*(\d+),\s*([^,]+),\s*([^,]+),\s*([^,]+),\s*([^%]+)%/\s*[^%]+%\s+([^%]+)%/\s*[^%]+%,\s*(\w+)")
+_CAL_CSV_TITLE = re.compile(r"Serial: ([^,]+),.*SW Ver: (.+)$")
+
+
+class ResultsDB(object):
+    """ SQLite results store
+
+    - one connection per instance, create an instance per thread
+    - inserts are idempotent, rows already in the database are ignored
+    """
+
+    def __init__(self, path: str=DB_FILE):
+        """
+        :param path: database file, created if it does not exist
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30.0)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")  # readers do not block the writer
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_cal_points(self, serial: str, firmware: str, points: list, source: str=None, csv_path: str=None) -> int:
+        """ Add calibration load sweep points, in one transaction
+
+        :param serial: unit serial, ping()['rpi_serial']
+        :param firmware: firmware version, ping()['version']
+        :param points: list of point dicts from p1125_example_plot_cal_loads.measure_point()
+        :param source: where the points came from, for example the CSV file
+        :param csv_path: cal load sweep CSV the points were also written to, it is recorded as
+                         ingested so that ingest() does not add the points again
+        :return: number of rows added
+        """
+        rows = [(serial, firmware, p.get("timestamp", time.time()), p["vout"], ",".join(sorted(p.get("load", []))),
+                 p["res"], p["exp"], p["avg"], p.get("min"), p.get("max"), p.get("sigma"), p["sigma_percent"],
+                 p["avg_error_percent"], int(p["pass_or_fail"] == "Pass"), p.get("settle_s"), source)
+                for p in points]
+        stamp = self._stamp(csv_path, force=True) if csv_path is not None else None
+        return self._insert("cal_points", CAL_COLUMNS, rows, stamp)
+
+    def _insert(self, table, columns, rows, source_stamp=None):
+        """ Insert rows, and record the source file, in one transaction
+
+        :return: number of rows added
+        """
+        sql = "INSERT OR IGNORE INTO {} ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join("?" * len(columns)))
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(sql, rows)
+            added = self.conn.total_changes - before
+            if source_stamp is not None:
+                self.conn.execute("INSERT OR REPLACE INTO sources (path, size, mtime_ns, rows) VALUES (?, ?, ?, ?)",
+                                  source_stamp + (len(rows),))
+
+        return added
+
+    def _stamp(self, path, force=False):
+        """ (path, size, mtime_ns) of a file, None if it was already ingested unchanged, unless force """
+        st = os.stat(path)
+        stamp = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        if force: return stamp
+        row = self.conn.execute("SELECT size, mtime_ns FROM sources WHERE path = ?", stamp[:1]).fetchone()
+        if row is not None and (row["size"], row["mtime_ns"]) == stamp[1:]: return None
+        return stamp
+
+    def ingest_cal_csv(self, path: str) -> int:
+        """ Ingest a calibration load sweep CSV, p1125_<serial>
+
+        - the file modification time is the timestamp of the points
+        - CSVs written by a sweep that also added its points to the database are
+          already recorded as ingested, see add_cal_points()
+
+        :param path: CSV file
+        :return: number of rows added, None if the file was already ingested
+        """
+        stamp = self._stamp(path)
+        if stamp is None: return None
+
+        with open(path, "r") as f:
+            lines = f.read().splitlines()
+
+        title = _CAL_CSV_TITLE.search(lines[0]) if lines else None
+        if title is None: raise ValueError("{} is not a cal load sweep CSV".format(path))
+        serial, firmware = title.group(1).strip(), title.group(2).strip()
+        has_settle = lines[1].rstrip().endswith("settle_s")
+
+        rows = []
+        for line in lines[2:]:
+            m = _CAL_CSV_LINE.match(line)
+            if m is None: continue
+            vout, resistance, expected, avg, avg_error, sigma_percent, passed = m.groups()
+            settle_s = float(line.rsplit(",", 1)[1]) if has_settle else None
+            rows.append((serial, firmware, stamp[2] / 1e9, int(vout), "", float(resistance), float(expected), float(avg),
+                         None, None, None, float(sigma_percent), float(avg_error), int(passed == "Pass"), settle_s,
+                         stamp[0]))
+
+        return self._insert("cal_points", CAL_COLUMNS, rows, stamp)
+
+    def ingest_mahr_log(self, path: str) -> int:
+        """ Ingest the windows of a mAhr log, see p1125_mahrs_log.py
+
+        :param path: log file
+        :return: number of rows added, None if the file was already ingested
+        """
+        import numpy as np
+        from p1125_mahrs_log import load_summary
+
+        stamp = self._stamp(path)
+        if stamp is None: return None
+
+        summary = load_summary(path)
+        if summary is None: raise ValueError("{} could not be loaded".format(path))
+
+        ping, settings = summary["meta"]["p1125_ping"], summary["meta"]["p1125_settings"]
+        # the window datetimes are local time, as logged, timestamp() of a naive datetime is local time
+        timestamps = [t.timestamp() for t in summary["t"].tolist()]
+        columns = [summary[key].tolist() for key in ["time_s", "mAhr", "i_max_ua", "samples"]]
+        rows = [(ping.get("rpi_serial"), ping.get("version"), t, settings.get("VOUT"), time_s, mahr, i_max_ua,
+                 None if np.isnan(samples) else int(samples), stamp[0])
+                for t, time_s, mahr, i_max_ua, samples in zip(timestamps, *columns)]
+
+        return self._insert("mahr_windows", MAHR_COLUMNS, rows, stamp)
+
+    def ingest(self, paths: list) -> dict:
+        """ Ingest files and directories of cal load sweep CSVs and mAhr logs
+
+        :param paths: list of files or directories
+        :return: {'files': ..., 'skipped': ..., 'rows': ..., 'errors': ...}
+        """
+        files = []
+        for path in paths:
+            if os.path.isdir(path): files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)))
+            else: files.append(path)
+
+        stats = {"files": 0, "skipped": 0, "rows": 0, "errors": 0}
+        for path in files:
+            name = os.path.basename(path)
+            if CAL_CSV_PATTERN.match(name): ingest = self.ingest_cal_csv
+            elif MAHR_LOG_PATTERN.match(name): ingest = self.ingest_mahr_log
+            else: continue
+
+            try:
+                rows = ingest(path)
+
+            except Exception as e:
+                logger.error("{}: {}".format(path, e))
+                stats["errors"] += 1
+                continue
+
+            if rows is None:
+                stats["skipped"] += 1
+                continue
+
+            stats["files"] += 1
+            stats["rows"] += rows
+            logger.info("{}: {} rows".format(path, rows))
+
+        return stats
+
+    def cal_trend(self, vout: int, resistance: float, since: float=None, serial: str=None) -> list:
+        """ Calibration load results of one VOUT/load over time
+
+        :param vout: mV
+        :param resistance: load resistance, Ohms
+        :param since: unix time, None for all
+        :param serial: unit serial, None for all units
+        :return: list of sqlite3.Row, oldest first
+        """
+        sql = "SELECT * FROM cal_points WHERE vout = ? AND resistance = ? AND timestamp >= ?"
+        params = [vout, resistance, since or 0.0]
+        if serial is not None:
+            sql += " AND serial = ?"
+            params.append(serial)
+
+        return self.conn.execute(sql + " ORDER BY timestamp", params).fetchall()
+
+    def cal_drift(self, vout: int, resistance: float, since: float=None, bucket_s: float=86400.0) -> list:
+        """ Calibration load results of one VOUT/load, averaged per unit per time bucket
+
+        :param vout: mV
+        :param resistance: load resistance, Ohms
+        :param since: unix time, None for all
+        :param bucket_s: bucket size, seconds, default one day
+        :return: list of sqlite3.Row (serial, timestamp <bucket start>, points, avg_error_percent,
+                 sigma_percent, sigma_percent_max, failed), oldest first
+        """
+        sql = "SELECT serial, CAST(timestamp / ? AS INTEGER) * ? AS timestamp, COUNT(*) AS points, " \
+              "AVG(avg_error_percent) AS avg_error_percent, AVG(sigma_percent) AS sigma_percent, " \
+              "MAX(sigma_percent) AS sigma_percent_max, SUM(1 - passed) AS failed " \
+              "FROM cal_points WHERE vout = ? AND resistance = ? AND timestamp >= ? " \
+              "GROUP BY serial, CAST(timestamp / ? AS INTEGER) ORDER BY timestamp, serial"
+        return self.conn.execute(sql, [bucket_s, bucket_s, vout, resistance, since or 0.0, bucket_s]).fetchall()
+
+    def mahr_trend(self, serial: str=None, vout: int=None, since: float=None) -> list:
+        """ mAhr windows over time
+
+        :param serial: unit serial, None for all units
+        :param vout: mV, None for all
+        :param since: unix time, None for all
+        :return: list of sqlite3.Row, oldest first
+        """
+        sql = "SELECT * FROM mahr_windows WHERE timestamp >= ?"
+        params = [since or 0.0]
+        if serial is not None:
+            sql += " AND serial = ?"
+            params.append(serial)
+
+        if vout is not None:
+            sql += " AND vout = ?"
+            params.append(vout)
+
+        return self.conn.execute(sql + " ORDER BY timestamp", params).fetchall()
+
+
+def _print_rows(rows, columns, as_json):
+    import json
+    if as_json:
+        for row in rows: print(json.dumps({key: row[key] for key in columns}))
+        return
+
+    print(" ".join("{:>16}".format(key) for key in columns))
+    for row in rows:
+        print(" ".join("{:>16}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row[key])) if key == "timestamp"
+                                       else "{:.4g}".format(row[key]) if isinstance(row[key], float) else str(row[key]))
+                       for key in columns))
+
+
+def main():
+    epilog = """
+    Usage examples:
+       python3 p1125_db.py ingest ./logs ./sweeps
+       python3 p1125_db.py cal --vout 3000 --res 2000 --days 90 --daily
+       python3 p1125_db.py mahr --serial 10000000abcdef12 --days 7 --json
+    """
+    parser = argparse.ArgumentParser(description='p1125 results database',
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=epilog)
+    parser.add_argument("--db", dest="_db", action='store', default=DB_FILE, help='database file')
+    parser.add_argument("--json", dest="_json", action='store_true', help='output JSON lines')
+
+    subp = parser.add_subparsers(dest="_cmd", help='commands')
+
+    ingest_parser = subp.add_parser('ingest')
+    ingest_parser.add_argument('paths', nargs='+', help='files or directories')
+
+    cal_parser = subp.add_parser('cal')
+    cal_parser.add_argument('--vout', dest="_vout", type=int, required=True, help='mV')
+    cal_parser.add_argument('--res', dest="_res", type=float, required=True, help='load resistance, Ohms')
+    cal_parser.add_argument('--serial', dest="_serial", default=None, help='unit serial, default all units')
+    cal_parser.add_argument('--days', dest="_days", type=float, default=None, help='last N days, default all')
+    cal_parser.add_argument('--daily', dest="_daily", action='store_true', help='daily average per unit')
+    cal_parser.add_argument("--json", dest="_json", action='store_true', default=argparse.SUPPRESS,
+                            help='output JSON lines')
+
+    mahr_parser = subp.add_parser('mahr')
+    mahr_parser.add_argument('--vout', dest="_vout", type=int, default=None, help='mV, default all')
+    mahr_parser.add_argument('--serial', dest="_serial", default=None, help='unit serial, default all units')
+    mahr_parser.add_argument('--days', dest="_days", type=float, default=None, help='last N days, default all')
+    mahr_parser.add_argument("--json", dest="_json", action='store_true', default=argparse.SUPPRESS,
+                             help='output JSON lines')
+
+    args = parser.parse_args()
+    if args._cmd is None:
+        parser.print_help()
+        return True
+
+    db = ResultsDB(args._db)
+    start = time.perf_counter()
+    if args._cmd == 'ingest':
+        stats = db.ingest(args.paths)
+        logger.info("{} files, {} rows added, {} unchanged files skipped, {} errors in {:.2f} s".format(
+                    stats["files"], stats["rows"], stats["skipped"], stats["errors"], time.perf_counter() - start))
+        return stats["errors"] == 0
+
+    since = time.time() - args._days * 86400.0 if args._days is not None else None
+    if args._cmd == 'cal' and args._daily:
+        rows = db.cal_drift(args._vout, args._res, since=since)
+        if args._serial is not None: rows = [row for row in rows if row["serial"] == args._serial]
+        columns = ["timestamp", "serial", "points", "avg_error_percent", "sigma_percent", "sigma_percent_max", "failed"]
+
+    elif args._cmd == 'cal':
+        rows = db.cal_trend(args._vout, args._res, since=since, serial=args._serial)
+        columns = ["timestamp", "serial", "firmware", "avg_ua", "avg_error_percent", "sigma_percent", "passed"]
+
+    else:
+        rows = db.mahr_trend(serial=args._serial, vout=args._vout, since=since)
+        columns = ["timestamp", "serial", "firmware", "vout", "mahr", "i_max_ua"]
+
+    query_ms = (time.perf_counter() - start) * 1000.0
+    _print_rows(rows, columns, args._json)
+    if not args._json: logger.info("{} rows in {:.1f} ms".format(len(rows), query_ms))
+    return True
+
+
+if __name__ == "__main__":
+    logger.setLevel(logging.INFO)
+    FORMAT = "%(asctime)s: %(funcName)20s %(lineno)4s - %(levelname)-5.5s : %(message)s"
+    formatter = logging.Formatter(FORMAT)
+    consoleHandler = logging.StreamHandler()
+    consoleHandler.setFormatter(formatter)
+    logger.addHandler(consoleHandler)
+
+    success = main()
+    if not success: logger.error("failed")
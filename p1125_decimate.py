@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Peak preserving decimation of P1125 plot data for bokeh.
+
+A 7200s mAhr window has 720k samples, far more than the pixels of a plot.
+decimate() keeps the min and max sample of every bucket, with one bucket per
+plot pixel, so spikes are never lost however far the plot is zoomed out,
+
+    data = decimate(intcurr_result["plot"], x_start, x_end, max_points=2 * plot.width)
+    source.data = data
+
+Data handed to bokeh should be typed numpy arrays, see bokeh_arrays(), bokeh
+then sends binary arrays to the browser instead of JSON number text, which is
+much faster to serialize and about a quarter of the size, see p1125_bench.py
+
+Requirements:
+1) Python 3.6+ and numpy
+"""
+import numpy as np
+
+
+def minmax_indexes(y, buckets: int):
+    """ Indexes of the min and max of y in each bucket, in order
+
+    :param y: numpy array
+    :param buckets: number of (equal sized) buckets, two points per bucket
+    :return: numpy array of sorted unique indexes into y, always including the first
+             and last index, at most 2 * buckets + 2 long
+    """
+    n = y.size
+    if n <= 2 * buckets: return np.arange(n)
+
+    size = -(-n // buckets)  # samples per bucket
+    k = -(-n // size)        # buckets actually used
+    padded = np.full(k * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(k, size)
+
+    base = np.arange(k) * size
+    lo = base + np.nanargmin(padded, axis=1)
+    hi = base + np.nanargmax(padded, axis=1)
+    return np.unique(np.concatenate(([0], lo, hi, [n - 1])))
+
+
+def decimate(data: dict, x_start: float=None, x_end: float=None, max_points: int=2000,
+             x_key: str="t", y_key: str="i", peak_keys: list=("i_max",)) -> dict:
+    """ Decimate plot data to the visible range and to at most max_points
+
+    - the sample either side of the visible range is kept so lines run to the plot edges
+    - y_key keeps the min and max sample of each bucket
+    - peak_keys are set to the maximum over all the samples each point represents,
+      so peaks are preserved even between the kept y_key samples
+
+    :param data: plot data, {'t': [...], 'i': [...], 'i_max': [...]}, lists or numpy arrays
+    :param x_start: start of visible range, None for start of data
+    :param x_end: end of visible range, None for end of data
+    :param max_points: maximum number of points to return
+    :param x_key: key of the x (time) values, must be sorted ascending
+    :param y_key: key of the values to decimate
+    :param peak_keys: keys of peak values, missing keys are ignored
+    :return: dict of numpy arrays, same keys as data
+    """
+    x = np.asarray(data[x_key], dtype=np.float64)
+    lo, hi = 0, x.size
+    if x_start is not None: lo = max(int(np.searchsorted(x, x_start, side="left")) - 1, 0)
+    if x_end is not None: hi = min(int(np.searchsorted(x, x_end, side="right")) + 1, x.size)
+
+    y = np.asarray(data[y_key], dtype=np.float64)[lo:hi]
+    idx = minmax_indexes(y, max((max_points - 2) // 2, 1))
+
+    out = {}
+    for key, values in data.items():
+        values = np.asarray(values)[lo:hi]
+        if key in peak_keys and idx.size:
+            out[key] = np.maximum.reduceat(values, idx)
+
+        else:
+            out[key] = values[idx]
+
+    return out
+
+
+def bokeh_arrays(data: dict, float64_keys: list=()) -> dict:
+    """ Convert plot data to typed numpy arrays for bokeh ColumnDataSource
+
+    - float32 (~7 significant digits) is plenty for currents, and for times up
+      to ~8000 seconds at 10ms resolution, use float64_keys for times that can
+      be longer, for example a running time over many windows
+
+    :param data: plot data, {'t': [...], 'i': [...], ...}, lists or numpy arrays
+    :param float64_keys: keys to keep as float64
+    :return: dict of numpy arrays
+    """
+    return {key: np.asarray(values, dtype=np.float64 if key in float64_keys else np.float32)
+            for key, values in data.items()}
@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+D0/D1/Trigger event analysis of Integrated Current (mAhr) data.
+
+p1125.intcurr_data() returns D0, D1 and trigger events alongside the 10ms
+current samples,
+
+    'plot':      {'t': [...], 'i': [...], 'i_max': [...]},
+    'plot_d0':   {'t': [...], 'd0': [...]},
+    'plot_d1':   {'t': [...], 'd1': [...]},
+    'plot_trig': {'t': [...], 'trig': [...]},
+
+The events are aligned onto the current samples, the current stream is split
+into intervals at every event, and the charge and peak current of every
+interval is computed, all vectorized with numpy,
+
+    intervals = event_intervals(intcurr_result)
+    for t, q, p in zip(intervals["t_start"], intervals["charge_uc"], intervals["peak_ua"]): ...
+
+Event boundaries are resolved to the current sample (10ms) that contains the event.
+
+Run this file to benchmark with synthetic data,
+    $python3 p1125_events.py
+
+Requirements:
+1) Python 3.6+ and numpy
+"""
+import time
+import numpy as np
+
+from P1125 import P1125API
+
+EVENT_SOURCES = {  # intcurr_data() key: value key
+    "plot_d0": "d0",
+    "plot_d1": "d1",
+    "plot_trig": "trig",
+}
+
+
+def sample_durations(t):
+    """ Duration of each current sample
+    - each sample holds until the next sample time, the last sample is
+      P1125API.MAHR_SAMPLE_TIME_S long
+
+    :param t: sample times, seconds
+    :return: numpy array of durations, seconds
+    """
+    t = np.asarray(t, dtype=np.float64)
+    return np.diff(t, append=t[-1] + P1125API.MAHR_SAMPLE_TIME_S) if t.size else t
+
+
+def align_events(t_samples, t_events):
+    """ Index of the current sample that contains each event
+
+    - events before the first sample are aligned to the first sample
+
+    :param t_samples: current sample times, seconds, sorted ascending
+    :param t_events: event times, seconds
+    :return: numpy array of sample indexes, one per event
+    """
+    t_samples = np.asarray(t_samples, dtype=np.float64)
+    idx = np.searchsorted(t_samples, np.asarray(t_events, dtype=np.float64), side="right") - 1
+    return np.clip(idx, 0, max(t_samples.size - 1, 0))
+
+
+def event_intervals(intcurr_result: dict, sources: list=None) -> dict:
+    """ Split the current stream into event bounded intervals
+
+    - an interval starts at the beginning of the data and at every event, and
+      ends at the next event or the end of the data
+    - when events from several sources fall in the same sample, the interval
+      is tagged with the last one
+
+    :param intcurr_result: dict from p1125.intcurr_data()
+    :param sources: list of event keys to split on, default all of EVENT_SOURCES
+    :return: dict of numpy arrays, one entry per interval,
+             {'t_start': <seconds>, 't_end': <seconds>, 'samples': <count>,
+              'charge_uc': <micro-coulombs>, 'avg_ua': <uA>, 'peak_ua': <uA>,
+              'source': <event key or ''>, 'value': <event value or nan>}
+    """
+    if sources is None: sources = list(EVENT_SOURCES.keys())
+
+    plot = intcurr_result["plot"]
+    t = np.asarray(plot["t"], dtype=np.float64)
+    i = np.asarray(plot["i"], dtype=np.float64)
+    i_max = np.asarray(plot.get("i_max", plot["i"]), dtype=np.float64)
+    if t.size == 0:
+        return {"t_start": t, "t_end": t, "samples": np.zeros(0, dtype=np.intp),
+                "charge_uc": t, "avg_ua": t, "peak_ua": t,
+                "source": np.zeros(0, dtype="U16"), "value": t}
+
+    idx, src, value = [np.zeros(1, dtype=np.intp)], [np.zeros(1, dtype=np.intp)], [np.full(1, np.nan)]
+    for n, key in enumerate(sources, 1):
+        events = intcurr_result.get(key)
+        if not events or len(events["t"]) == 0: continue
+
+        idx.append(align_events(t, events["t"]))
+        src.append(np.full(len(events["t"]), n, dtype=np.intp))
+        value.append(np.asarray(events[EVENT_SOURCES[key]], dtype=np.float64))
+
+    idx, src, value = np.concatenate(idx), np.concatenate(src), np.concatenate(value)
+
+    # one boundary per sample, the last event into a sample wins
+    order = np.argsort(idx, kind="stable")
+    idx, src, value = idx[order], src[order], value[order]
+    last = np.append(idx[1:] != idx[:-1], True)
+    starts, src, value = idx[last], src[last], value[last]
+    ends = np.append(starts[1:], t.size)
+
+    dt = sample_durations(t)
+    charge = np.add.reduceat(i * dt, starts)
+    duration = np.add.reduceat(dt, starts)
+
+    names = np.array([""] + list(sources), dtype="U16")
+    return {
+        "t_start": t[starts],
+        "t_end": t[ends - 1] + dt[ends - 1],
+        "samples": ends - starts,
+        "charge_uc": charge,
+        "avg_ua": charge / duration,
+        "peak_ua": np.maximum.reduceat(i_max, starts),
+        "source": names[src],
+        "value": value,
+    }
+
+
+if __name__ == "__main__":
+    # benchmark with a synthetic 7200s window (720k samples) and 300k events per source
+    rng = np.random.default_rng(0)
+    _n = 720000
+    _t = np.arange(_n) * P1125API.MAHR_SAMPLE_TIME_S
+    _i = rng.lognormal(3, 2, _n)
+    _result = {"plot": {"t": _t.tolist(), "i": _i.tolist(), "i_max": (_i * 1.5).tolist()}}
+    for _key, _val in EVENT_SOURCES.items():
+        _te = np.sort(rng.uniform(0, _t[-1], 300000))
+        _result[_key] = {"t": _te.tolist(), _val: (np.arange(_te.size) % 2).tolist()}
+
+    _start = time.perf_counter()
+    _intervals = event_intervals(_result)
+    _elapsed = time.perf_counter() - _start
+
+    print("{} samples, {} events -> {} intervals in {:.3f} s".format(
+          _n, 3 * 300000, _intervals["t_start"].size, _elapsed))
+    print("total charge {:.1f} uC, expected {:.1f} uC".format(
+          _intervals["charge_uc"].sum(), (_i * P1125API.MAHR_SAMPLE_TIME_S).sum()))
@@ -33,7 +33,7 @@ Run this file,
 
 Requirements:
 1) Python 3.6+ and bokeh 2.3.0 (pip3 install bokeh) or greater installed.
-2) Change line 46 to suit your environment.
+2) Change line 68 to suit your environment.
 3) Chrome browser.
 
 --- !!! WARNING !!! ---
@@ -43,6 +43,7 @@ Please check the Voltages to be safe for your DUT!
 """
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from bokeh.layouts import layout
 from bokeh.io import show
 from bokeh.plotting import figure
@@ -50,6 +51,10 @@ from bokeh.models import ColumnDataSource
 from bokeh.palettes import viridis
 
 from P1125 import P1125, P1125API
+from p1125_events import event_intervals
+from p1125_decimate import bokeh_arrays
+from p1125_scope import wait_settled
+from p1125_intcurr import wait_complete, fetch, transfer_summary, SequentialMahr, measure_sequential, join_windows
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -84,6 +89,18 @@ VOUT_LIST = [3000, 2800, 2600, 2400, 2200]      # list of voltages over which to
 CONNECT_PROBE = False              # set to True to attach probe, !! Warning: check VOUT setting !!
 TIME_STOP_S = 30                   # seconds over which to measure the mAhr, 10-7200s
 intcurr_results = []               # list of results for every VOUT
+SETTLE_VOUT = False                # set to True to wait for the current to settle after each VOUT change,
+                                   #   instead of 1s, see p1125_scope.wait_settled()
+SETTLE_TIMEOUT_S = 2.0             # maximum settle wait, seconds
+SEQUENTIAL = False                 # set to True to stop each VOUT as soon as its mAhr is within SEQ_REL_ERROR,
+                                   #   instead of after TIME_STOP_S, see p1125_intcurr.SequentialMahr
+SEQ_WINDOW_S = 10                  # sub-window, seconds, several times the DUT duty cycle, 10-7200s
+SEQ_REL_ERROR = 0.01               # target relative error of the mAhr, confidence interval half width / mAhr
+SEQ_CONFIDENCE = 0.95              # confidence level, 0.90, 0.95 or 0.99
+SEQ_MIN_S = 30                     # minimum measurement per VOUT, seconds
+SEQ_MAX_S = 600                    # maximum measurement per VOUT, seconds
+TRANSFER_BYTES = False             # set to True to log the bytes downloaded per VOUT, costs about as much CPU
+                                   #   as decoding the window, see p1125_intcurr.fetch()
 do_dut_setup = False               # set to true if target setup is done by this script,
                                    #   otherwise it is assumed the target is setup manually before running
 
@@ -99,7 +116,7 @@ def plot_add(data, name, color="green"):
     :param color: string color, can be 'red', 'blue', or "#ABC123", ...
     :return: None
     """
-    source = ColumnDataSource(data=data)
+    source = ColumnDataSource(data=bokeh_arrays(data))  # numpy arrays are sent to the browser as binary
     plot.line(x="t", y="i", line_width=2, source=source, color=color, legend_label=name)
 
 
@@ -125,6 +142,49 @@ def plot_fini():
     show(doc_layout)
 
 
+def start_vout(vout, download=None):
+    """ Set VOUT, let the target settle and start the mAhr window
+
+    :param vout: mV
+    :param download: Future of fetch() of the previous window, it has to be done before the window is restarted
+    :return: success <True/False>
+    """
+    success, result = p1125.set_vout(vout)
+    if not success: return False
+
+    # pause here to let system power up to a certain state, change to suit your need
+    if SETTLE_VOUT:
+        if download is not None: download.result()  # settle captures use the acquisition
+        success, result = wait_settled(p1125, timeout_s=SETTLE_TIMEOUT_S)
+        logger.info("wait_settled: {}".format(result))
+        if not success: return False
+
+    else:
+        time.sleep(1)
+
+    if download is not None:
+        success, result = download.result()
+        if not success: return False
+
+    success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
+    return success
+
+
+def analyse(vout, intcurr_result):
+    """ Analyse a completed window, runs on the worker thread while the next VOUT is measured
+
+    :param vout: mV
+    :param intcurr_result: dict from p1125.intcurr_data()
+    :return: intcurr_result, tagged with 'vout', 'plot_arrays' and 'intervals'
+    """
+    intcurr_result["vout"] = vout  # tag this result with the voltage used, helpful later
+    intcurr_result["plot_arrays"] = bokeh_arrays(intcurr_result["plot"])
+
+    # D0/D1/Trig events split the current into intervals, see p1125_events.py
+    intcurr_result["intervals"] = event_intervals(intcurr_result)
+    return intcurr_result
+
+
 def main():
     """
     An example sequence of commands to make a measurement with the P1125 REST API
@@ -145,7 +205,7 @@ def main():
     success, result = p1125.calibrate()
     if not success: return False
 
-    success, result = p1125.intcurr_set(time_stop_s=TIME_STOP_S)
+    success, result = p1125.intcurr_set(time_stop_s=SEQ_WINDOW_S if SEQUENTIAL else TIME_STOP_S)
     if not success:
         logger.error(result)
         return False
@@ -165,59 +225,100 @@ def main():
         # for example, probe has just been connected, wait here for DUT to boot up
         time.sleep(2)  # change as required... this sleep is just a placeholder
 
-    # for every vout, measure the mAhrs
-    for vout in VOUT_LIST:
-        success, result = p1125.set_vout(vout)
+    if SETTLE_VOUT:  # settle captures are free running
+        success, result = p1125.set_trigger(src=P1125API.TRIG_SRC_NONE)
         if not success: return False
 
-        # pause here to let system power up to a certain state, change to suit your need
-        time.sleep(1)
-
-        success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
-        if not success: return False
+    # for every vout, measure the mAhrs, pipelined: as soon as a window completes the next
+    # VOUT is set and started, and the completed window is analysed on the worker thread
+    sweep_start = time.perf_counter()
+    success = start_vout(VOUT_LIST[0])
+    if not success: return False
 
-        logger.info("Time until data is ready... {:4d} seconds".format(TIME_STOP_S))
-        count_one_second = TIME_STOP_S
-        while count_one_second > 0:
-            count_one_second -= 1
-            time.sleep(1)
-            if count_one_second % 10 == 0:
-                logger.info("Time until data is ready... {:4d} seconds".format(count_one_second))
-
-        # check and see if Integrated Current is complete
-        while True:
-            success, intcurr_result = p1125.intcurr_data()
-            logger.info("{}, data collection time: {} / {}".format(intcurr_result["success"],
-                                                                   intcurr_result["time_s"],
-                                                                   intcurr_result["time_stop_s"]))
-            if not success: return False
-
-            if intcurr_result["time_s"] >= intcurr_result["time_stop_s"]: break
-
-            logger.info("Time until data is ready... extra {:4d} seconds".format(count_one_second))
-            count_one_second += 1
-            time.sleep(1)
-
-        success, result = p1125.acquisition_stop()
-        if not success: return False
+    window_start = time.perf_counter()
+    futures, dead, transfers, measured = [], [], [], []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for idx, vout in enumerate(VOUT_LIST):
+            download = None
+            if SEQUENTIAL:
+                # sub-windows until the mAhr is within SEQ_REL_ERROR, the last one is read here
+                estimate = SequentialMahr(rel_error=SEQ_REL_ERROR, confidence=SEQ_CONFIDENCE,
+                                          min_s=SEQ_MIN_S, max_s=SEQ_MAX_S)
+                success, sequential = measure_sequential(p1125, window_s=SEQ_WINDOW_S, estimate=estimate,
+                                                         measure_bytes=TRANSFER_BYTES)
+                if not success: return False
+
+                logger.info("VOUT: {:4d} mV, {}".format(vout, sequential["estimate"]))
+                intcurr_result = join_windows(sequential["windows"])
+                intcurr_result["estimate"] = sequential["estimate"]
+                transfers.append(sequential["transfer"])
+                measured.append(len(sequential["windows"]) * SEQ_WINDOW_S)
+
+            else:
+                logger.info("VOUT: {:4d} mV, time until data is ready... {:4d} seconds".format(vout, TIME_STOP_S))
+                success, complete = wait_complete(p1125, time_stop_s=TIME_STOP_S)
+                logger.info(complete)
+                if not success: return False
+
+                # download the window while the next VOUT is set and settles
+                download = pool.submit(fetch, p1125, measure_bytes=TRANSFER_BYTES)
+                measured.append(TIME_STOP_S)
+
+            if idx + 1 < len(VOUT_LIST):
+                success = start_vout(VOUT_LIST[idx + 1], download)
+                if not success: return False
+
+            if download is not None:
+                success, intcurr_result = download.result()
+                if not success: return False
+                transfers.append(transfer_summary(complete, intcurr_result))
+
+            futures.append(pool.submit(analyse, vout, intcurr_result))
+
+            # dead time, wall time of this VOUT not spent measuring
+            window_end = time.perf_counter()
+            dead.append(window_end - window_start - measured[-1])
+            logger.info("VOUT: {:4d} mV, measured {} s, dead time {:.2f} s, {requests} requests, {bytes} bytes, "
+                        "download {fetch_s:.2f} s".format(vout, measured[-1], dead[-1],
+                                                          **dict(transfers[-1], bytes=transfers[-1]["bytes"] or "-")))
+            window_start = window_end
+
+        intcurr_results.extend(future.result() for future in futures)
+
+    success, result = p1125.acquisition_stop()
+    if not success: return False
 
-        intcurr_result["vout"] = vout  # tag this result with the voltage used, helpful later
-        intcurr_results.append(intcurr_result)
+    sweep_s = time.perf_counter() - sweep_start
+    logger.info("{} VOUTs in {:.1f} s, measured {} s, dead time {:.1f} s (first VOUT setup {:.1f} s)".format(
+                len(VOUT_LIST), sweep_s, sum(measured), sum(dead), sweep_s - sum(dead) - sum(measured)))
+    if TRANSFER_BYTES:
+        logger.info("{} requests, {} bytes, {:.0f} bytes per VOUT".format(
+                    sum(t["requests"] for t in transfers), sum(t["bytes"] for t in transfers),
+                    sum(t["bytes"] for t in transfers) / len(transfers)))
+    else:
+        logger.info("{} requests".format(sum(t["requests"] for t in transfers)))
 
     success, result = p1125.probe(connect=False)
     logger.info(result)
     if not success: return False
 
     mahrs = {"vout": [], "mahr": []}
+    if SEQUENTIAL: mahrs["ci_mahr"] = []
     for intcurr_result in intcurr_results:
         vout = intcurr_result["vout"]
         # only plotting current for demo, can also plot D0/D1/Trig events
         logger.info("VOUT: {:4d} mV, t: {}".format(vout, intcurr_result["plot"]['t'][0:10]))
         logger.info("               i: {}".format(intcurr_result["plot"]['i'][0:10]))
-        plot_add(intcurr_result["plot"], "{}mV".format(vout), color=color_key_value_pairs[vout])
+        plot_add(intcurr_result["plot_arrays"], "{}mV".format(vout), color=color_key_value_pairs[vout])
+
+        intervals = intcurr_result["intervals"]
+        logger.info("               {} event intervals, max {:.1f} uC, peak {:.1f} uA".format(
+                    intervals["t_start"].size, intervals["charge_uc"].max(), intervals["peak_ua"].max()))
 
         mahrs["vout"].append(vout)
         mahrs["mahr"].append(intcurr_result["mahr"])
+        if SEQUENTIAL:  # achieved confidence interval, +/- mAhr
+            mahrs["ci_mahr"].append(intcurr_result["estimate"]["ci_mahr"])
 
     logger.info(mahrs)
     plot_add_mahr(mahrs, "mAhr", "green")
@@ -0,0 +1,264 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Live mAhr dashboard, the data is plotted as each capture window completes.
+
+The P1125 GUI can be open during the running of this script.
+
+The complete JSON-RPC API is viewable from the Main menu, or
+http://p1125_hostname/api/V1/browse
+
+Run this file,
+    $bokeh serve --show p1125_example_mahrs_live.py
+
+Requirements:
+1) Python 3.6+ and bokeh 2.4.3 (pip3 install bokeh) or greater installed.
+2) Change line 81 to suit your environment.
+3) Chrome browser.
+
+Notes:
+1) Each completed window is decimated to WINDOW_POINTS (min/max, see p1125_decimate.py)
+   and appended to the plot with ColumnDataSource.stream(), the plot keeps the last
+   ROLLOVER_POINTS points, so the browser payload and memory are bounded and the
+   dashboard can run for days.
+2) bokeh serve runs this script for every browser session (tab or reload), the P1125
+   is owned by one SharedAcquisition (see p1125_intcurr.py) shared by the sessions,
+   which only subscribe to the windows.  The P1125 is set up by the first session,
+   and the acquisition stopped and the P1125 torn down when the last session is
+   closed, or the server is stopped.
+
+--- !!! WARNING !!! ---
+if CONNECT_PROBE is True, this example connects the PROBE at VOUT mV
+
+"""
+import time
+import logging
+import datetime
+from functools import partial
+from bokeh.layouts import row, column
+from bokeh.plotting import figure, curdoc
+from bokeh.models import ColumnDataSource, DatetimeTickFormatter, Div
+
+from P1125 import P1125, P1125API
+from p1125_decimate import decimate, bokeh_arrays
+from p1125_stats import StreamStats
+from p1125_events import sample_durations
+from p1125_intcurr import SharedAcquisition
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+FORMAT = "%(asctime)s: %(funcName)25s %(lineno)4s - %(levelname)-5.5s : %(message)s"
+formatter = logging.Formatter(FORMAT)
+consoleHandler = logging.StreamHandler()
+consoleHandler.setFormatter(formatter)
+consoleHandler.set_name(__file__)
+if all(handler.get_name() != __file__ for handler in logger.handlers):  # once, the script runs for every session
+    logger.addHandler(consoleHandler)
+
+# NOTE: Change to P1125 IP address or hostname
+P1125_URL = "p1125-####.local"  # for example, p115-a12b.local, or 192.168.0.123
+P1125_API = "/api/V1"
+URL = "http://" + P1125_URL + P1125_API
+
+if "p1125-####.local" in P1125_URL:
+    logger.error("Please set P1125_URL with valid IP/Hostname")
+    exit(1)
+
+# Change these parameters to suit your needs:
+VOUT = 4000                   # mV, output voltage, 1800-8200 mV
+CONNECT_PROBE = False         # set to True to attach probe, !! Warning: check VOUT setting !!
+TIME_CAPTURE_WINDOW_S = 30    # seconds over which to measure the AVERAGE mAhr, 10-7200s
+WAIT_POLLING_TIME_S = 0.5     # time to wait between polls whilst waiting for TIME_CAPTURE_WINDOW_S to complete
+WINDOW_POINTS = 600           # points streamed to the browser per window
+ROLLOVER_POINTS = 100 * WINDOW_POINTS  # points kept in the current plot, ~100 windows
+ROLLOVER_WINDOWS = 10000      # windows kept in the mAhr/peak plot
+setup_done = False            # set flag if target is manually setup and ready to go
+
+PLOT_MIN = 0.01
+PLOT_MAX = 1000000
+
+doc = curdoc()
+run_stats = StreamStats()     # whole run current statistics, of this session
+G = {
+    "t_offset_s": 0.0,        # run time at the start of the next window
+    "windows": 0,             # windows received
+}
+
+plot_rt = figure(title="Current vs Time", toolbar_location="above", y_range=(PLOT_MIN, PLOT_MAX),
+                 y_axis_type="log", width=800, tools="pan,wheel_zoom,box_zoom,reset")
+plot_rt.xaxis.axis_label = "Run Time (S)"
+plot_rt.yaxis.axis_label = "Current (uA)"
+source_rt = ColumnDataSource(data={"t": [], "i": [], "i_max": []})
+plot_rt.line(x="t", y="i", line_width=2, source=source_rt, legend_label="Current (uA)")
+plot_rt.line(x="t", y="i_max", line_width=1, source=source_rt, legend_label="Peak Current (uA)", color="red")
+
+plot_win = figure(title="mAhr and Peak per Window", toolbar_location="above", y_range=(PLOT_MIN, PLOT_MAX),
+                  y_axis_type="log", x_axis_type="datetime", width=800, tools="pan,wheel_zoom,box_zoom,reset")
+plot_win.xaxis.formatter = DatetimeTickFormatter(minutes=["%m/%d %H:%M"])
+plot_win.xaxis.axis_label = "Datetime"
+source_win = ColumnDataSource(data={"dt": [], "mAhr": [], "i_max_ua": []})
+plot_win.circle(x="dt", y="mAhr", size=5, source=source_win, color="green", legend_label="mAhr")
+plot_win.line(x="dt", y="mAhr", line_width=2, source=source_win, color="green", legend_label="mAhr")
+plot_win.circle(x="dt", y="i_max_ua", size=5, source=source_win, color="red", legend_label="Max uA")
+
+tile_window = Div(text="Waiting for first window...")
+tile_run = Div(text="")
+
+
+def update(intcurr_result, window_stats):
+    """ Add a completed window to the dashboard, runs in the bokeh document thread
+
+    :param intcurr_result: dict from p1125.intcurr_data()
+    :param window_stats: StreamStats of the window
+    :return: None
+    """
+    start = time.perf_counter()
+    run_stats.merge(window_stats)
+    G["windows"] += 1
+
+    # run time can be days, so 't' is float64
+    data = bokeh_arrays(decimate(intcurr_result["plot"], max_points=WINDOW_POINTS), float64_keys=("t",))
+    data["t"] = data["t"] + G["t_offset_s"]
+    G["t_offset_s"] += intcurr_result["time_s"]
+    source_rt.stream(data, rollover=ROLLOVER_POINTS)
+
+    i_max_ua = max(intcurr_result["plot"]["i_max"])
+    source_win.stream({"dt": [datetime.datetime.now()],
+                       "mAhr": [intcurr_result["mahr"]],
+                       "i_max_ua": [i_max_ua]}, rollover=ROLLOVER_WINDOWS)
+
+    tile_window.text = "Window {}: mAhr {:.4f}, Peak {:.1f} uA, Avg {:.1f} uA, {} samples".format(
+                       G["windows"], intcurr_result["mahr"], i_max_ua, window_stats.mean, intcurr_result["samples"])
+    r = run_stats.result()
+    tile_run.text = "Run {:.0f} s: Avg {:.1f} uA, Stdev {:.1f} uA, Max {:.1f} uA, p99 {:.1f} uA".format(
+                    G["t_offset_s"], r["mean"], r["stdev"], r["max"], r["p99"])
+    logger.info("window {}, {} points streamed in {:.1f} ms".format(
+                G["windows"], len(data["t"]), (time.perf_counter() - start) * 1000.0))
+
+
+def shared_acquisition():
+    """ The acquisition shared by every session, see p1125_intcurr.SharedAcquisition
+
+    - bokeh clears the globals of this script when its session is destroyed, the
+      functions below outlive the session that created them, so they only use the
+      locals of this function
+
+    :return: SharedAcquisition
+    """
+    log, api, sleep, stream_stats, durations = logger, P1125API, time.sleep, StreamStats, sample_durations
+    vout, connect_probe, time_stop_s, manual_setup = VOUT, CONNECT_PROBE, TIME_CAPTURE_WINDOW_S, setup_done
+
+    def setup(p1125):
+        """ setup the P1125 and DUT, see p1125_example_mahrs_logging.py, by the first session
+
+        :return: success <True/False>
+        """
+        success, status = p1125.status()
+        log.info(status)
+        if not success: return False
+
+        if status["aqc_in_progress"]:  # stop any previously running acquisition
+            success, result = p1125.acquisition_stop()
+            if not success: return False
+
+        success, result = p1125.calibrate()
+        log.info(result)
+        if not success: return False
+
+        success, result = p1125.intcurr_set(time_stop_s=time_stop_s)
+        log.info(result)
+        if not success: return False
+
+        if not manual_setup:
+            success, result = p1125.probe(connect=False)
+            if not success: return False
+
+            success, result = p1125.set_vout(vout)
+            if not success: return False
+
+            # connect probe - ! make sure VOUT is right !
+            success, result = p1125.probe(connect=connect_probe)
+            if not success: return False
+
+            # !!!!!!!!!!!! CHANGE THIS SECTION TO SUIT YOUR TARGET !!!!!!!!!!!!!!!!!!!
+            # test load (NO DUT), CONNECT_PROBE=False, REMOVE THIS FOR YOUR DUT
+            success, result = p1125.set_cal_load(loads=[api.DEMO_CAL_LOAD_2K])
+            if not success: return False
+
+            sleep(1)
+            # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+
+        return True
+
+    def teardown(p1125):
+        """ After the acquisition is stopped, when the last session is closed or the server stops
+
+        :return: None
+        """
+        if not manual_setup:
+            p1125.set_cal_load(loads=[api.DEMO_CAL_LOAD_NONE])
+            p1125.probe(connect=False)
+
+    def window_stats(intcurr_result):
+        """ Duration weighted statistics of a window, once per window, shared by the sessions
+
+        :return: intcurr_result, StreamStats of the window
+        """
+        stats = stream_stats().update(intcurr_result["plot"]["i"], weights=durations(intcurr_result["plot"]["t"]))
+        return intcurr_result, stats
+
+    return SharedAcquisition.shared(URL, lambda: SharedAcquisition(P1125(url=URL, loggerIn=log), time_stop_s=time_stop_s,
+                                                                  setup=setup, teardown=teardown, process=window_stats,
+                                                                  poll_s=WAIT_POLLING_TIME_S))
+
+
+def main():
+    """
+    Live dashboard of the mAhr acquisition, run with "bokeh serve", for every session
+    """
+    acquisition = shared_acquisition()
+    success, ping = acquisition.p1125.ping()
+    logger.info(ping)
+    if not success: return False
+
+    # the callbacks bind what they use, they can run after this script's globals are cleared
+    def on_window(value, doc=doc, update=update, partial=partial):
+        """ SharedAcquisition subscriber, runs in the acquisition thread """
+        doc.add_next_tick_callback(partial(update, *value))
+
+    def on_session_destroyed(session_context, acquisition=acquisition, on_window=on_window):
+        acquisition.unsubscribe(on_window)
+
+    success = acquisition.subscribe(on_window)
+    if not success: return False
+
+    hdr = Div(text="P1125: {}, {}, {}, VOUT {} mV, TIME_CAPTURE_WINDOW_S {} sec".format(
+              ping["version"], ping["rpi_serial"], ping["url"], VOUT, TIME_CAPTURE_WINDOW_S))
+    doc.add_root(column(hdr, row(tile_window, tile_run), row(plot_rt, plot_win)))
+    doc.on_session_destroyed(on_session_destroyed)
+    return True
+
+
+if not main(): logger.error("failed")
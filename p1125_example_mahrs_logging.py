@@ -35,7 +35,7 @@ Run this file,
 
 Requirements:
 1) Python 3.6+ and bokeh 2.3.0 (pip3 install bokeh) or greater installed.
-2) Change line 61 to suit your environment.
+2) Change line 64 to suit your environment.
 3) Chrome browser.
 
 --- !!! WARNING !!! ---
@@ -48,6 +48,9 @@ import logging
 import datetime
 
 from P1125 import P1125, P1125API
+from p1125_stats import StreamStats
+from p1125_events import sample_durations
+from p1125_swtrigger import SoftwareTrigger
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -74,11 +77,26 @@ TIME_TOTAL_RUN_S = 30 * 2     # seconds, total run time of the log
 LOG_FILE_PATH = "./"          # path to output file
 
 WRITE_PLOT_DATA = True        # flag for write_data()
+WRITE_STATS = True            # flag for write_data(), per window and whole run current statistics
 WAIT_POLLING_TIME_S = 0.5     # time to wait between polls whilst waiting for TIME_CAPTURE_WINDOW_S to complete
 
+# software trigger, write only the plot data around triggers instead of the whole window, see p1125_swtrigger.py
+SW_TRIGGER_LEVEL_UA = None    # uA, None to disable, for example 5000
+SW_TRIGGER_SLOPE = P1125API.TRIG_SLOPE_RISE
+SW_TRIGGER_HYSTERESIS_UA = 0  # uA
+SW_TRIGGER_HOLDOFF_S = 1.0    # seconds, minimum time between triggers
+SW_TRIGGER_PRE_S = 1.0        # seconds of data kept before the trigger
+SW_TRIGGER_POST_S = 2.0       # seconds of data kept after the trigger
+
 p1125 = P1125(url=URL, loggerIn=logger)
 filename = datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".py"
 setup_done = False            # set flag if target is manually setup and ready to go
+run_stats = StreamStats()     # whole run current statistics, see write_data()
+sw_trigger = None
+if SW_TRIGGER_LEVEL_UA is not None:
+    sw_trigger = SoftwareTrigger(level_ua=SW_TRIGGER_LEVEL_UA, slope=SW_TRIGGER_SLOPE,
+                                 hysteresis_ua=SW_TRIGGER_HYSTERESIS_UA, holdoff_s=SW_TRIGGER_HOLDOFF_S,
+                                 pre_s=SW_TRIGGER_PRE_S, post_s=SW_TRIGGER_POST_S)
 
 
 def wait_for_measurement():
@@ -144,9 +162,12 @@ def write_data_header(ping, status):
     return True
 
 
-def write_data(intcurr_result):
+def write_data(intcurr_result, last=False):
     """ write data
     - create a list of dicts with data
+    - with the software trigger, the segments completed by this window are written
+      as 'sw_trigger': [{'t_trigger': [...], 't': [...], 'i': [...], 'i_max': [...]}, ...],
+      't' is the run time in seconds, instead of the window 'plot'
 
     - available fields are, use print(intcurr_result) to see all,
     {'success': True,
@@ -165,6 +186,7 @@ def write_data(intcurr_result):
     - save only the data you need...
 
     :param intcurr_result: dict of data
+    :param last: True for the last window of the run, completes any open software trigger segment
     :return: success <True/False>
     """
     # uncomment this to see what fields are available
@@ -172,6 +194,15 @@ def write_data(intcurr_result):
 
     max_window_current_ua = max(intcurr_result["plot"]["i_max"])
 
+    if WRITE_STATS:
+        window_stats = StreamStats().update(intcurr_result["plot"]["i"],
+                                            weights=sample_durations(intcurr_result["plot"]["t"]))
+        run_stats.merge(window_stats)
+
+    if sw_trigger is not None:
+        segments = sw_trigger.process(intcurr_result)
+        if last: segments += sw_trigger.flush()
+
     try:
         with open(os.path.join(LOG_FILE_PATH, filename), "a+") as f:
             dt = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -182,11 +213,19 @@ def write_data(intcurr_result):
                     max_window_current_ua,
                     intcurr_result["samples"]))
 
-            if WRITE_PLOT_DATA:  # or if intcurr_result["iavg_max_ua"/"mahr"] > YOUR_THRESHOLD_HERE
+            if sw_trigger is not None:
+                segments = [{key: value if key == "t_trigger" else value.tolist() for key, value in segment.items()}
+                            for segment in segments]
+                f.write(f"'sw_trigger': {segments},")
+
+            elif WRITE_PLOT_DATA:  # or if intcurr_result["iavg_max_ua"/"mahr"] > YOUR_THRESHOLD_HERE
                 f.write(f"'plot': {intcurr_result['plot']},")
 
                 # NOTE: plot data may be reduced, successive results with near same values removed, to save memory
 
+            if WRITE_STATS:
+                f.write(f"'stats': {window_stats.result()},")
+
             # TODO: add more stuff as required...
 
             f.write("},\n")
@@ -200,12 +239,15 @@ def write_data(intcurr_result):
 
 def write_data_footer():
     """ write footer to log file
+    - the whole run current statistics are written after the data
 
     :return: success <True/False>
     """
     try:
         with open(os.path.join(LOG_FILE_PATH, filename), "a+") as f:
             f.write("]\n")
+            if WRITE_STATS:
+                f.write("p1125_stats = {}\n".format(run_stats.result()))
 
     except Exception as e:
         logger.error(e)
@@ -260,7 +302,7 @@ def main():
         logger.info(result)
         if not success: return False
 
-    success, result = p1125.set_vout(VOUT)
+        success, result = p1125.set_vout(VOUT)
         logger.info(result)
         if not success: return False
 
@@ -280,7 +322,7 @@ def main():
         logger.info("set_cal_load: {}".format(result))
         if not success: return False
 
-    # pause here to let system power up to a certain state, change to suit your need
+        # pause here to let system power up to a certain state, change to suit your need
         time.sleep(1)
 
         # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
@@ -316,9 +358,13 @@ def main():
             if not success: return False
 
         # data is ready... write to file
-        success = write_data(intcurr_result)
+        success = write_data(intcurr_result, last=True)
         if not success: return False
 
+        if sw_trigger is not None:
+            logger.info("software trigger: {} triggers, {} of {} samples written".format(
+                        sw_trigger.triggers, sw_trigger.samples_out, sw_trigger.samples_in))
+
     except Exception as e:
         logger.error(e)
 
@@ -34,20 +34,26 @@ Requirements:
 
 Notes:
 1) mAhr is plotted in mA, and other currents are plotted in uA
+2) The real time plot is decimated (min/max per pixel) to PLOT_RT_MAX_POINTS, zooming in
+   fetches finer detail of the zoomed range
 
 """
 import os
+import time
 import argparse
 import logging
-import importlib.util
 import datetime
+import numpy as np
 from bokeh.layouts import row, column
 from bokeh.plotting import figure, curdoc
 from bokeh.models import ColumnDataSource, DatetimeTickFormatter, Div
 from bokeh.models.widgets.inputs import Select
-from bokeh.events import DoubleTap
+from bokeh.events import DoubleTap, RangesUpdate, Reset
 from bokeh.models import HoverTool, BoxZoomTool, ResetTool, UndoTool, PanTool, WheelZoomTool
 
+from p1125_decimate import decimate, bokeh_arrays
+from p1125_mahrs_log import load_log, load_summary
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 FORMAT = "%(asctime)s: %(funcName)25s %(lineno)4s - %(levelname)-5.5s : %(message)s"
@@ -58,10 +64,17 @@ logger.addHandler(consoleHandler)
 
 PLOT_MIN = 0.01
 PLOT_MAX = 1000000
+PLOT_RT_WIDTH = 800
+PLOT_RT_MAX_POINTS = 2 * PLOT_RT_WIDTH  # min and max point per pixel
 
 G = {  # global variables
     "select_options": [],  # holds select drop down options, as tuple (idx, name)
-    "d": None              # data for the real time plot ColumnDataSource()
+    "d": None,             # data for the real time plot ColumnDataSource(), loaded on first use, see log_data()
+    "file": None,          # log file name
+    "summary": None,       # per window summary table, see p1125_mahrs_log.load_summary()
+    "rt": None,            # selected window plot data, as numpy arrays, see plot_rt_select()
+    "select_t": None,      # sorted times of select options, epoch seconds, see select_index_build()
+    "select_keys": None,   # p1125_data index of each G["select_t"]
 }
 
 
@@ -80,33 +93,62 @@ source_sel = ColumnDataSource(data=dict(x=[], y=[]))
 plot.line(x="t", y="y", line_width=6, line_alpha=0.6, source=source_sel)  # select line
 
 
+def select_index_build():
+    """ Build a sorted time index of G["select_options"], for select_index_nearest()
+
+    :return: None
+    """
+    keys = np.array([int(idx) for idx, _ in G["select_options"]], dtype=np.intp)
+    t = G["summary"]["t"][keys].astype("datetime64[s]").astype(np.int64).astype(np.float64)
+    order = np.argsort(t, kind="stable")
+    G["select_t"] = t[order]
+    G["select_keys"] = keys[order]
+
+
+def select_dt(key):
+    """ datetime of a window
+
+    :param key: index into p1125_data
+    :return: datetime.datetime
+    """
+    return G["summary"]["t"][key].astype("datetime64[s]").astype(datetime.datetime)
+
+
+def select_index_nearest(t_s):
+    """ Find the select option nearest in time, by bisection
+
+    :param t_s: time, epoch seconds
+    :return: position in G["select_t"]/G["select_keys"], None if there are no options
+    """
+    if G["select_t"] is None or G["select_t"].size == 0: return None
+
+    pos = int(np.searchsorted(G["select_t"], t_s))
+    if pos == G["select_t"].size: return pos - 1
+    if pos > 0 and t_s - G["select_t"][pos - 1] <= G["select_t"][pos] - t_s: return pos - 1
+    return pos
+
+
 def cb_plot(event):
     # user selected a point on the plot, use that point to determine what real time data to plot
     logger.info("{} {}".format(event.x, event.y))
-    dt = datetime.datetime.utcfromtimestamp(int(event.x / 1000))
-    logger.info(dt)
 
     # find the closest real data and align to that
-    # TODO: find the closest
-    item = None
-    for item in G["select_options"]:
-        # recall that G["select_options"] only has items with plot data, so the user
-        # can't select data points that have no data.  So if the log file has filtered
-        # data, and not all points have data, then the user can't select - cause there is no data
-
-        sel_dt = datetime.datetime.strptime(item[1], '%Y%m%d-%H%M%S')
-        if sel_dt > dt: break  # found closest data point
-
-    if item:  # only allows items with plot data
-        key = int(item[0])
-        source_rt.data = G['d'].p1125_data[key]['plot']
+    # recall that G["select_options"] only has items with plot data, so the user
+    # can't select data points that have no data.  So if the log file has filtered
+    # data, and not all points have data, then the closest point with data is selected
+    pos = select_index_nearest(event.x / 1000.0)
+    if pos is not None:
+        key = int(G["select_keys"][pos])
+        sel_dt = select_dt(key)
+        logger.info(sel_dt)
+        plot_rt_select(key)
         source_sel.data = {'t': [sel_dt, sel_dt], 'y': [PLOT_MIN, PLOT_MAX]}
 
 
 plot.on_event(DoubleTap, cb_plot)
 
 # this plot for the realtime data, if available
-plot_rt = figure(toolbar_location="above", y_range=(PLOT_MIN, PLOT_MAX), y_axis_type="log", width=800)
+plot_rt = figure(toolbar_location="above", y_range=(PLOT_MIN, PLOT_MAX), y_axis_type="log", width=PLOT_RT_WIDTH)
 source_rt = ColumnDataSource(data=dict(x=[], y=[]))
 l = plot_rt.line(x="t", y="i", line_width=2, source=source_rt, legend_label="Current (uA)")
 plot_rt.line(x="t", y="i_max", line_width=2, source=source_rt, legend_label="Peak Current (uA)", color="red")
@@ -121,30 +163,79 @@ ht = HoverTool(
 plot_rt.tools = [ht, BoxZoomTool(), WheelZoomTool(dimensions="width"), ResetTool(), UndoTool(),
               PanTool(dimensions="width")]
 
+
+def plot_rt_update(x_start=None, x_end=None):
+    """ Update the real time plot with the selected window, decimated to the visible range
+
+    :param x_start: start of visible range, seconds, None for start of window
+    :param x_end: end of visible range, seconds, None for end of window
+    :return: None
+    """
+    if G["rt"] is None: return
+
+    start = time.perf_counter()
+    data = decimate(G["rt"], x_start, x_end, max_points=PLOT_RT_MAX_POINTS)
+    decimated = time.perf_counter()
+    source_rt.data = data
+    logger.info("{} of {} points, decimate {:.1f} ms, update {:.1f} ms".format(
+                len(data["t"]), len(G["rt"]["t"]),
+                (decimated - start) * 1000.0, (time.perf_counter() - decimated) * 1000.0))
+
+
+def plot_rt_select(key):
+    """ Select the window to show in the real time plot
+
+    :param key: index into p1125_data
+    :return: None
+    """
+    G["rt"] = bokeh_arrays(log_data()[key]['plot'])
+    plot_rt_update()
+
+
+def cb_plot_rt_range(event):
+    # user zoomed/panned the real time plot, refetch detail for the new range
+    plot_rt_update(event.x0, event.x1)
+
+
+def cb_plot_rt_reset(event):
+    plot_rt_update()
+
+
+plot_rt.on_event(RangesUpdate, cb_plot_rt_range)
+plot_rt.on_event(Reset, cb_plot_rt_reset)
+
 doc_layout = curdoc()
 
 
-def extract_data(d, keys):
+def log_data():
+    """ The log file data, the log file is loaded on first use
+
+    :return: p1125_log.p1125_data
+    """
+    if G['d'] is None:
+        start = time.perf_counter()
+        G['d'] = load_log(G["file"])
+        logger.info("loaded {} in {:.1f} s".format(G["file"], time.perf_counter() - start))
+
+    return G['d'].p1125_data
+
+
+def extract_data(summary, keys):
     """ Extract key for plotting
     - create a dict of 't' (time) and 'y' for plotting
-    - keys can be one of 'mAhr' or 'iavg_max_ua', or others, it depends on what is available
+    - keys can be one of 'mAhr' or 'i_max_ua', or others, see p1125_mahrs_log.SUMMARY_KEYS
 
     :param keys: list of keys to extract
-    :param d: always p1125_log.p1125_data
+    :param summary: always G["summary"]
     :return: None on error, dict on success
     """
-    data = {"t": []}
-    for key in keys: data[key] = []
-    for item in d:
-        dt = datetime.datetime.strptime(item['datetime'], '%Y%m%d-%H%M%S')
-        data['t'].append(dt)
+    data = {"t": summary["t"]}
+    for key in keys:
+        if key not in summary:
+            logger.error("invalid key {}, not in {}".format(key, list(summary.keys())))
+            return None
 
-        for key in keys:
-            if key not in item:
-                logger.error("invalid key {}, not in {}".format(key, item))
-                return None
-
-            data[key].append(item[key])
+        data[key] = summary[key]
 
     return data
 
@@ -153,29 +244,29 @@ def callback(attr, old, new):
     logger.info("{} {} {}".format(attr, old, new))
     key = int(new)
     logger.info(key)
-    #logger.info(G['d'].p1125_data[key])
-    source_rt.data = G['d'].p1125_data[key]['plot']
+    plot_rt_select(key)
 
-    dt = datetime.datetime.strptime(G['d'].p1125_data[key]['datetime'], '%Y%m%d-%H%M%S')
+    dt = select_dt(key)
     logger.info(dt)
     source_sel.data = {'t': [dt, dt], 'y': [PLOT_MIN, PLOT_MAX]}
 
 
-def create_select_widget(d):
+def create_select_widget(summary):
     """  Add a Select widget that has a list of all the datetimes from the P1125 logging data
     - this allows the user to select which datetime to plot the detail of
 
-    :param d: always p1125_log.p1125_data
+    :param summary: always G["summary"]
     :return: nothing
     """
-    for idx, item in enumerate(d):
+    for idx in np.flatnonzero(summary["has_plot"]):  # only put in options that have plot data
 
         # TODO: you can add filtering here, for example, only add items that exceed a certain
         #       maximum mahr...
-        #if item['iavg_max_ua'] > YOUR_VALUE:
+        #if summary['i_max_ua'][idx] > YOUR_VALUE:
+
+        G["select_options"].append(('{}'.format(idx), '{}'.format(summary['datetime'][idx]),))
 
-        if 'plot' in item:  # only put in options that have plot data
-            G["select_options"].append(('{}'.format(idx), '{}'.format(item['datetime']),))
+    select_index_build()
 
     s = Select(options=G["select_options"], value=None, title="Select Date",)
     s.on_change("value", callback)
@@ -205,22 +296,18 @@ def main():
         logger.error("file does not exist, {}".format(args.file))
         exit(1)
     logger.info(args.file)
+    G["file"] = args.file
 
-    try:
-        spec = importlib.util.spec_from_file_location("p1125_log", args.file)
-        G['d'] = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(G['d'])
-
-    except Exception as e:
-        logger.error(e)
-        return False
+    # the summary is cached next to the log file, so only the first open has to load the log
+    G["summary"] = load_summary(args.file)
+    if G["summary"] is None: return False
 
-    logger.info(G['d'].p1125_ping)
-    logger.info(G['d'].p1125_status)
-    logger.info(G['d'].p1125_settings)
-    #logger.info(G['d'].p1125_data)  # uncomment to see imported fields/data
+    meta = G["summary"]["meta"]
+    logger.info(meta["p1125_ping"])
+    logger.info(meta["p1125_status"])
+    logger.info(meta["p1125_settings"])
 
-    plot_data = extract_data(G['d'].p1125_data, ['mAhr', 'i_max_ua'])
+    plot_data = extract_data(G["summary"], ['mAhr', 'i_max_ua'])
     if plot_data is not None:
         source = ColumnDataSource(data=plot_data)
         plot.circle(x="t", y="mAhr", size=5, source=source, color="green", legend_label='mAhr')
@@ -241,19 +328,21 @@ def main():
     else:
         logger.error("extract_data failed")
 
-    s = create_select_widget(G['d'].p1125_data)
+    s = create_select_widget(G["summary"])
 
     hdr1 = Div(text="""Setup: VOUT {} mV, TIME_CAPTURE_WINDOW_S {} sec, {} sec""".format(
-            G['d'].p1125_settings["VOUT"], G['d'].p1125_settings["TIME_CAPTURE_WINDOW_S"], G['d'].p1125_settings["TIME_TOTAL_RUN_S"]))
+            meta["p1125_settings"]["VOUT"], meta["p1125_settings"]["TIME_CAPTURE_WINDOW_S"], meta["p1125_settings"]["TIME_TOTAL_RUN_S"]))
 
     hdr2 = Div(text="""P1125: {}, {}, {}, {} degC""".format(
-            G['d'].p1125_ping["version"], G['d'].p1125_ping["rpi_serial"], G['d'].p1125_ping["url"],
-            G['d'].p1125_status["temperature_degc"]))
-
-    # init the first data to plot
-    source_rt.data = G['d'].p1125_data[0]['plot']
-    dt = datetime.datetime.strptime(G['d'].p1125_data[0]['datetime'], '%Y%m%d-%H%M%S')
-    source_sel.data = {'t': [dt, dt], 'y': [PLOT_MIN, PLOT_MAX]}
+            meta["p1125_ping"]["version"], meta["p1125_ping"]["rpi_serial"], meta["p1125_ping"]["url"],
+            meta["p1125_status"]["temperature_degc"]))
+
+    # init the first data to plot, after the page is shown as this may have to load the log file
+    if G["select_options"]:
+        key = int(G["select_options"][0][0])
+        dt = select_dt(key)
+        source_sel.data = {'t': [dt, dt], 'y': [PLOT_MIN, PLOT_MAX]}
+        doc_layout.add_next_tick_callback(lambda: plot_rt_select(key))
 
     doc_layout.add_root(column(hdr1, hdr2, s, row(plot, plot_rt)))
     return True
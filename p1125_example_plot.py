@@ -33,7 +33,7 @@ Run this file,
 
 Requirements:
 1) Python 3.6+ and bokeh 2.3.0 (pip3 install bokeh) or greater installed.
-2) Change line 61 to suit your environment.
+2) Change line 62 to suit your environment.
 3) Chrome browser.
 
 --- !!! WARNING !!! ---
@@ -48,6 +48,8 @@ from bokeh.models import ColumnDataSource
 from bokeh.models import HoverTool, BoxZoomTool, ResetTool, UndoTool, PanTool, WheelZoomTool
 
 from P1125 import P1125, P1125API
+from p1125_decimate import bokeh_arrays
+from p1125_scope import autorange
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -74,6 +76,7 @@ doc_layout = layout()
 
 VOUT = 4000                       # mV, output voltage, 2000-8000 mV
 SPAN = P1125API.TBASE_SPAN_100MS  # set timebase
+AUTORANGE = False                 # set to True to choose the shortest SPAN that fits the activity, see p1125_scope.py
 CONNECT_PROBE = False             # set to True to attach probe, !! Warning: check VOUT setting !!
 
 
@@ -85,7 +88,7 @@ def plot_add(data, name, color="green"):
     :param color: string color, can be 'red', 'blue', or "#ABC123", ...
     :return: line object to be included in Hover tool
     """
-    source = ColumnDataSource(data=data)
+    source = ColumnDataSource(data=bokeh_arrays(data))  # numpy arrays are sent to the browser as binary
     return plot.line(x="t", y="i", line_width=2, source=source, color=color, legend_label=name)
 
 
@@ -142,6 +145,11 @@ def main():
     logger.info(result)
     if not success: return False
 
+    if AUTORANGE:
+        success, result = autorange(p1125)
+        logger.info("autorange: {} ({} captures in {:.1f} s)".format(result["span"], result["captures"], result["elapsed_s"]))
+        if not success: return False
+
     success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_SINGLE)
     logger.info(result)
     if not success: return False
@@ -33,18 +33,29 @@ Run this file,
 
 Requirements:
 1) Python 3.6+ and bokeh 2.4.3 (pip3 install bokeh) or greater installed.
-2) Change line 64 to suit your environment.
+2) Change line 84 to suit your environment.
 3) Chrome browser.
 
 Notes:
 1) Sigma Plot green and red circle are correlated in size, but are not
    sized according to the x/y axis.
+2) Add more P1125s to P1125_URLS to characterize a batch of units, each unit
+   runs its own sweep in a thread, so the total time is that of the slowest unit.
+   A CSV is written per unit, p1125_<serial>, and a summary of all the units
+   to SUMMARY_CSV.
+3) The points are ordered by p1125_sweep.plan_sweep() to minimize VOUT changes and
+   relay switches, the estimated and actual sweep times are logged.
+4) With CHECKPOINT, every completed point is saved to p1125_<serial>.checkpoint,
+   if the script is interrupted, running it again only measures the remaining
+   points of each unit.  The checkpoint is removed when the unit sweep completes.
+5) The points of every unit are added to the RESULTS_DB database, see p1125_db.py.
 
 """
 import traceback
-from time import sleep
-import statistics
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 PLOT_RESULTS = False
 if PLOT_RESULTS:
@@ -55,6 +66,10 @@ if PLOT_RESULTS:
     from bokeh.models import HoverTool, BoxZoomTool, ResetTool, UndoTool, PanTool, ZoomInTool
 
 from P1125 import P1125, P1125API
+from p1125_scope import wait_settled, TBASE_SPAN_S
+from p1125_sweep import plan_sweep, SweepCheckpoint
+from p1125_stats import capture_stats
+from p1125_db import ResultsDB
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -65,41 +80,22 @@ consoleHandler = logging.StreamHandler()
 consoleHandler.setFormatter(formatter)
 logger.addHandler(consoleHandler)
 
-# NOTE: Change to P1125 IP address or hostname
-P1125_URL = "p1125-####.local"  # for example, p115-a12b.local, or 192.168.0.123
+# NOTE: Change to P1125 IP address or hostname, add more units to sweep them in parallel
+P1125_URLS = ["p1125-####.local"]  # for example, ["p115-a12b.local", "192.168.0.123"]
 P1125_API = "/api/V1"
-URL = "http://" + P1125_URL + P1125_API
 WRITE_CVS = True
+SUMMARY_CSV = "p1125_summary.csv"
+CHECKPOINT = True             # resume an interrupted sweep, see SweepCheckpoint
+RESULTS_DB = "p1125_results.db"  # results database, see p1125_db.py, None to disable
 
-if "p1125-####.local" in P1125_URL:
-    logger.error("Please set P1125_URL with valid IP/Hostname")
+if any("p1125-####.local" in url for url in P1125_URLS):
+    logger.error("Please set P1125_URLS with valid IP/Hostname")
     exit(1)
 
-p1125 = P1125(url=URL, loggerIn=logger)
-data = {"vout": [], "min": [], "max": [], "avg": [], "exp": [], "res": [], "sigma": [], "sigma_percent": [],
-        "sigma_pass_circle": []}  # global dict to hold plotting vectors
-
 if PLOT_RESULTS:
     # bokeh plot setup
     PLOT_WIDTH = 600
     PLOT_HEIGHT = 800
-    plot = figure(toolbar_location="above", width=PLOT_WIDTH, height=PLOT_HEIGHT, y_range=(1, 2000000),
-                  y_axis_type="log", title="Current Min/Avg/Max/Expected vs VOUT")
-    plot.xaxis.axis_label = "VOUT (mV)"
-    plot.yaxis.axis_label = "Current (uA)"
-
-    plot_sigma = figure(toolbar_location="above", width=PLOT_WIDTH, height=PLOT_HEIGHT, y_range=(1, 2000000),
-                        y_axis_type="log", title="RMS Noise (as % of Expected) vs VOUT")
-    plot_sigma.xaxis.axis_label = "VOUT (mV)"
-    plot_sigma.yaxis.axis_label = "Current (uA)"
-
-    plot_errp = figure(toolbar_location="above", width=PLOT_WIDTH, height=PLOT_HEIGHT, y_range=(1, 2000000),
-                       y_axis_type="log", title="Peak Error (as % of Expected) vs VOUT")
-    plot_errp.xaxis.axis_label = "VOUT (mV)"
-    plot_errp.yaxis.axis_label = "Current (uA)"
-
-    doc_layout = layout()
-    source = ColumnDataSource(data=data)
 
 VOUT = [1800, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 5500, 6000, 6500, 7000, 7500, 8000, 8200]
 
@@ -110,6 +106,10 @@ ERROR_SIGMA_PRCNT = 2.0   # RMS (sigma) Noise max  percentage, RMS noise is max(
 ERROR_AVG_UA = 0.5        # avg error absolute magnitude
 ERROR_AVG_PRCNT = 5.0     # avg error percent of expected, AVG error is max(ERROR_AVG_UA, ERROR_AVG_PRCNT)
 
+SETTLE_TOLERANCE_UA = 0.25     # load settled tolerance, max(SETTLE_TOLERANCE_UA, SETTLE_TOLERANCE_PRCNT),
+SETTLE_TOLERANCE_PRCNT = 1.0   #   well inside the avg error limits, see p1125_scope.wait_settled()
+SETTLE_TIMEOUT_S = 2.0         # measure anyway if the load has not settled in this time
+
 CURRENT_MIN_UA = 1.0           # skip setups where the expected current is less than CURRENT_MIN_UA
 # WARNING! Do not exceed 1100mA continuously or damage may occur!
 CURRENT_MAX_UA  = 1100000.0    # skip setups where the expected current is more than CURRENT_MAX_UA
@@ -124,140 +124,320 @@ LOADS_TO_PLOT = [([P1125API.DEMO_CAL_LOAD_2M],  2000000.0),
                  ([P1125API.DEMO_CAL_LOAD_8, P1125API.DEMO_CAL_LOAD_20],         8.0),
                  ]
 
+results = {}                  # url -> unit result, see sweep_unit()
+results_lock = threading.Lock()
 
-def main():
+
+def measure_point(p1125, vout, resistance, expected_i_ua):
+    """ Measure the load, VOUT and load are already set
+
+    :return: success <True/False>, dict of results
     """
-    An example sequence of commands to make a measurement with the P1125 REST API.
+    # allow load time to settle
+    success, settle = wait_settled(p1125, tolerance_ua=SETTLE_TOLERANCE_UA, tolerance_percent=SETTLE_TOLERANCE_PRCNT,
+                                   timeout_s=SETTLE_TIMEOUT_S, restore_span=SPAN)
+    logger.info("wait_settled: {}".format(settle))
+    if not success: return False, None
+    if not settle["settled"]: logger.warning("{} mV, {} Ohms, not settled in {} s".format(vout, resistance, SETTLE_TIMEOUT_S))
+
+    success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_SINGLE)
+    logger.info("acquisition_start: {}".format(result))
+    if not success: return False, None
+
+    # wait at least two spans (pre/post trigger) plus the default retries
+    retries = int(2 * TBASE_SPAN_S[SPAN] / p1125.DELAY_WAIT_ACQUISITION_POLL_S) + P1125.RETRIES_ACQUISITION_COMPLETE
+    success, result = p1125.acquisition_complete(retries=retries)
+    logger.info("acquisition_complete: {}".format(result))
+    if not success: return False, None
+
+    _, result = p1125.acquisition_get_data()
+
+    # min, max, avg, sigma and pass/fail in one vectorized pass, see p1125_stats.py
+    point = capture_stats(result["i"], expected_i_ua, avg_samples=AVG_NUM_SAMPLES,
+                          error_avg_ua=ERROR_AVG_UA, error_avg_percent=ERROR_AVG_PRCNT,
+                          error_sigma_ua=ERROR_SIGMA_UA, error_sigma_percent=ERROR_SIGMA_PRCNT)
+    point.update({"vout": vout,
+                  "res": resistance,
+                  "exp": expected_i_ua,
+                  "settle_s": settle["settle_s"],
+                  "settled": settle["settled"],
+                  "timestamp": time.time()})
+
+    point["pass_or_fail"] = "Pass"
+    if point["fail_avg"]:
+        point["pass_or_fail"] = f"FAIL_avg_error, {point['avg_error_percent']}% > {point['avg_error_allowed_percent']}%"
+
+    elif point["fail_sigma"]:
+        point["pass_or_fail"] = f"FAIL_sigma_percent, {point['sigma_percent']}% > {point['sigma_error_allowed_percent']}%"
+
+    return True, point
+
+
+def add_point(unit, point, f_csv):
+    """ Add a measured point to the unit results, and the unit CSV
+
+    :param unit: unit result, see sweep_unit()
+    :param point: dict from measure_point()
+    :param f_csv: open CSV file, or None
+    :return: None
+    """
+    data = unit["data"]
+    for key in ["vout", "min", "max", "avg", "exp", "res", "sigma", "sigma_percent"]:
+        data[key].append(point[key])
 
-    The internal Calibration loads will be used to plot essentially DC currents of various magnitudes.
-    Since internal loads are used, the Probe is not connected.
+    unit["measured"].append(point)
+
+    unit["points"] += 1
+    unit["passed"] += point["pass_or_fail"] == "Pass"
+    unit["settle_s"] += point["settle_s"]
+
+    if f_csv is not None:
+        f_csv.write(f"{point['vout']:4}, {point['res']:9.1f}, {point['exp']:9.1f}, {point['avg']:10.1f}, "
+                    f"{point['avg_error_percent']:4.1f}%/{point['avg_error_allowed_percent']:4.1f}% "
+                    f"{point['sigma_percent']:4.1f}%/{point['sigma_error_allowed_percent']:4.1f}%, {point['pass_or_fail']}, "
+                    f"{point['settle_s']:.3f}\n")
+
+
+def sweep_unit(url):
+    """ Sweep all the VOUT and loads on one P1125, runs in a thread per unit
+
+    - the unit result is stored in results[url]
+
+    :param url: P1125 IP address or hostname
+    :return: success <True/False>
     """
+    p1125 = P1125(url="http://" + url + P1125_API, loggerIn=logger)
+    unit = {"url": url, "serial": None, "title": url, "points": 0, "passed": 0, "elapsed_s": 0.0, "settle_s": 0.0,
+            "estimate_s": 0.0, "resumed": 0, "firmware": None, "measured": [],
+            "data": {"vout": [], "min": [], "max": [], "avg": [], "exp": [], "res": [], "sigma": [],
+                     "sigma_percent": [], "sigma_pass_circle": []}}
+    with results_lock: results[url] = unit
 
     # check if the P1125 is reachable
     success, p1125_details = p1125.ping()
     logger.info("ping: {}".format(p1125_details))
     if not success: return False
 
-    title = f"P1125: Serial: {p1125_details['rpi_serial']}, HWVer: {p1125_details['a10_hw_ver']:x}, " \
-            f"SW Ver: {p1125_details['version']}"
+    unit["serial"] = p1125_details['rpi_serial']
+    unit["firmware"] = p1125_details['version']
+    unit["title"] = f"P1125: Serial: {p1125_details['rpi_serial']}, HWVer: {p1125_details['a10_hw_ver']:x}, " \
+                    f"SW Ver: {p1125_details['version']}"
 
+    f_csv = None
     if WRITE_CVS:
         csv_filename = f"p1125_{p1125_details['rpi_serial']}"
         try:
             f_csv = open(csv_filename, "w")
-            f_csv.write(f"{title}\n")
-            f_csv.write("vout, resistance, expected_i_ua, avg, err%/limit%, RMSNoise%/limit%, pass/fail\n")
+            f_csv.write(f"{unit['title']}\n")
+            f_csv.write("vout, resistance, expected_i_ua, avg, err%/limit%, RMSNoise%/limit%, pass/fail, settle_s\n")
 
         except Exception as e:
             logger.error(e)
             return False
 
-    success, result = p1125.status()
-    logger.info("status: {}".format(result))
-    if not success: return False
-
-    success, result = p1125.probe(connect=False)
-    logger.info("probe: {}".format(result))
-    if not success: return False
-
-    success, result = p1125.calibrate()
-    logger.info("calibrate: {}".format(result))
-    if not success: return False
+    try:
+        success, result = p1125.status()
+        logger.info("status: {}".format(result))
+        if not success: return False
 
-    success, result = p1125.set_timebase(SPAN)
-    logger.info("set_timebase: {}".format(result))
-    if not success: return False
+        success, result = p1125.probe(connect=False)
+        logger.info("probe: {}".format(result))
+        if not success: return False
 
-    success, result = p1125.set_trigger(src=P1125API.TRIG_SRC_NONE,
-                                        pos=P1125API.TRIG_POS_LEFT,
-                                        slope=P1125API.TRIG_SLOPE_RISE,
-                                        level=1)
-    logger.info("set_trigger: {}".format(result))
-    if not success: return False
+        success, result = p1125.calibrate()
+        logger.info("calibrate: {}".format(result))
+        if not success: return False
 
-    for vout in VOUT:
+        success, result = p1125.set_timebase(SPAN)
+        logger.info("set_timebase: {}".format(result))
+        if not success: return False
 
-        success, result = p1125.set_vout(vout)
-        logger.info("set_vout: {}".format(result))
+        success, result = p1125.set_trigger(src=P1125API.TRIG_SRC_NONE,
+                                            pos=P1125API.TRIG_POS_LEFT,
+                                            slope=P1125API.TRIG_SLOPE_RISE,
+                                            level=1)
+        logger.info("set_trigger: {}".format(result))
         if not success: return False
 
-        for load, resistance in LOADS_TO_PLOT:
-            expected_i_ua = float(vout) / resistance * 1000.0
-            if not (CURRENT_MIN_UA < expected_i_ua < CURRENT_MAX_UA):
-                logger.info("SKIP (Current out of range): {} mV, {:0.3f} Ohms, expected {:.1f} uA".format(vout, resistance, expected_i_ua))
-                continue
+        checkpoint = None
+        if CHECKPOINT:
+            config = {"serial": unit["serial"], "vout": VOUT, "loads": LOADS_TO_PLOT, "span": SPAN,
+                      "avg_num_samples": AVG_NUM_SAMPLES, "limits": [ERROR_SIGMA_UA, ERROR_SIGMA_PRCNT, ERROR_AVG_UA,
+                                                                     ERROR_AVG_PRCNT, CURRENT_MIN_UA, CURRENT_MAX_UA]}
+            checkpoint = SweepCheckpoint(f"p1125_{unit['serial']}.checkpoint", config)
+            for point in checkpoint.load():
+                add_point(unit, point, f_csv)
+            unit["resumed"] = unit["points"]
+            if unit["resumed"]: logger.info("{}: resuming, {} points already measured".format(unit["serial"], unit["resumed"]))
+
+        points, plan = plan_sweep(VOUT, LOADS_TO_PLOT, current_min_ua=CURRENT_MIN_UA, current_max_ua=CURRENT_MAX_UA,
+                                  span_s=TBASE_SPAN_S[SPAN], done=checkpoint.done if checkpoint else None)
+        for vout, resistance, expected_i_ua in plan["skipped"]:
+            logger.info("SKIP (Current out of range): {} mV, {:0.3f} Ohms, expected {:.1f} uA".format(vout, resistance, expected_i_ua))
+        logger.info("plan: {} points, {} VOUT changes, {} relay switches, estimated {:.0f} s".format(
+                    plan["points"], plan["vout_changes"], plan["relay_switches"], plan["estimate_s"]))
+        unit["estimate_s"] = plan["estimate_s"]
+
+        start = time.perf_counter()
+        for step in points:
+            vout, resistance, expected_i_ua = step["vout"], step["resistance"], step["expected_i_ua"]
+
+            if step["clear_load"]:  # the intermediate state would exceed CURRENT_MAX_UA
+                success, result = p1125.set_cal_load(loads=[P1125API.DEMO_CAL_LOAD_NONE])
+                logger.info("set_cal_load: {}".format(result))
+                if not success: return False
+
+            if step["set_vout"]:
+                success, result = p1125.set_vout(vout)
+                logger.info("set_vout: {}".format(result))
+                if not success: return False
+
+            if step["set_load"]:
+                success, result = p1125.set_cal_load(loads=step["load"])
+                logger.info("set_cal_load: {}".format(result))
+                if not success: return False
 
             logger.info("{} mV, {}, expected {:0.3f} uA".format(vout, resistance, expected_i_ua))
 
-            success, result = p1125.set_cal_load(loads=load)
-            logger.info("set_cal_load: {}".format(result))
-            if not success: break
-            sleep(0.4)  # allow load time to settle
-
-            success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_SINGLE)
-            logger.info("acquisition_start: {}".format(result))
-            if not success: break
-
-            success, result = p1125.acquisition_complete()
-            logger.info("acquisition_complete: {}".format(result))
-            if not success: break
-
-            p1125.set_cal_load(loads=[P1125API.DEMO_CAL_LOAD_NONE])
-            p1125.acquisition_stop()
-
-            _, result = p1125.acquisition_get_data()
-
-            samples = len(result["i"])
-            data["vout"].append(vout)
-            data["min"].append(min(result["i"]))
-            data["max"].append(max(result["i"]))
-            data["avg"].append(sum(result["i"][0:AVG_NUM_SAMPLES]) / AVG_NUM_SAMPLES)
-            data["exp"].append(expected_i_ua)
-            data["res"].append(resistance)
-
-            sigma = statistics.pstdev(result["i"])
-            data["sigma"].append(sigma)
-            sigma_as_percent = sigma * 100.0 / expected_i_ua
-            data["sigma_percent"].append(sigma_as_percent)
-
-            pass_or_fail = "Pass"
-            avg_error_allowed_percent = max(ERROR_AVG_UA / expected_i_ua * 100.0, ERROR_AVG_PRCNT)
-            avg_error_percent = abs(data["avg"][-1] - expected_i_ua) / expected_i_ua * 100.0
-            if avg_error_percent > avg_error_allowed_percent:
-                pass_or_fail = f"FAIL_avg_error, {avg_error_percent}% > {avg_error_allowed_percent}%"
-
-            else:
-                sigma_error_allowed_prcnt = max(ERROR_SIGMA_UA / expected_i_ua * 100.0, ERROR_SIGMA_PRCNT)
-                if data['sigma_percent'][-1] > sigma_error_allowed_prcnt:
-                    pass_or_fail = f"FAIL_sigma_percent, {data['sigma_percent'][-1]}% > {sigma_error_allowed_prcnt}%"
-
-            logger.info(f"""VOUT {data["vout"][-1]} mV, Expected {data["exp"][-1]:9.2f} uA, """ 
-                        f"""min/avg/max: {data["min"][-1]:9.2f} {data["avg"][-1]:9.2f} {data["max"][-1]:9.2f} uA, """ 
-                        f"""sigma {sigma:8.3f} ({sigma_as_percent:3.1}%), {samples} samples, {pass_or_fail}""")
-
-            if WRITE_CVS:
-                f_csv.write(f"{vout:4}, {resistance:9.1f}, {expected_i_ua:9.1f}, {data['avg'][-1]:10.1f}, " 
-                            f"{avg_error_percent:4.1f}%/{avg_error_allowed_percent:4.1f}% "
-                            f"{data['sigma_percent'][-1]:4.1f}%/{sigma_error_allowed_prcnt:4.1f}%, {pass_or_fail}\n")
+            success, point = measure_point(p1125, vout, resistance, expected_i_ua)
+            if not success: return False
+
+            point["load"] = step["load"]
+            if checkpoint: checkpoint.append(point)
+            add_point(unit, point, f_csv)
+            unit["elapsed_s"] = time.perf_counter() - start
+
+            logger.info(f"""VOUT {point["vout"]} mV, Expected {point["exp"]:9.2f} uA, """
+                        f"""min/avg/max: {point["min"]:9.2f} {point["avg"]:9.2f} {point["max"]:9.2f} uA, """
+                        f"""sigma {point["sigma"]:8.3f} ({point["sigma_percent"]:3.1}%), {point["samples"]} samples, {point["pass_or_fail"]}""")
+
+            measured = unit["points"] - unit["resumed"]
+            rate = measured / unit["elapsed_s"]
+            logger.info("{}: {}/{} points, {:.2f} points/s, {:.0f} s remaining".format(
+                        unit["serial"], measured, len(points), rate, (len(points) - measured) / rate))
+
+        if checkpoint: checkpoint.remove()
+
+    finally:
+        # turn off any loads
+        p1125.set_cal_load(loads=[P1125API.DEMO_CAL_LOAD_NONE])
+        p1125.probe(connect=False)
+        if f_csv is not None: f_csv.close()
+
+        if RESULTS_DB and unit["measured"]:
+            try:
+                db = ResultsDB(RESULTS_DB)
+                rows = db.add_cal_points(unit["serial"], unit["firmware"], unit["measured"], source=url,
+                                         csv_path=f_csv.name if f_csv is not None else None)
+                db.close()
+                logger.info("{}: {} points added to {}".format(unit["serial"], rows, RESULTS_DB))
+
+            except Exception as e:
+                logger.error(e)
+
+    return True
+
+
+def write_summary(wall_s):
+    """ Write the summary of all units to SUMMARY_CSV
+
+    :param wall_s: total run time, seconds
+    :return: success <True/False>
+    """
+    try:
+        with open(SUMMARY_CSV, "w") as f:
+            f.write("url, serial, success, points, passed, failed, elapsed_s, estimate_s, points_per_s, settle_s\n")
+            for url in P1125_URLS:
+                unit = results[url]
+                rate = (unit["points"] - unit["resumed"]) / unit["elapsed_s"] if unit["elapsed_s"] else 0.0
+                f.write(f"{url}, {unit['serial']}, {unit['success']}, {unit['points']}, {unit['passed']}, "
+                        f"{unit['points'] - unit['passed']}, {unit['elapsed_s']:.1f}, {unit['estimate_s']:.1f}, {rate:.2f}, "
+                        f"{unit['settle_s']:.1f}\n")
+
+            f.write(f"# {len(P1125_URLS)} units in {wall_s:.1f} s\n")
+
+    except Exception as e:
+        logger.error(e)
+        return False
+
+    return True
+
+
+def plot_unit(unit):
+    """ Plots of one unit
+
+    :param unit: unit result, see sweep_unit()
+    :return: list of bokeh layout children
+    """
+    data = unit["data"]
+    source = ColumnDataSource(data=data)
+
+    plot = figure(toolbar_location="above", width=PLOT_WIDTH, height=PLOT_HEIGHT, y_range=(1, 2000000),
+                  y_axis_type="log", title="Current Min/Avg/Max/Expected vs VOUT")
+    plot.xaxis.axis_label = "VOUT (mV)"
+    plot.yaxis.axis_label = "Current (uA)"
+
+    plot_sigma = figure(toolbar_location="above", width=PLOT_WIDTH, height=PLOT_HEIGHT, y_range=(1, 2000000),
+                        y_axis_type="log", title="RMS Noise (as % of Expected) vs VOUT")
+    plot_sigma.xaxis.axis_label = "VOUT (mV)"
+    plot_sigma.yaxis.axis_label = "Current (uA)"
+
+    plot.cross(x="vout", y="avg", size=10, color="blue", source=source)
+    plot.dot(x="vout", y="exp", size=20, color="olive", source=source)
+    plot.dash(x="vout", y="min", size=10, color="red", source=source)
+    plot.dash(x="vout", y="max", size=10, color="red", source=source)
+
+    _tooltips_sigma = [("Sigma", "@sigma_percent{0.0} %"), ]
+    dotssigma = plot_sigma.circle_dot(x="vout", y="exp", size="sigma_percent", fill_alpha=0.2, line_width=1, color="red", source=source)
+    plot_sigma.circle(x="vout", y="exp", size="sigma_pass_circle", fill_alpha=0.2, line_width=0, color="green", source=source)
+    htsigma = HoverTool(tooltips=_tooltips_sigma, mode='vline', show_arrow=True, renderers=[dotssigma])
+    plot_sigma.tools = [htsigma, BoxZoomTool(), ZoomInTool(), ResetTool(), UndoTool(), PanTool()]
+
+    return [Div(text=unit["title"]), row(plot, plot_sigma)]
+
+
+def main():
+    """
+    An example sequence of commands to make a measurement with the P1125 REST API.
+
+    The internal Calibration loads will be used to plot essentially DC currents of various magnitudes.
+    Since internal loads are used, the Probe is not connected.
+
+    Each P1125 in P1125_URLS is swept in its own thread.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(P1125_URLS)) as pool:
+        futures = {url: pool.submit(sweep_unit, url) for url in P1125_URLS}
+
+    for url, future in futures.items():
+        try:
+            results[url]["success"] = future.result()
+
+        except Exception as e:
+            logger.error("{}: {}".format(url, e))
+            traceback.print_exc()
+            results[url]["success"] = False
+
+    wall_s = time.perf_counter() - start
+    unit_s = sum(unit["elapsed_s"] for unit in results.values())
+    logger.info("{} units in {:.1f} s, sum of unit sweep times {:.1f} s".format(len(P1125_URLS), wall_s, unit_s))
+    for url in P1125_URLS:
+        unit = results[url]
+        logger.info("{} ({}): {}, {} points, {} passed, {:.1f} s (estimated {:.1f} s), {:.1f} s settling".format(
+                    url, unit["serial"], "OK" if unit["success"] else "FAILED", unit["points"], unit["passed"],
+                    unit["elapsed_s"], unit["estimate_s"], unit["settle_s"]))
+
+    if WRITE_CVS:
+        success = write_summary(wall_s)
+        if not success: return False
 
     if PLOT_RESULTS:
-        plot.cross(x="vout", y="avg", size=10, color="blue", source=source)
-        plot.dot(x="vout", y="exp", size=20, color="olive", source=source)
-        plot.dash(x="vout", y="min", size=10, color="red", source=source)
-        plot.dash(x="vout", y="max", size=10, color="red", source=source)
-
-        _tooltips_sigma = [("Sigma", "@sigma_percent{0.0} %"), ]
-        dotssigma = plot_sigma.circle_dot(x="vout", y="exp", size="sigma_percent", fill_alpha=0.2, line_width=1, color="red", source=source)
-        plot_sigma.circle(x="vout", y="exp", size="sigma_pass_circle", fill_alpha=0.2, line_width=0, color="green", source=source)
-        htsigma = HoverTool(tooltips=_tooltips_sigma, mode='vline', show_arrow=True, renderers=[dotssigma])
-        plot_sigma.tools = [htsigma, BoxZoomTool(), ZoomInTool(), ResetTool(), UndoTool(), PanTool()]
-
-        doc_layout.children.append(Div(text=title))
-        doc_layout.children.append(row(plot, plot_sigma))
+        doc_layout = layout()
+        for url in P1125_URLS:
+            doc_layout.children.extend(plot_unit(results[url]))
         show(doc_layout)
 
-    if WRITE_CVS: f_csv.close()
-    return True
+    return all(unit["success"] for unit in results.values())
 
 
 if __name__ == "__main__":
@@ -269,9 +449,4 @@ if __name__ == "__main__":
         traceback.print_exc()
         success = False
 
-    finally:
-        # turn off any loads
-        p1125.set_cal_load(loads=[P1125API.DEMO_CAL_LOAD_NONE])
-        p1125.probe(connect=False)
-
     if not success: logger.error("failed")
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+The P1125 GUI can be open during the running of this script.
+
+The complete JSON-RPC API is viewable from the Main menu, or
+http://p1125_hostname/api/V1/browse
+
+Accumulate the envelope (min/max/mean/stdev) of repeated triggered captures,
+for chasing intermittent current spikes, see p1125_scope.CaptureEnvelope.
+Only the envelope and the OUTLIERS most deviant captures are kept, so any
+number of captures can be taken.
+
+Run this file,
+    $python3 p1125_example_trigger_envelope.py
+
+Requirements:
+1) Python 3.6+ and bokeh 2.3.0 (pip3 install bokeh) or greater installed.
+2) Change line 68 to suit your environment.
+3) Chrome browser.
+
+--- !!! WARNING !!! ---
+if CONNECT_PROBE is True, this example connects the PROBE at 3000 (VOUT) mV
+
+"""
+import logging
+from bokeh.layouts import layout
+from bokeh.io import show
+from bokeh.plotting import figure
+from bokeh.models import ColumnDataSource
+from bokeh.palettes import viridis
+
+from P1125 import P1125, P1125API
+from p1125_scope import ScopeRing, ScopeCapture, CaptureEnvelope
+from p1125_decimate import bokeh_arrays
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+FORMAT = "%(asctime)s: %(filename)22s: %(funcName)25s %(lineno)4s - %(levelname)-5.5s : %(message)s"
+formatter = logging.Formatter(FORMAT)
+consoleHandler = logging.StreamHandler()
+consoleHandler.setFormatter(formatter)
+logger.addHandler(consoleHandler)
+
+# NOTE: Change to P1125 IP address or hostname
+P1125_URL = "p1125-####.local"  # for example, p115-a12b.local, or 192.168.0.123
+P1125_API = "/api/V1"
+URL = "http://" + P1125_URL + P1125_API
+
+if "p1125-####.local" in P1125_URL:
+    logger.error("Please set P1125_URL with valid IP/Hostname")
+    exit(1)
+
+plot = figure(toolbar_location="above", y_range=(0.1, 1000000), y_axis_type="log")
+plot.xaxis.axis_label = "Time (mS)"
+plot.yaxis.axis_label = "Current (uA)"
+
+doc_layout = layout()
+
+VOUT = 4000                       # mV, output voltage, 2000-8000 mV
+SPAN = P1125API.TBASE_SPAN_100MS  # set timebase
+CONNECT_PROBE = False             # set to True to attach probe, !! Warning: check VOUT setting !!
+TRIG_LEVEL_UA = 1000              # trigger level, uA
+CAPTURES = 1000                   # number of triggered captures to take
+DURATION_S = 600                  # stop after this long if CAPTURES have not triggered, seconds
+OUTLIERS = 4                      # number of outlier captures kept and plotted
+ENVELOPE_FILE = "envelope.npz"    # envelope is saved here, set to None to not save
+
+
+def main():
+    """
+    Capture CAPTURES triggered captures, or for DURATION_S, accumulating the envelope
+
+    """
+    p1125 = P1125(url=URL, loggerIn=logger)
+
+    # check if the P1125 is reachable
+    success, result = p1125.ping()
+    logger.info(result)
+    if not success: return False
+
+    success, result = p1125.probe(connect=False)
+    logger.info(result)
+    if not success: return False
+
+    success, result = p1125.calibrate()
+    logger.info(result)
+    if not success: return False
+
+    success, result = p1125.set_vout(VOUT)
+    logger.info(result)
+    if not success: return False
+
+    success, result = p1125.set_timebase(SPAN)
+    logger.info(result)
+    if not success: return False
+
+    success, result = p1125.set_trigger(src=P1125API.TRIG_SRC_CUR,
+                                        pos=P1125API.TRIG_POS_CENTER,
+                                        slope=P1125API.TRIG_SLOPE_RISE,
+                                        level=TRIG_LEVEL_UA)
+    logger.info(result)
+    if not success: return False
+
+    # connect probe
+    success, result = p1125.probe(connect=CONNECT_PROBE)
+    logger.info(result)
+    if not success: return False
+
+    ring = ScopeRing(SPAN, slots=1)
+    capture = ScopeCapture(p1125, ring)
+    envelope = CaptureEnvelope(ring.samples, outliers=OUTLIERS)
+    success = capture.run(captures=CAPTURES, duration_s=DURATION_S,
+                          callback=lambda ring, slot: envelope.update(*ring.latest()))
+    logger.info(capture.stats())
+    p1125.probe(connect=False)
+    if not success: return False
+
+    if ENVELOPE_FILE: envelope.save(ENVELOPE_FILE)
+
+    source = ColumnDataSource(data=bokeh_arrays(envelope.result()))
+    plot.varea(x="t", y1="min", y2="max", source=source, fill_alpha=0.2, color="grey", legend_label="min/max")
+    plot.line(x="t", y="mean", line_width=2, source=source, color="blue", legend_label="mean")
+    plot.line(x="t", y="stdev", line_width=1, source=source, color="green", legend_label="stdev")
+
+    colors = viridis(max(OUTLIERS, 3))
+    for k, outlier in enumerate(envelope.outliers()):
+        logger.info("outlier capture {}, {:.1f} stdev".format(outlier["index"], outlier["score"]))
+        source = ColumnDataSource(data=bokeh_arrays({"t": outlier["t"], "i": outlier["i"]}))
+        plot.line(x="t", y="i", line_width=1, source=source, color=colors[k],
+                  legend_label="#{} {:.1f} stdev".format(outlier["index"], outlier["score"]))
+
+    doc_layout.children.append(plot)
+    show(doc_layout)
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success: logger.error("failed")
@@ -0,0 +1,468 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Integrated Current (mAhr) window helpers for the P1125.
+
+intcurr_data() returns every 10ms sample of the window so far, polling it to
+find out if the window is complete downloads the growing window on every
+poll.  wait_complete() polls the small intcurr_complete() instead, and
+fetch() downloads the completed window once,
+
+    success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
+    success, complete = wait_complete(p1125, time_stop_s=TIME_STOP_S)
+    success, intcurr_result = fetch(p1125, measure_bytes=True)
+    logger.info(transfer_summary(complete, intcurr_result))  # {'requests': ..., 'bytes': ..., ...}
+
+SequentialMahr tracks the running mAhr estimate, and its confidence interval,
+over back to back sub-windows, so a measurement can stop as soon as the
+estimate is good enough instead of after a fixed, usually too long, window.
+The sub-window should be several times the DUT duty cycle, so the sub-window
+mAhrs are close to independent,
+
+    p1125.intcurr_set(time_stop_s=10)
+    success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
+    estimate = SequentialMahr(rel_error=0.01, min_s=30, max_s=600)
+    success, result = measure_sequential(p1125, window_s=10, estimate=estimate)
+    logger.info(result["estimate"])  # {'mahr': ..., 'ci_mahr': ..., 'rel_error': ..., 'windows': ..., 'stop': ...}
+    intcurr_result = join_windows(result["windows"])
+
+SharedAcquisition runs one continuous mAhr acquisition of a P1125 for many
+consumers, for example the sessions of a bokeh server app, which re-runs the app
+script for every browser tab.  The P1125 is set up by the first subscriber and
+torn down when the last one unsubscribes, or at exit,
+
+    acquisition = SharedAcquisition.shared(URL, lambda: SharedAcquisition(P1125(url=URL), time_stop_s=30,
+                                                                          setup=setup, teardown=teardown))
+    success = acquisition.subscribe(callback)  # callback(intcurr_result), from the acquisition thread
+    ...
+    acquisition.unsubscribe(callback)
+
+Byte counts are the size of the responses re-serialized as JSON, the P1125
+class only returns the decoded response, so they approximate the bytes on the wire.
+Re-serializing a long window costs about as much CPU as decoding it, so fetch()
+only counts its bytes when asked to.
+
+Requirements:
+1) Python 3.6+
+"""
+import json
+import math
+import time
+import atexit
+import threading
+
+from p1125_stats import StreamStats
+
+WAIT_POLLING_TIME_S = 0.5  # time between intcurr_complete() polls once the window should be complete
+
+CONFIDENCE_Z = {  # two sided confidence: normal quantile
+    0.90: 1.6449,
+    0.95: 1.9600,
+    0.99: 2.5758,
+}
+
+T_TABLE = {  # two sided confidence: Student t quantiles for 1-9 degrees of freedom
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262],
+    0.99: [63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250],
+}
+
+PLOT_KEYS = {  # intcurr_data() key: value keys, joined by join_windows()
+    "plot": ["i", "i_max"],
+    "plot_d0": ["d0"],
+    "plot_d1": ["d1"],
+    "plot_trig": ["trig"],
+}
+
+
+def response_bytes(result: dict) -> int:
+    """ Size of a response, re-serialized as JSON
+
+    :param result: dict returned by a P1125 method
+    :return: bytes
+    """
+    return len(json.dumps(result, separators=(",", ":")))
+
+
+def wait_complete(p1125, time_stop_s: float, poll_s: float=WAIT_POLLING_TIME_S, stop_event=None) -> (bool, dict):
+    """ Wait for the mAhr window to complete, called after p1125.acquisition_start(...)
+
+    - sleeps for most of the window, then polls intcurr_complete()
+    - nothing is downloaded, use fetch() for the data
+
+    :param p1125: P1125 instance
+    :param time_stop_s: window duration, as set with p1125.intcurr_set()
+    :param poll_s: time between polls
+    :param stop_event: optional threading.Event, set to abandon the wait
+    :return: success <True/False>, result of the last intcurr_complete() with 'wait_s', 'requests' and 'bytes' added
+    """
+    start = time.perf_counter()
+    sleep = stop_event.wait if stop_event is not None else time.sleep
+    requests, nbytes = 0, 0
+
+    wait_s = time_stop_s - poll_s
+    while True:
+        if wait_s > 0 and sleep(wait_s): return False, {"error": "stopped"}
+
+        success, result = p1125.intcurr_complete()
+        requests += 1
+        if not success: return False, result
+
+        nbytes += response_bytes(result)
+
+        if result["complete"]: break
+        wait_s = poll_s
+
+    result.update({"wait_s": time.perf_counter() - start, "requests": requests, "bytes": nbytes})
+    return True, result
+
+
+def fetch(p1125, measure_bytes: bool=False) -> (bool, dict):
+    """ Download the completed mAhr window, once
+
+    :param p1125: P1125 instance
+    :param measure_bytes: set to True to count the bytes of the response, see response_bytes()
+    :return: success <True/False>, result of intcurr_data() with 'fetch_s' and 'bytes' added,
+             'bytes' is None unless measure_bytes
+    """
+    start = time.perf_counter()
+    success, result = p1125.intcurr_data()
+    if not success: return False, result
+
+    nbytes = response_bytes(result) if measure_bytes else None
+    result.update({"fetch_s": time.perf_counter() - start, "bytes": nbytes})
+    return True, result
+
+
+def transfer_summary(complete: dict, intcurr_result: dict) -> dict:
+    """ Requests and bytes used for one window, by wait_complete() and fetch()
+
+    :param complete: result of wait_complete()
+    :param intcurr_result: result of fetch()
+    :return: dict {'requests': ..., 'bytes': ..., 'poll_bytes': ..., 'data_bytes': ..., 'wait_s': ..., 'fetch_s': ...},
+             'bytes' and 'data_bytes' are None if fetch() did not count them
+    """
+    measured = intcurr_result["bytes"] is not None
+    return {"requests": complete["requests"] + 1,
+            "bytes": complete["bytes"] + intcurr_result["bytes"] if measured else None,
+            "poll_bytes": complete["bytes"],
+            "data_bytes": intcurr_result["bytes"],
+            "wait_s": complete["wait_s"],
+            "fetch_s": intcurr_result["fetch_s"]}
+
+
+def t_quantile(confidence: float, dof: int) -> float:
+    """ Two sided Student t quantile
+
+    - from T_TABLE for small dof, otherwise the Cornish-Fisher expansion of the
+      normal quantile, which is within 0.1% of the exact value from dof 10
+
+    :param confidence: one of CONFIDENCE_Z
+    :param dof: degrees of freedom, >= 1
+    :return: quantile
+    """
+    if confidence not in CONFIDENCE_Z: raise ValueError("confidence must be one of {}".format(list(CONFIDENCE_Z)))
+
+    if dof <= len(T_TABLE[confidence]): return T_TABLE[confidence][dof - 1]
+
+    z, n = CONFIDENCE_Z[confidence], float(dof)
+    return z + (z ** 3 + z) / (4 * n) \
+             + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * n ** 2) \
+             + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * n ** 3)
+
+
+class SequentialMahr(object):
+    """ Running mAhr estimate and confidence interval over sub-windows, for early stopping
+
+    - the estimate is the mean of the sub-window mAhrs, the confidence interval is
+      from their sample standard deviation (batch means) and the Student t quantile
+    - done when the interval half width is within rel_error of the estimate, after at
+      least min_s and min_windows, or after max_s regardless
+    """
+
+    def __init__(self, rel_error: float=0.01, confidence: float=0.95, min_s: float=30.0, max_s: float=600.0,
+                 min_windows: int=3):
+        """
+        :param rel_error: target relative error, confidence interval half width / mAhr
+        :param confidence: confidence level, one of CONFIDENCE_Z
+        :param min_s: minimum measurement duration, seconds
+        :param max_s: maximum measurement duration, seconds
+        :param min_windows: minimum number of sub-windows, >= 2
+        """
+        if confidence not in CONFIDENCE_Z: raise ValueError("confidence must be one of {}".format(list(CONFIDENCE_Z)))
+        if min_windows < 2: raise ValueError("min_windows must be >= 2")
+
+        self.rel_error = rel_error
+        self.confidence = confidence
+        self.min_s = min_s
+        self.max_s = max_s
+        self.min_windows = min_windows
+
+        self.stats = StreamStats()  # of the sub-window mAhrs
+        self.time_s = 0.0
+        self.stop = None            # 'converged' or 'max_s' when done
+
+    @property
+    def ci_mahr(self) -> float:
+        """ confidence interval half width, mAhr, inf with fewer than two sub-windows """
+        n = self.stats.count
+        if n < 2: return math.inf
+        return t_quantile(self.confidence, n - 1) * math.sqrt(self.stats.variance * n / (n - 1) / n)
+
+    @property
+    def achieved_rel_error(self) -> float:
+        """ confidence interval half width relative to the estimate """
+        if self.stats.count < 2: return math.inf
+        if self.stats.mean == 0.0: return 0.0 if self.ci_mahr == 0.0 else math.inf
+        return self.ci_mahr / abs(self.stats.mean)
+
+    def update(self, intcurr_result: dict) -> bool:
+        """ Add a completed sub-window
+
+        :param intcurr_result: dict from p1125.intcurr_data()
+        :return: True when done
+        """
+        self.stats.update([intcurr_result["mahr"]])
+        self.time_s += intcurr_result["time_s"]
+
+        if self.stats.count >= self.min_windows and self.time_s >= self.min_s and \
+                self.achieved_rel_error <= self.rel_error:
+            self.stop = "converged"
+
+        elif self.time_s >= self.max_s:
+            self.stop = "max_s"
+
+        return self.stop is not None
+
+    def result(self) -> dict:
+        """ Estimate as a dict, suitable for logging/writing to a file
+
+        :return: {'mahr': ..., 'ci_mahr': ..., 'rel_error': ..., 'confidence': ..., 'windows': ..., 'time_s': ..., 'stop': ...}
+        """
+        return {"mahr": self.stats.mean if self.stats.count else None,
+                "ci_mahr": self.ci_mahr,
+                "rel_error": self.achieved_rel_error,
+                "confidence": self.confidence,
+                "windows": self.stats.count,
+                "time_s": self.time_s,
+                "stop": self.stop}
+
+
+def measure_sequential(p1125, window_s: float, estimate: SequentialMahr, stop_event=None,
+                       measure_bytes: bool=False) -> (bool, dict):
+    """ Measure back to back sub-windows until the estimate is done
+
+    - the P1125 must be set up with p1125.intcurr_set(time_stop_s=window_s) and the first
+      sub-window started with p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
+    - every following sub-window is started as soon as the previous one is read,
+      the last one is not restarted
+
+    :param p1125: P1125 instance
+    :param window_s: sub-window duration, seconds
+    :param estimate: SequentialMahr
+    :param stop_event: optional threading.Event, set to abandon the measurement
+    :param measure_bytes: see fetch()
+    :return: success <True/False>, {'windows': [<intcurr_result>, ...], 'estimate': <estimate.result()>,
+                                    'transfer': <transfer_summary() totals>}
+    """
+    from P1125 import P1125API
+
+    windows, transfer = [], None
+    while True:
+        success, complete = wait_complete(p1125, time_stop_s=window_s, stop_event=stop_event)
+        if not success: return False, complete
+
+        success, intcurr_result = fetch(p1125, measure_bytes=measure_bytes)
+        if not success: return False, intcurr_result
+
+        done = estimate.update(intcurr_result)
+        if not done:
+            success, result = p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
+            if not success: return False, result
+
+        windows.append(intcurr_result)
+        summary = transfer_summary(complete, intcurr_result)
+        if transfer is None: transfer = summary
+        else: transfer = {key: None if value is None else transfer[key] + value for key, value in summary.items()}
+
+        if done: break
+
+    return True, {"windows": windows, "estimate": estimate.result(), "transfer": transfer}
+
+
+def join_windows(windows: list) -> dict:
+    """ Join back to back windows into one intcurr_data() like result
+
+    - times of each window are offset by the time_s of the windows before it
+    - 'mahr' is the time weighted mean of the window mAhrs
+
+    :param windows: list of dicts from p1125.intcurr_data()
+    :return: dict, with the intcurr_data() keys
+    """
+    joined = {key: {"t": []} for key in PLOT_KEYS}
+    for key, values in PLOT_KEYS.items():
+        for value in values: joined[key][value] = []
+
+    offset_s, ucoulombs, samples, mahr_s = 0.0, 0.0, 0, 0.0
+    for window in windows:
+        for key, values in PLOT_KEYS.items():
+            data = window.get(key)
+            if not data: continue
+            joined[key]["t"].extend(t + offset_s for t in data["t"])
+            for value in values: joined[key][value].extend(data[value])
+
+        offset_s += window["time_s"]
+        ucoulombs += window["ucoulombs"]
+        samples += window["samples"]
+        mahr_s += window["mahr"] * window["time_s"]
+
+    joined.update({"success": True, "time_s": offset_s, "time_stop_s": offset_s, "ucoulombs": ucoulombs,
+                   "samples": samples, "mahr": mahr_s / offset_s if offset_s else 0.0})
+    return joined
+
+
+class SharedAcquisition(object):
+    """ One continuous mAhr acquisition of a P1125, shared by subscribers
+
+    - the first subscriber runs setup(p1125) and starts the acquisition thread, the
+      last unsubscribe stops it and runs teardown(p1125), as does close() at exit
+    - every window is read once, process(intcurr_result) runs once per window, and
+      every subscriber is called with its result, from the acquisition thread
+    - use shared() to get the one instance per P1125, across re-runs of a script
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, p1125, time_stop_s: float, setup=None, teardown=None, process=None,
+                 poll_s: float=WAIT_POLLING_TIME_S):
+        """
+        :param p1125: P1125 instance, owned by this instance
+        :param time_stop_s: window duration, as set with p1125.intcurr_set() by setup
+        :param setup: setup(p1125) -> success <True/False>, before the acquisition is started
+        :param teardown: teardown(p1125), after the acquisition is stopped
+        :param process: process(intcurr_result) -> value passed to the subscribers, None to pass intcurr_result
+        :param poll_s: see wait_complete()
+        """
+        self.p1125 = p1125
+        self.time_stop_s = time_stop_s
+        self.setup = setup
+        self.teardown = teardown
+        self.process = process
+        self.poll_s = poll_s
+        self._lock = threading.Lock()      # serializes subscribe/unsubscribe/close
+        self._subscribers = []             # replaced, not changed, so the thread can read it without the lock
+        self._thread = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def shared(cls, key, factory):
+        """ The instance for key, created with factory() on first use, closed at exit
+
+        :param key: for example the P1125 URL
+        :param factory: returns a new SharedAcquisition
+        :return: SharedAcquisition
+        """
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = factory()
+                atexit.register(cls._shared[key].close)
+            return cls._shared[key]
+
+    def subscribe(self, callback) -> bool:
+        """ Add a subscriber, the first one sets up the P1125 and starts the acquisition
+
+        :param callback: callback(value), see process
+        :return: success <True/False>, False if the setup failed
+        """
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+            if self._thread is not None and self._thread.is_alive() and not self._stop.is_set(): return True
+
+            if self._thread is not None: self._thread.join()  # the last run is still stopping
+            self._stop = threading.Event()
+            if self.setup is not None and not self.setup(self.p1125):
+                self._subscribers = [s for s in self._subscribers if s is not callback]
+                return False
+
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+            self._thread.start()
+            return True
+
+    def unsubscribe(self, callback):
+        """ Remove a subscriber, the last one stops the acquisition, which then tears down the P1125
+
+        :param callback: as given to subscribe()
+        :return: None
+        """
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not callback]
+            if not self._subscribers: self._stop.set()
+
+    def close(self):
+        """ Stop the acquisition and tear down the P1125, regardless of subscribers
+
+        :return: None
+        """
+        with self._lock:
+            self._subscribers = []
+            self._stop.set()
+            if self._thread is not None: self._thread.join()
+            self._thread = None
+
+    def _run(self, stop):
+        """ Acquisition thread, until stop is set or a request fails """
+        from P1125 import P1125API
+
+        try:
+            success, result = self.p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
+            while success and not stop.is_set():
+                success, result = wait_complete(self.p1125, time_stop_s=self.time_stop_s, poll_s=self.poll_s,
+                                                stop_event=stop)
+                if not success: break
+
+                success, intcurr_result = self.p1125.intcurr_data()
+                if not success: break
+
+                # restart the acquisition right away to catch the next window, then process this one
+                success, result = self.p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_RUN)
+                if not success: break
+
+                value = self.process(intcurr_result) if self.process is not None else intcurr_result
+                for callback in self._subscribers:
+                    try:
+                        callback(value)
+
+                    except Exception as e:  # one subscriber does not stop the others
+                        self.p1125.logger.error("subscriber {}: {}".format(callback, e))
+
+            if not stop.is_set(): self.p1125.logger.error("acquisition stopped, a request failed")
+
+        except Exception as e:
+            self.p1125.logger.error(e)
+
+        finally:
+            self.p1125.acquisition_stop()
+            if self.teardown is not None: self.teardown(self.p1125)
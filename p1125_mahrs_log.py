@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Helpers for log files created with p1125_example_mahrs_logging.py
+
+Loading a long log file (importing the python file) is slow, so a summary
+table of the per window scalar values is built once, with numpy columns,
+and cached next to the log file as <LOG_FILE>.summary.npz.  The cache is
+rebuilt whenever the log file changes,
+
+    summary = load_summary("20201116-135355.py")
+    summary["t"]          # numpy datetime64[s], window datetime
+    summary["mAhr"]       # numpy float64, NaN where a window has no value
+    summary["has_plot"]   # numpy bool, window has 'plot' data
+    summary["meta"]       # dict, p1125_ping, p1125_status, p1125_settings
+
+Requirements:
+1) Python 3.6+ and numpy
+"""
+import os
+import json
+import logging
+import importlib.util
+import numpy as np
+
+logger = logging.getLogger()
+
+DATETIME_FORMAT = "%Y%m%d-%H%M%S"  # as written by p1125_example_mahrs_logging.py
+SUMMARY_KEYS = ["mAhr", "i_max_ua", "time_s", "samples"]
+SUMMARY_CACHE_EXT = ".summary.npz"
+
+
+def parse_datetimes(strings):
+    """ Vectorized parse of DATETIME_FORMAT strings, for example '20201116-135501'
+
+    :param strings: list of strings
+    :return: numpy datetime64[s] array
+    """
+    s = np.ascontiguousarray(np.asarray(strings, dtype="U15"))
+    c = s.view(np.uint32).reshape(-1, 15).astype(np.int64) - ord("0")
+
+    def field(a, b):
+        value = np.zeros(c.shape[0], dtype=np.int64)
+        for k in range(a, b): value = value * 10 + c[:, k]
+        return value
+
+    months = (field(0, 4) - 1970) * 12 + field(4, 6) - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]") + (field(6, 8) - 1).astype("timedelta64[D]")
+    seconds = field(9, 11) * 3600 + field(11, 13) * 60 + field(13, 15)
+    return days.astype("datetime64[s]") + seconds.astype("timedelta64[s]")
+
+
+def load_log(path):
+    """ Import a log file
+
+    :param path: log file created with p1125_example_mahrs_logging.py
+    :return: module with p1125_ping, p1125_status, p1125_settings, p1125_data, None on error
+    """
+    try:
+        spec = importlib.util.spec_from_file_location("p1125_log", path)
+        d = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(d)
+
+    except Exception as e:
+        logger.error(e)
+        return None
+
+    return d
+
+
+def summary_table(log) -> dict:
+    """ Build the summary table of a log
+
+    :param log: module from load_log()
+    :return: dict of numpy columns, see module docstring
+    """
+    data = log.p1125_data
+    summary = {
+        "datetime": np.array([item["datetime"] for item in data], dtype="U15"),
+        "has_plot": np.array(["plot" in item for item in data], dtype=bool),
+    }
+    summary["t"] = parse_datetimes(summary["datetime"])
+    for key in SUMMARY_KEYS:
+        summary[key] = np.array([item.get(key, np.nan) for item in data], dtype=np.float64)
+
+    summary["meta"] = {"p1125_ping": log.p1125_ping,
+                       "p1125_status": log.p1125_status,
+                       "p1125_settings": log.p1125_settings}
+    return summary
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def load_summary(path, log=None) -> dict:
+    """ Load the summary table of a log, from the cache if it is up to date
+
+    :param path: log file created with p1125_example_mahrs_logging.py
+    :param log: module from load_log(), if already loaded, used when the cache is stale
+    :return: dict of numpy columns, see module docstring, None on error
+    """
+    cache = path + SUMMARY_CACHE_EXT
+    stamp = _source_stamp(path)
+
+    if os.path.exists(cache):
+        try:
+            with np.load(cache) as npz:
+                if np.array_equal(npz["source"], stamp):
+                    summary = {key: npz[key] for key in npz.files if key not in ("source", "meta")}
+                    summary["meta"] = json.loads(str(npz["meta"]))
+                    return summary
+
+        except Exception as e:
+            logger.warning("ignoring summary cache {}, {}".format(cache, e))
+
+    if log is None: log = load_log(path)
+    if log is None: return None
+
+    summary = summary_table(log)
+
+    try:
+        columns = {key: value for key, value in summary.items() if key != "meta"}
+        tmp = cache + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, source=stamp, meta=np.array(json.dumps(summary["meta"])), **columns)
+        os.replace(tmp, cache)
+
+    except Exception as e:
+        # the cache is only an optimization
+        logger.warning("could not write summary cache {}, {}".format(cache, e))
+
+    return summary
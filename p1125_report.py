@@ -0,0 +1,226 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Static HTML reports for a directory of logs created with p1125_example_mahrs_logging.py
+
+Run this file,
+    $python3 p1125_report.py -d <LOG_DIRECTORY> [-o <OUTPUT_DIRECTORY>] [-j <JOBS>]
+
+For every log file a <LOG_FILE>.html report is written with the mAhr/Max uA
+trend and the REPORT_WINDOWS windows with the highest peak current, decimated
+(see p1125_decimate.py).  An index.html links all the reports.  Logs are
+rendered in parallel, one process per core by default.
+
+No P1125 or bokeh server is required, the reports can be opened in any browser.
+
+Requirements:
+1) Python 3.6+, numpy and bokeh 2.4.3 (pip3 install bokeh) or greater installed.
+"""
+import os
+import re
+import html
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+FORMAT = "%(asctime)s: %(funcName)20s %(lineno)4s - %(levelname)-5.5s : %(message)s"
+formatter = logging.Formatter(FORMAT)
+consoleHandler = logging.StreamHandler()
+consoleHandler.setFormatter(formatter)
+logger.addHandler(consoleHandler)
+
+LOG_FILE_PATTERN = re.compile(r"^\d{8}-\d{6}\.py$")  # as named by p1125_example_mahrs_logging.py
+REPORT_WINDOWS = 10           # number of windows plotted per report, highest peak current first
+REPORT_WINDOW_POINTS = 1600   # points per window plot
+PLOT_MIN = 0.01
+PLOT_MAX = 1000000
+
+
+def find_logs(directory):
+    """ Find log files in a directory
+
+    :param directory: path
+    :return: sorted list of paths
+    """
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if LOG_FILE_PATTERN.match(name))
+
+
+def render_report(path, out_dir):
+    """ Render the report of one log file, runs in a worker process
+
+    :param path: log file
+    :param out_dir: output directory
+    :return: dict for the index page, {'log': ..., 'html': ..., 'error': ..., ...}
+    """
+    import numpy as np
+    from bokeh.embed import file_html
+    from bokeh.layouts import column
+    from bokeh.models import ColumnDataSource, DatetimeTickFormatter, Div
+    from bokeh.plotting import figure
+    from bokeh.resources import CDN
+
+    from p1125_decimate import decimate, bokeh_arrays
+    from p1125_mahrs_log import load_log, load_summary
+
+    start = time.perf_counter()
+    name = os.path.basename(path)
+    row = {"log": name, "html": None, "error": None}
+
+    log = load_log(path)
+    if log is None:
+        row["error"] = "could not load log"
+        return row
+
+    summary = load_summary(path, log)
+    meta = summary["meta"]
+    settings, ping = meta["p1125_settings"], meta["p1125_ping"]
+
+    row.update({"windows": int(summary["t"].size),
+                "start": str(summary["t"][0]) if summary["t"].size else "",
+                "mAhr": float(np.nanmean(summary["mAhr"])) if summary["t"].size else float("nan"),
+                "i_max_ua": float(np.nanmax(summary["i_max_ua"])) if summary["t"].size else float("nan"),
+                "vout": settings.get("VOUT"),
+                "serial": ping.get("rpi_serial")})
+
+    trend = figure(title="mAhr and Max uA per window", y_range=(PLOT_MIN, PLOT_MAX), y_axis_type="log",
+                   x_axis_type="datetime", width=1000, height=350)
+    trend.xaxis.formatter = DatetimeTickFormatter(minutes=["%m/%d %H:%M"])
+    source = ColumnDataSource(data={"t": summary["t"], "mAhr": summary["mAhr"], "i_max_ua": summary["i_max_ua"]})
+    trend.line(x="t", y="mAhr", line_width=2, source=source, color="green", legend_label="mAhr")
+    trend.line(x="t", y="i_max_ua", line_width=2, source=source, color="red", legend_label="Max uA")
+
+    children = [Div(text="<h2>{}</h2>P1125: {}, {}, VOUT {} mV, TIME_CAPTURE_WINDOW_S {} sec".format(
+                    html.escape(name), ping.get("version"), ping.get("rpi_serial"),
+                    settings.get("VOUT"), settings.get("TIME_CAPTURE_WINDOW_S"))),
+                trend]
+
+    with_plot = np.flatnonzero(summary["has_plot"])
+    peaks = np.nan_to_num(summary["i_max_ua"][with_plot], nan=-1.0)
+    for idx in with_plot[np.argsort(-peaks, kind="stable")][:REPORT_WINDOWS]:
+        data = bokeh_arrays(decimate(log.p1125_data[idx]["plot"], max_points=REPORT_WINDOW_POINTS))
+        window = figure(title="{}, Max {:.1f} uA".format(summary["datetime"][idx], summary["i_max_ua"][idx]),
+                        y_range=(PLOT_MIN, PLOT_MAX), y_axis_type="log", width=1000, height=250)
+        window.xaxis.axis_label = "Time (S)"
+        window_source = ColumnDataSource(data=data)
+        window.line(x="t", y="i", source=window_source, legend_label="Current (uA)")
+        window.line(x="t", y="i_max", source=window_source, color="red", legend_label="Peak Current (uA)")
+        children.append(window)
+
+    row["html"] = name + ".html"
+    with open(os.path.join(out_dir, row["html"]), "w") as f:
+        f.write(file_html(column(*children), CDN, title=name))
+
+    row["render_s"] = time.perf_counter() - start
+    return row
+
+
+def write_index(rows, out_dir):
+    """ Write index.html, a table of all the reports
+
+    :param rows: list of dicts from render_report()
+    :param out_dir: output directory
+    :return: path of index.html
+    """
+    lines = ["<html><head><meta charset='utf-8'><title>P1125 mAhr Logs</title></head><body>",
+             "<h1>P1125 mAhr Logs</h1>",
+             "<table border='1' cellpadding='4'>",
+             "<tr><th>Log</th><th>Start</th><th>Serial</th><th>VOUT mV</th><th>Windows</th>"
+             "<th>Avg mAhr</th><th>Max uA</th></tr>"]
+    for row in rows:
+        if row["error"]:
+            lines.append("<tr><td>{}</td><td colspan='6'>{}</td></tr>".format(
+                         html.escape(row["log"]), html.escape(row["error"])))
+            continue
+
+        lines.append("<tr><td><a href='{}'>{}</a></td><td>{}</td><td>{}</td><td>{}</td><td>{}</td>"
+                     "<td>{:.4f}</td><td>{:.1f}</td></tr>".format(
+                     html.escape(row["html"]), html.escape(row["log"]), row["start"], html.escape(str(row["serial"])),
+                     row["vout"], row["windows"], row["mAhr"], row["i_max_ua"]))
+
+    lines.append("</table></body></html>")
+
+    path = os.path.join(out_dir, "index.html")
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+    return path
+
+
+def main():
+    epilog = """
+    Usage examples:
+       python3 p1125_report.py -d ./logs
+       python3 p1125_report.py -d ./logs -o ./reports -j 4
+    """
+    parser = argparse.ArgumentParser(description='p1125 mAhr log HTML reports',
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=epilog)
+    parser.add_argument("-d", "--dir", dest="dir", action='store', required=True, help='directory of log files')
+    parser.add_argument("-o", "--out", dest="out", action='store', default=None,
+                        help='output directory, default <dir>/report')
+    parser.add_argument("-j", "--jobs", dest="jobs", action='store', type=int, default=os.cpu_count(),
+                        help='number of worker processes, default number of cores')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        logger.error("directory does not exist, {}".format(args.dir))
+        return False
+
+    out_dir = args.out or os.path.join(args.dir, "report")
+    os.makedirs(out_dir, exist_ok=True)
+
+    logs = find_logs(args.dir)
+    if not logs:
+        logger.error("no log files in {}".format(args.dir))
+        return False
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(render_report, path, out_dir): path for path in logs}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                row = future.result()
+
+            except Exception as e:
+                row = {"log": os.path.basename(path), "html": None, "error": str(e)}
+
+            if row["error"]: logger.error("{}: {}".format(row["log"], row["error"]))
+            else: logger.info("{} rendered in {:.1f} s".format(row["log"], row["render_s"]))
+            rows.append(row)
+
+    rows.sort(key=lambda r: r["log"])
+    index = write_index(rows, out_dir)
+    logger.info("{} logs in {:.1f} s with {} jobs, see {}".format(len(logs), time.perf_counter() - start, args.jobs, index))
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    if not success: logger.error("failed")
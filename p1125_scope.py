@@ -0,0 +1,522 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Scope (plot_data) capture helpers for the P1125.
+
+ScopeRing holds the last N captures in preallocated numpy storage, and
+ScopeCapture re-arms the P1125 (ACQUIRE_MODE_SINGLE) continuously, storing
+every capture in the ring,
+
+    ring = ScopeRing(P1125API.TBASE_SPAN_100MS, slots=16)
+    capture = ScopeCapture(p1125, ring)
+    capture.run(captures=100)
+    t, i = ring.latest()
+    logger.info(capture.stats())
+
+The P1125 timebase and trigger must already be set, see p1125_example_scope_continuous.py
+
+CaptureEnvelope accumulates the per sample min/max/mean/stdev envelope of
+repeated (usually triggered) captures, in fixed memory, and keeps the few
+captures that deviate most from the envelope,
+
+    envelope = CaptureEnvelope(ring.samples)
+    capture.run(captures=1000, duration_s=600, callback=lambda ring, slot: envelope.update(*ring.latest()))
+    data = envelope.result()  # {'t': ..., 'min': ..., 'max': ..., 'mean': ..., 'stdev': ...}
+
+See p1125_example_trigger_envelope.py
+
+autorange() chooses the shortest timebase span that contains the activity of
+interest, starting from a long span and refining from the captured waveform,
+
+    success, result = autorange(p1125)
+    logger.info(result)  # {'span': ..., 'extent_s': ..., 'captures': ..., 'elapsed_s': ...}
+
+wait_settled() replaces a fixed sleep after changing a load or VOUT, it returns
+as soon as short captures show the current has stabilized,
+
+    p1125.set_cal_load(loads=[P1125API.DEMO_CAL_LOAD_2K])
+    success, result = wait_settled(p1125, restore_span=SPAN)
+    logger.info(result)  # {'settled': ..., 'settle_s': ..., 'captures': ..., 'mean_ua': ...}
+
+Requirements:
+1) Python 3.6+ and numpy
+"""
+import time
+import numpy as np
+
+from P1125 import P1125API, StubLogger
+
+SAMPLE_RATE_HZ = 48000  # P1125 sampling rate, always 48kHz
+
+TBASE_SPAN_S = {  # P1125API.TBASE_SPAN_* to seconds
+    P1125API.TBASE_SPAN_10MS: 0.01,
+    P1125API.TBASE_SPAN_20MS: 0.02,
+    P1125API.TBASE_SPAN_50MS: 0.05,
+    P1125API.TBASE_SPAN_100MS: 0.1,
+    P1125API.TBASE_SPAN_200MS: 0.2,
+    P1125API.TBASE_SPAN_500MS: 0.5,
+    P1125API.TBASE_SPAN_1S: 1.0,
+    P1125API.TBASE_SPAN_2S: 2.0,
+    P1125API.TBASE_SPAN_5S: 5.0,
+    P1125API.TBASE_SPAN_10S: 10.0,
+}
+
+ACTIVITY_FRACTION = 0.1   # activity is above baseline + ACTIVITY_FRACTION * (peak - baseline)
+ACTIVITY_MIN_UA = 10.0    # peak - baseline below this is not activity, uA
+ACTIVITY_BASELINE_PERCENTILE = 5  # baseline current, percentile of the capture
+ACTIVITY_CLIP = 0.02      # activity within this fraction of the end of the capture may be cut off
+AUTORANGE_MARGIN = 1.25   # chosen span is at least this much longer than the activity
+
+SETTLE_SPAN = P1125API.TBASE_SPAN_10MS  # span of the settle captures
+SETTLE_TOLERANCE_UA = 0.5               # settled tolerance is max(SETTLE_TOLERANCE_UA, SETTLE_TOLERANCE_PERCENT)
+SETTLE_TOLERANCE_PERCENT = 1.0
+SETTLE_TIMEOUT_S = 2.0
+
+
+class ScopeRing(object):
+    """ Ring buffer of the last N scope captures
+
+    - storage is allocated once, slots x samples for 't' (mS) and 'i' (uA), float32
+    - the number of valid samples of each slot is in n[slot], samples beyond a
+      slot size are dropped (and counted in truncated)
+    """
+
+    def __init__(self, span: str, slots: int=16):
+        """
+        :param span: <one of P1125API.TBASE_SPAN_LIST>, sizes the slots
+        :param slots: number of captures kept
+        """
+        self.span = span
+        self.slots = slots
+        self.samples = int(round(SAMPLE_RATE_HZ * TBASE_SPAN_S[span]))
+        self.t = np.zeros((slots, self.samples), dtype=np.float32)
+        self.i = np.zeros((slots, self.samples), dtype=np.float32)
+        self.n = np.zeros(slots, dtype=np.intp)
+        self.timestamp = np.zeros(slots, dtype=np.float64)  # time.time() of each capture
+        self.count = 0      # captures stored since created
+        self.truncated = 0  # captures that did not fit in a slot
+
+    def store(self, capture: dict) -> int:
+        """ Store a capture in the next slot, overwriting the oldest
+
+        :param capture: dict from p1125.acquisition_get_data(), {'t': [...], 'i': [...], ...}
+        :return: slot
+        """
+        slot = self.count % self.slots
+        n = min(len(capture["i"]), self.samples)
+        if len(capture["i"]) > self.samples: self.truncated += 1
+
+        self.t[slot, :n] = capture["t"][:n]
+        self.i[slot, :n] = capture["i"][:n]
+        self.n[slot] = n
+        self.timestamp[slot] = time.time()
+        self.count += 1
+        return slot
+
+    def latest(self, age: int=0):
+        """ A capture, as views into the ring storage
+
+        :param age: 0 is the latest capture, 1 the one before, ...
+        :return: t, i (numpy views), None, None if there is no such capture
+        """
+        if age >= min(self.count, self.slots): return None, None
+        slot = (self.count - 1 - age) % self.slots
+        n = self.n[slot]
+        return self.t[slot, :n], self.i[slot, :n]
+
+
+class ScopeCapture(object):
+    """ Continuous scope capture into a ScopeRing
+
+    - the capture poll interval is applied to the p1125 instance
+      (DELAY_WAIT_ACQUISITION_POLL_S) only while P1125.acquisition_complete()
+      is polled, and restored afterwards
+    - the p1125 logger is replaced by a stub while polling, P1125.acquisition_complete()
+      logs every poll, which is about 50 lines a second at POLL_S
+    - a capture that does not trigger in time, or returns no data, is counted
+      as dropped, and the P1125 is re-armed, this is normal for a rare trigger
+    - nothing is allocated per capture, other than the response of the P1125
+    """
+
+    POLL_S = 0.02  # acquisition complete poll interval
+    POLL_LOGGER = StubLogger()  # p1125 logger while polling
+
+    def __init__(self, p1125, ring: ScopeRing, poll_s: float=POLL_S):
+        """
+        :param p1125: P1125 instance
+        :param ring: ScopeRing to store the captures in
+        :param poll_s: acquisition complete poll interval, seconds
+        """
+        self.p1125 = p1125
+        self.ring = ring
+        self.poll_s = poll_s
+        # wait at least two spans (pre/post trigger) plus a second, for the capture to complete
+        self.retries = int((2 * TBASE_SPAN_S[ring.span] + 1.0) / poll_s) + 2
+        self.reset_stats()
+
+    def reset_stats(self):
+        """ Clear the capture statistics
+
+        :return: None
+        """
+        self.captures = 0
+        self.dropped = 0
+        self._start = None
+        self._last = None
+        self._gap_count = 0      # time between captures, seconds
+        self._gap_sum = 0.0
+        self._gap_max = 0.0
+
+    def capture(self) -> (bool, int):
+        """ Arm the P1125, wait for the capture and store it
+
+        :return: success <True/False>, slot <int or None if the capture was dropped>
+        """
+        if self._start is None: self._start = time.perf_counter()
+
+        success, result = self.p1125.acquisition_start(mode=P1125API.ACQUIRE_MODE_SINGLE)
+        if not success: return False, None
+
+        poll_s, logger = self.p1125.DELAY_WAIT_ACQUISITION_POLL_S, self.p1125.logger
+        self.p1125.DELAY_WAIT_ACQUISITION_POLL_S, self.p1125.logger = self.poll_s, self.POLL_LOGGER
+        try:
+            triggered, result = self.p1125.acquisition_complete(retries=self.retries)
+        finally:
+            self.p1125.DELAY_WAIT_ACQUISITION_POLL_S, self.p1125.logger = poll_s, logger
+        if not triggered and "error" in result: logger.error("V1.acquire_is_triggered {}".format(result))
+
+        if triggered:
+            success, result = self.p1125.acquisition_get_data()
+            triggered = success and len(result.get("i", [])) > 0
+
+        if not triggered:
+            self.dropped += 1
+            self.p1125.acquisition_stop()
+            return True, None
+
+        slot = self.ring.store(result)
+        now = time.perf_counter()
+        if self._last is not None:
+            gap = now - self._last
+            self._gap_count += 1
+            self._gap_sum += gap
+            if gap > self._gap_max: self._gap_max = gap
+        self._last = now
+        self.captures += 1
+        return True, slot
+
+    def run(self, captures: int=None, duration_s: float=None, callback=None, max_attempts: int=None) -> bool:
+        """ Capture continuously
+
+        - with a rare trigger most attempts are dropped, bound the run with
+          duration_s or max_attempts as well as captures
+
+        :param captures: stop after this many stored captures, None for no limit
+        :param duration_s: stop after this many seconds, None for no limit
+        :param callback: called with (ring, slot) after every stored capture,
+                         return False from the callback to stop
+        :param max_attempts: stop after this many captures (stored + dropped), None for no limit
+        :return: success <True/False>
+        """
+        start = time.perf_counter()
+        attempts, stored = 0, 0
+        while (captures is None or stored < captures) and \
+              (max_attempts is None or attempts < max_attempts) and \
+              (duration_s is None or time.perf_counter() - start < duration_s):
+            attempts += 1
+            success, slot = self.capture()
+            if not success: return False
+            if slot is None: continue
+
+            stored += 1
+            if callback is not None and callback(self.ring, slot) is False: break
+
+        return True
+
+    def stats(self) -> dict:
+        """ Capture statistics
+
+        :return: {'captures': ..., 'dropped': ..., 'captures_per_s': ..., 'gap_avg_s': ..., 'gap_max_s': ...}
+        """
+        elapsed = (self._last - self._start) if self._last is not None else 0.0
+        return {
+            "captures": self.captures,
+            "dropped": self.dropped,
+            "truncated": self.ring.truncated,
+            "captures_per_s": self.captures / elapsed if elapsed > 0 else 0.0,
+            "gap_avg_s": self._gap_sum / self._gap_count if self._gap_count else None,
+            "gap_max_s": self._gap_max if self._gap_count else None,
+        }
+
+
+class CaptureEnvelope(object):
+    """ Per sample envelope of repeated captures
+
+    - captures are aligned by sample index, ie. relative to the trigger position
+    - memory is fixed by the number of samples and outliers, regardless of the
+      number of captures
+    - the outlier score of a capture is its largest deviation from the mean
+      envelope, in standard deviations, scored before the capture is added,
+      once OUTLIER_MIN_CAPTURES have been added
+    - the standard deviation of a sample is at least OUTLIER_STDEV_FLOOR times the
+      mean standard deviation of the capture, and OUTLIER_STDEV_MIN_UA, so samples
+      that have not varied yet, for example a clipped or zero current, do not
+      dominate the score
+    """
+
+    OUTLIERS = 8                  # number of outlier captures kept
+    OUTLIER_MIN_CAPTURES = 10     # captures needed before scoring outliers
+    OUTLIER_STDEV_FLOOR = 0.1     # per sample stdev floor, fraction of the mean stdev
+    OUTLIER_STDEV_MIN_UA = 0.01   # per sample stdev floor, uA
+
+    def __init__(self, samples: int, outliers: int=OUTLIERS):
+        """
+        :param samples: samples per capture, see ScopeRing.samples
+        :param outliers: number of outlier captures kept
+        """
+        self.samples = samples
+        self.count = 0                                     # captures added
+        self.t = np.zeros(samples, dtype=np.float64)      # time axis, from the longest capture
+        self._n = np.zeros(samples, dtype=np.int64)       # captures per sample
+        self.min = np.full(samples, np.inf)
+        self.max = np.full(samples, -np.inf)
+        self.mean = np.zeros(samples, dtype=np.float64)
+        self._m2 = np.zeros(samples, dtype=np.float64)
+
+        self.outlier_i = np.zeros((outliers, samples), dtype=np.float32)
+        self.outlier_n = np.zeros(outliers, dtype=np.intp)
+        self.outlier_score = np.full(outliers, -np.inf)
+        self.outlier_index = np.full(outliers, -1, dtype=np.int64)  # capture number
+
+    def update(self, t, i):
+        """ Add a capture
+
+        :param t: sample times, mS
+        :param i: current, uA
+        :return: outlier score of the capture
+        """
+        n = min(len(i), self.samples)
+        x = np.asarray(i[:n], dtype=np.float64)
+
+        score = 0.0
+        if self.count >= self.OUTLIER_MIN_CAPTURES:
+            stdev = np.sqrt(self._m2[:n] / np.maximum(self._n[:n], 1))
+            floor = max(self.OUTLIER_STDEV_FLOOR * float(stdev.mean()), self.OUTLIER_STDEV_MIN_UA)
+            score = float(np.max(np.abs(x - self.mean[:n]) / np.maximum(stdev, floor)))
+
+        new = self._n[:n] == 0  # samples not seen before, take their time from this capture
+        if new.any(): self.t[:n][new] = np.asarray(t[:n], dtype=np.float64)[new]
+
+        self._n[:n] += 1
+        delta = x - self.mean[:n]
+        self.mean[:n] += delta / self._n[:n]
+        self._m2[:n] += delta * (x - self.mean[:n])
+        np.minimum(self.min[:n], x, out=self.min[:n])
+        np.maximum(self.max[:n], x, out=self.max[:n])
+
+        worst = int(np.argmin(self.outlier_score))
+        if self.count >= self.OUTLIER_MIN_CAPTURES and score > self.outlier_score[worst]:
+            self.outlier_i[worst, :n] = x
+            self.outlier_n[worst] = n
+            self.outlier_score[worst] = score
+            self.outlier_index[worst] = self.count
+
+        self.count += 1
+        return score
+
+    def result(self) -> dict:
+        """ The envelope, for plotting with bokeh, samples not yet seen are NaN
+
+        :return: dict of numpy arrays {'t': <mS>, 'min': <uA>, 'max': <uA>, 'mean': <uA>, 'stdev': <uA>, 'count': <n>}
+        """
+        seen = self._n > 0
+        nan = np.where(seen, 0.0, np.nan)
+        return {
+            "t": self.t.copy(),
+            "min": np.where(seen, self.min, np.nan),
+            "max": np.where(seen, self.max, np.nan),
+            "mean": self.mean + nan,
+            "stdev": np.sqrt(self._m2 / np.maximum(self._n, 1)) + nan,
+            "count": self._n.copy(),
+        }
+
+    def outliers(self) -> list:
+        """ The outlier captures, highest score first
+
+        :return: list of dicts {'index': <capture number>, 'score': <stdevs>, 't': <mS>, 'i': <uA>}
+        """
+        result = []
+        for k in np.argsort(-self.outlier_score):
+            if self.outlier_index[k] < 0: continue
+            n = self.outlier_n[k]
+            result.append({"index": int(self.outlier_index[k]), "score": float(self.outlier_score[k]),
+                           "t": self.t[:n].copy(), "i": self.outlier_i[k, :n].copy()})
+
+        return result
+
+    def save(self, filename):
+        """ Save the envelope and outliers to a numpy .npz file
+
+        :param filename: file name
+        :return: None
+        """
+        outliers = self.outliers()
+        np.savez(filename, captures=self.count,
+                 outlier_index=np.array([o["index"] for o in outliers], dtype=np.int64),
+                 outlier_score=np.array([o["score"] for o in outliers]),
+                 outlier_i=self.outlier_i[np.argsort(-self.outlier_score)][:len(outliers)],
+                 **self.result())
+
+
+def activity_extent(t, i, fraction: float=ACTIVITY_FRACTION, min_ua: float=ACTIVITY_MIN_UA):
+    """ Extent of the activity in a capture
+
+    - the baseline is a low percentile of the current, activity is every sample above
+      baseline + fraction * (peak - baseline)
+
+    :param t: sample times, mS
+    :param i: current, uA
+    :param fraction: activity threshold, fraction of peak above baseline
+    :param min_ua: peak above baseline needed for any activity, uA
+    :return: extent <seconds, None if no activity>, clipped <True if the activity may continue past the capture>
+    """
+    i = np.asarray(i, dtype=np.float64)
+    if i.size < 2: return None, False
+
+    baseline = float(np.percentile(i, ACTIVITY_BASELINE_PERCENTILE))
+    peak = float(i.max())
+    if peak - baseline < min_ua: return None, False
+
+    active = np.flatnonzero(i > baseline + fraction * (peak - baseline))
+    t_first, t_last, t_end = float(t[active[0]]), float(t[active[-1]]), float(t[-1])
+    clipped = t_last >= t_end - ACTIVITY_CLIP * (t_end - float(t[0]))
+    return (t_last - t_first) / 1000.0 + 1.0 / SAMPLE_RATE_HZ, clipped
+
+
+def autorange(p1125, span: str=P1125API.TBASE_SPAN_10S, fraction: float=ACTIVITY_FRACTION,
+              min_ua: float=ACTIVITY_MIN_UA, margin: float=AUTORANGE_MARGIN, poll_s: float=ScopeCapture.POLL_S):
+    """ Choose the shortest timebase span that contains the activity
+
+    - a capture at span measures the activity extent, and the shortest span that
+      fits the extent (times margin) is captured to confirm it, usually 2 captures
+    - if the activity is cut off at the end of a capture, the next longer span is tried
+    - the trigger must already be set so that the activity is captured,
+      for example on TRIG_SRC_CUR with TRIG_POS_LEFT
+    - the P1125 is left set to the chosen span
+
+    :param p1125: P1125 instance
+    :param span: <one of P1125API.TBASE_SPAN_LIST>, the longest span considered, first capture
+    :param fraction: activity threshold, see activity_extent()
+    :param min_ua: minimum activity, see activity_extent()
+    :param margin: chosen span is at least margin times the activity extent
+    :param poll_s: acquisition complete poll interval, see ScopeCapture
+    :return: success <True/False>, result {'span': ..., 'extent_s': ..., 'captures': ..., 'elapsed_s': ...}
+    """
+    start = time.perf_counter()
+    spans = [s for s in P1125API.TBASE_SPAN_LIST if TBASE_SPAN_S[s] <= TBASE_SPAN_S[span]]
+    result = {"span": span, "extent_s": None, "captures": 0, "elapsed_s": 0.0}
+
+    floor = 0         # index into spans of the shortest span allowed, raised when activity is cut off
+    current = len(spans) - 1
+    for _ in range(2 * len(spans)):
+        success, _result = p1125.set_timebase(spans[current])
+        if not success: break
+
+        ring = ScopeRing(spans[current], slots=1)
+        success, slot = ScopeCapture(p1125, ring, poll_s=poll_s).capture()
+        result["captures"] += 1
+        if not success or slot is None:
+            success = False
+            break
+
+        extent, clipped = activity_extent(*ring.latest(), fraction=fraction, min_ua=min_ua)
+        result["span"], result["extent_s"] = spans[current], extent
+        if extent is None: break
+
+        if clipped and current < len(spans) - 1:
+            floor = current + 1
+            current += 1
+            continue
+
+        fits = [k for k in range(floor, len(spans)) if TBASE_SPAN_S[spans[k]] >= extent * margin]
+        chosen = fits[0] if fits else len(spans) - 1
+        if chosen == current: break
+        current = chosen
+
+    result["elapsed_s"] = time.perf_counter() - start
+    return success, result
+
+
+def wait_settled(p1125, tolerance_ua: float=SETTLE_TOLERANCE_UA, tolerance_percent: float=SETTLE_TOLERANCE_PERCENT,
+                 timeout_s: float=SETTLE_TIMEOUT_S, span: str=SETTLE_SPAN, restore_span: str=None,
+                 poll_s: float=ScopeCapture.POLL_S):
+    """ Wait for the current to settle
+
+    - short captures are taken until the mean current of the first and second half
+      of a capture, and the mean of two consecutive captures, agree within the
+      tolerance, or timeout_s has passed
+    - the trigger must be TRIG_SRC_NONE, so the captures are free running
+
+    :param p1125: P1125 instance
+    :param tolerance_ua: absolute tolerance, uA
+    :param tolerance_percent: tolerance as percent of the mean current, the larger tolerance is used
+    :param timeout_s: maximum time to wait, seconds
+    :param span: <one of P1125API.TBASE_SPAN_LIST>, span of the settle captures
+    :param restore_span: <one of P1125API.TBASE_SPAN_LIST>, timebase set when done, None to leave span set
+    :param poll_s: acquisition complete poll interval, see ScopeCapture
+    :return: success <True/False>, result {'settled': ..., 'settle_s': ..., 'captures': ..., 'mean_ua': ...}
+    """
+    start = time.perf_counter()
+    result = {"settled": False, "settle_s": 0.0, "captures": 0, "mean_ua": None}
+
+    success, _result = p1125.set_timebase(span)
+    if not success: return False, result
+
+    ring = ScopeRing(span, slots=1)
+    capture = ScopeCapture(p1125, ring, poll_s=poll_s)
+    previous = None
+    while time.perf_counter() - start < timeout_s:
+        success, slot = capture.capture()
+        result["captures"] += 1
+        if not success: break
+        if slot is None: continue
+
+        _t, i = ring.latest()
+        half = i.size // 2
+        first, second = float(i[:half].mean()), float(i[half:].mean())
+        mean = (first + second) / 2.0
+        tolerance = max(tolerance_ua, abs(mean) * tolerance_percent / 100.0)
+        result["mean_ua"] = mean
+        if abs(first - second) <= tolerance and previous is not None and abs(mean - previous) <= tolerance:
+            result["settled"] = True
+            break
+
+        previous = mean
+
+    result["settle_s"] = time.perf_counter() - start
+    if success and restore_span is not None:
+        success, _result = p1125.set_timebase(restore_span)
+
+    return success, result
@@ -0,0 +1,275 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Streaming statistics for P1125 current data.
+
+StreamStats accumulates count, mean, variance, min and max (Welford/Chan) and
+approximate percentiles over a stream of current samples, without keeping the
+samples.  Percentiles come from a fixed size log bucketed histogram, which is
+mergeable, so per window results can be combined into whole run results,
+
+    run_stats = StreamStats()
+    for every window:
+        window_stats = StreamStats()
+        window_stats.update(intcurr_result["plot"]["i"], weights=sample_durations(intcurr_result["plot"]["t"]))
+        run_stats.merge(window_stats)
+
+        logger.info(window_stats.result())
+
+    logger.info(run_stats.result())
+
+intcurr samples are not evenly spaced, weighting each sample by its duration
+(p1125_events.sample_durations()) makes the mean the time average current, as
+used for the mAhr, and the percentiles fractions of time rather than of samples.
+
+capture_stats() computes the statistics of a scope capture against an expected
+current, and the pass/fail of the error limits, for one capture or a batch of
+captures (2D array, one capture per row),
+
+    stats = capture_stats(result["i"], expected_ua=900.0)
+    stats = capture_stats(ring.i, expected_ua=900.0, n=ring.n)  # every capture in a ScopeRing
+
+Requirements:
+1) Python 3.6+ and numpy
+"""
+import math
+import numpy as np
+
+AVG_NUM_SAMPLES = 480     # samples for the average current, matches the mAhr timebase (10ms -> 480 samples)
+ERROR_AVG_UA = 0.5        # avg error absolute magnitude, limit is max(ERROR_AVG_UA, ERROR_AVG_PRCNT)
+ERROR_AVG_PRCNT = 5.0     # avg error percent of expected
+ERROR_SIGMA_UA = 1.0      # RMS (sigma) noise max absolute, limit is max(ERROR_SIGMA_UA, ERROR_SIGMA_PRCNT)
+ERROR_SIGMA_PRCNT = 2.0   # RMS (sigma) noise max percent of expected
+
+
+class StreamStats(object):
+    """ Single pass, fixed memory statistics over a stream of current samples (uA)
+
+    - memory is fixed by the histogram size, regardless of the number of samples
+    - samples can be weighted, for example by their duration, mean, stdev and
+      percentiles are then weighted, count is still the number of samples
+    - percentiles are approximate, relative error is about
+      +/- 0.5 * ln(10) / SKETCH_BINS_PER_DECADE (~1.2%)
+    - samples at or below SKETCH_MIN_UA (including zero/negative) are counted
+      in an underflow bin, samples above SKETCH_MAX_UA in an overflow bin
+    """
+
+    SKETCH_MIN_UA = 0.01           # smallest current resolved by the sketch, uA
+    SKETCH_MAX_UA = 2000000.0      # largest current resolved by the sketch, uA
+    SKETCH_BINS_PER_DECADE = 100
+
+    PERCENTILES = [("p50", 50.0), ("p99", 99.0), ("p999", 99.9)]
+
+    _LOG_MIN = math.log10(SKETCH_MIN_UA)
+    _NUM_BINS = int(math.ceil((math.log10(SKETCH_MAX_UA) - _LOG_MIN) * SKETCH_BINS_PER_DECADE))
+
+    def __init__(self):
+        # bin 0 is underflow, bin _NUM_BINS + 1 is overflow
+        self._bins = np.zeros(self._NUM_BINS + 2, dtype=np.float64)  # sum of the weights per bin
+        self.reset()
+
+    def reset(self):
+        """ Clear all accumulated statistics
+
+        :return: None
+        """
+        self._bins[:] = 0
+        self.count = 0
+        self.weight = 0.0   # sum of the weights, count if the samples are not weighted
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values, weights=None):
+        """ Add samples
+
+        :param values: list or numpy array of current samples, uA
+        :param weights: list or numpy array of sample weights, for example durations,
+                        see p1125_events.sample_durations(), None to weight every sample 1
+        :return: self
+        """
+        a = np.asarray(values, dtype=np.float64).ravel()
+        n = a.size
+        if n == 0: return self
+
+        w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+        weight = float(w.sum())
+        if weight <= 0: return self
+
+        mean = float(np.dot(w, a) / weight)
+        m2 = float(np.dot(w, np.square(a - mean)))
+        self._combine(n, weight, mean, m2, float(a.min()), float(a.max()))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            idx = np.floor((np.log10(a) - self._LOG_MIN) * self.SKETCH_BINS_PER_DECADE) + 1
+        idx = np.nan_to_num(idx, nan=0.0, neginf=0.0, posinf=self._NUM_BINS + 1)
+        idx = np.clip(idx, 0, self._NUM_BINS + 1).astype(np.intp)
+        self._bins += np.bincount(idx, weights=w, minlength=self._bins.size)
+        return self
+
+    def merge(self, other):
+        """ Merge another StreamStats into this one
+
+        :param other: StreamStats
+        :return: self
+        """
+        if other.count == 0: return self
+        self._combine(other.count, other.weight, other.mean, other._m2, other.min, other.max)
+        self._bins += other._bins
+        return self
+
+    def _combine(self, n, weight, mean, m2, _min, _max):
+        """ Chan et al. parallel form of Welford's update, weighted
+        """
+        total = self.weight + weight
+        delta = mean - self.mean
+        self.mean += delta * weight / total
+        self._m2 += m2 + delta * delta * self.weight * weight / total
+        self.weight = total
+        self.count += n
+        self.min = min(self.min, _min)
+        self.max = max(self.max, _max)
+
+    @property
+    def variance(self):
+        """ population variance, uA^2 """
+        if self.count == 0: return 0.0
+        return self._m2 / self.weight
+
+    @property
+    def stdev(self):
+        """ population standard deviation, uA """
+        return math.sqrt(self.variance)
+
+    def percentile(self, p: float) -> float:
+        """ Approximate percentile
+
+        :param p: percentile, 0-100
+        :return: current, uA, None if there are no samples
+        """
+        if self.count == 0: return None
+
+        # the smallest rank is the first non empty bin
+        rank = max(p / 100.0 * self.weight, np.finfo(np.float64).tiny)
+        idx = int(np.searchsorted(np.cumsum(self._bins), rank, side="left"))
+        if idx == 0: value = self.SKETCH_MIN_UA
+        elif idx > self._NUM_BINS: value = self.SKETCH_MAX_UA
+        else:  # geometric centre of the bucket
+            value = 10.0 ** (self._LOG_MIN + (idx - 0.5) / self.SKETCH_BINS_PER_DECADE)
+
+        return min(max(value, self.min), self.max)
+
+    def result(self) -> dict:
+        """ Statistics as a dict, suitable for logging/writing to a file
+
+        :return: {'count': ..., 'mean': ..., 'stdev': ..., 'min': ..., 'max': ..., 'p50': ..., 'p99': ..., 'p999': ...}
+        """
+        if self.count == 0:
+            d = {"count": 0, "mean": None, "stdev": None, "min": None, "max": None}
+
+        else:
+            d = {"count": self.count, "mean": self.mean, "stdev": self.stdev, "min": self.min, "max": self.max}
+
+        for name, p in self.PERCENTILES:
+            d[name] = self.percentile(p)
+
+        return d
+
+
+def capture_stats(i, expected_ua, n=None, avg_samples: int=AVG_NUM_SAMPLES,
+                  error_avg_ua: float=ERROR_AVG_UA, error_avg_percent: float=ERROR_AVG_PRCNT,
+                  error_sigma_ua: float=ERROR_SIGMA_UA, error_sigma_percent: float=ERROR_SIGMA_PRCNT) -> dict:
+    """ Statistics and pass/fail of scope captures against the expected current
+
+    - avg is the mean of the first avg_samples, sigma (RMS noise) is the
+      population standard deviation of the whole capture
+    - the avg error limit is max(error_avg_ua, error_avg_percent), and the sigma
+      limit max(error_sigma_ua, error_sigma_percent), both as percent of expected
+    - a capture fails on avg error first, then on sigma
+
+    :param i: current, uA, one capture (list or 1D array) or a batch (2D array, one capture per row)
+    :param expected_ua: expected current, uA, scalar or one per capture
+    :param n: valid samples per capture of a batch (see ScopeRing.n), None if all samples are valid
+    :param avg_samples: samples for the average
+    :param error_avg_ua: avg error limit, uA
+    :param error_avg_percent: avg error limit, percent of expected
+    :param error_sigma_ua: sigma limit, uA
+    :param error_sigma_percent: sigma limit, percent of expected
+    :return: dict, scalars for one capture, arrays for a batch,
+             {'samples', 'min', 'max', 'avg', 'mean', 'sigma', 'sigma_percent', 'peak_error_percent',
+              'avg_error_percent', 'avg_error_allowed_percent', 'sigma_error_allowed_percent',
+              'fail_avg', 'fail_sigma', 'passed'}
+    """
+    x = np.asarray(i, dtype=np.float64)
+    single = x.ndim == 1
+    x = np.atleast_2d(x)
+    captures, samples = x.shape
+    expected = np.broadcast_to(np.asarray(expected_ua, dtype=np.float64), (captures,))
+
+    count = np.full(captures, samples, dtype=np.intp) if n is None else np.minimum(np.asarray(n, dtype=np.intp), samples)
+    valid = None if n is None else np.arange(samples) < count[:, None]
+    count_avg = np.minimum(count, avg_samples)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if valid is None:
+            _min, _max = x.min(axis=1), x.max(axis=1)
+            total = x.sum(axis=1)
+            total_avg = x[:, :avg_samples].sum(axis=1)
+
+        else:
+            _min = np.where(valid, x, np.inf).min(axis=1)
+            _max = np.where(valid, x, -np.inf).max(axis=1)
+            x = np.where(valid, x, 0.0)
+            total = x.sum(axis=1)
+            total_avg = x[:, :avg_samples].sum(axis=1)
+
+        mean = total / count
+        deviation = x - mean[:, None]
+        if valid is not None: deviation[~valid] = 0.0
+        sigma = np.sqrt(np.einsum("ij,ij->i", deviation, deviation) / count)
+
+        avg = total_avg / count_avg
+        peak = np.maximum(np.abs(_max - expected), np.abs(_min - expected))
+        result = {
+            "samples": count,
+            "min": _min,
+            "max": _max,
+            "avg": avg,
+            "mean": mean,
+            "sigma": sigma,
+            "sigma_percent": sigma * 100.0 / expected,
+            "peak_error_percent": peak * 100.0 / expected,
+            "avg_error_percent": np.abs(avg - expected) * 100.0 / expected,
+            "avg_error_allowed_percent": np.maximum(error_avg_ua * 100.0 / expected, error_avg_percent),
+            "sigma_error_allowed_percent": np.maximum(error_sigma_ua * 100.0 / expected, error_sigma_percent),
+        }
+
+    result["fail_avg"] = result["avg_error_percent"] > result["avg_error_allowed_percent"]
+    result["fail_sigma"] = ~result["fail_avg"] & (result["sigma_percent"] > result["sigma_error_allowed_percent"])
+    result["passed"] = ~(result["fail_avg"] | result["fail_sigma"])
+
+    if single: return {key: value[0].item() for key, value in result.items()}
+    return result
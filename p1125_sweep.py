@@ -0,0 +1,263 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Calibration load sweep planning.
+
+plan_sweep() takes every (VOUT, load) combination, drops the points where the
+expected current is out of range, and orders the rest to minimize VOUT changes
+and relay switches,
+
+    points, summary = plan_sweep(VOUT, LOADS_TO_PLOT, span_s=0.5)
+    for point in points:
+        if point["clear_load"]: p1125.set_cal_load(loads=[P1125API.DEMO_CAL_LOAD_NONE])
+        if point["set_vout"]: p1125.set_vout(point["vout"])
+        if point["set_load"]: p1125.set_cal_load(loads=point["load"])
+        ... measure ...
+    logger.info(summary)  # {'points': ..., 'skipped': ..., 'vout_changes': ..., 'relay_switches': ..., 'estimate_s': ...}
+
+- VOUTs are swept in ascending order, and the loads of each VOUT are ordered
+  nearest first from the load left on by the previous VOUT, so the load is not
+  switched between VOUTs, the current steps up and down through the loads,
+  and the cal loads are not reset between points
+- the current of every intermediate state must stay below current_max_ua, the
+  previous load at the next VOUT, and the previous and next loads both
+  connected while the relays switch, otherwise the load is cleared first
+
+SweepCheckpoint saves every completed point to a JSON lines file, so an
+interrupted sweep can be resumed without measuring the completed points again,
+
+    checkpoint = SweepCheckpoint("p1125_<serial>.checkpoint", config)
+    done = checkpoint.load()  # points completed by a previous run with the same config
+    points, summary = plan_sweep(VOUT, LOADS_TO_PLOT, done=checkpoint.done)
+    for point in points:
+        ... measure ...
+        checkpoint.append(result)
+    checkpoint.remove()  # sweep complete
+
+See p1125_example_plot_cal_loads.py
+
+Requirements:
+1) Python 3.6+
+"""
+import os
+import json
+import math
+import hashlib
+
+from P1125 import P1125API
+
+# WARNING! Do not exceed 1100mA continuously or damage may occur!
+CURRENT_MIN_UA = 1.0
+CURRENT_MAX_UA = 1100000.0
+
+EST_POINT_S = 0.3          # per point overhead, acquisition round trips and processing, seconds
+EST_LOAD_SWITCH_S = 0.2    # settle after a load change, seconds
+EST_VOUT_CHANGE_S = 0.3    # settle after a VOUT change, seconds
+
+
+def _current_ua(vout, resistance):
+    return float(vout) / resistance * 1000.0
+
+
+def _switches(load_from, load_to):
+    """ Number of relays that change between two loads """
+    return len(set(load_from) ^ set(load_to))
+
+
+def point_key(vout, load) -> tuple:
+    """ Key of a sweep point, for SweepCheckpoint """
+    return int(vout), tuple(sorted(load))
+
+
+def plan_sweep(vouts: list, loads: list, current_min_ua: float=CURRENT_MIN_UA, current_max_ua: float=CURRENT_MAX_UA,
+               span_s: float=0.5, done: set=None):
+    """ Plan a calibration load sweep
+
+    :param vouts: list of VOUT, mV
+    :param loads: list of ([P1125API.DEMO_CAL_LOAD_*, ...], resistance), see LOADS_TO_PLOT
+    :param current_min_ua: points with expected current at or below are skipped
+    :param current_max_ua: points with expected current at or above are skipped, and the
+                           limit for intermediate states
+    :param span_s: capture span of each point, seconds, for the duration estimate
+    :param done: set of point_key() of points already measured, these are left out
+    :return: points, summary
+             points, list of dicts in sweep order,
+                {'vout': ..., 'load': [...], 'resistance': ..., 'expected_i_ua': ...,
+                 'clear_load': <set DEMO_CAL_LOAD_NONE first>, 'set_vout': ..., 'set_load': ...}
+             summary, {'points': ..., 'skipped': [(vout, resistance, expected_i_ua), ...],
+                       'vout_changes': ..., 'relay_switches': ..., 'estimate_s': ...}
+    """
+    summary = {"points": 0, "skipped": [], "vout_changes": 0, "relay_switches": 0, "estimate_s": 0.0}
+    points = []
+
+    state_vout, state_load, state_resistance = None, [], None
+    for vout in sorted(set(vouts)):
+        todo = []
+        for load, resistance in loads:
+            expected_i_ua = _current_ua(vout, resistance)
+            if not (current_min_ua < expected_i_ua < current_max_ua):
+                summary["skipped"].append((vout, resistance, expected_i_ua))
+                continue
+
+            if done and point_key(vout, load) in done: continue
+
+            todo.append((load, resistance, expected_i_ua))
+
+        while todo:
+            # nearest load first, the closest current breaks ties, so the current steps through the loads
+            state_i_ua = _current_ua(vout, state_resistance) if state_load else current_min_ua
+            k = min(range(len(todo)), key=lambda k: (_switches(state_load, todo[k][0]),
+                                                     abs(math.log(todo[k][2] / state_i_ua))))
+            load, resistance, expected_i_ua = todo.pop(k)
+
+            point = {"vout": vout, "load": load, "resistance": resistance, "expected_i_ua": expected_i_ua,
+                     "clear_load": False, "set_vout": vout != state_vout, "set_load": sorted(load) != sorted(state_load)}
+
+            # previous load at the new VOUT, and both loads on while the relays switch
+            if state_load and point["set_vout"] and _current_ua(vout, state_resistance) >= current_max_ua:
+                point["clear_load"] = True
+
+            elif state_load and point["set_load"] and \
+                    _current_ua(vout, state_resistance) + expected_i_ua >= current_max_ua:
+                point["clear_load"] = True
+
+            if point["clear_load"]:
+                summary["relay_switches"] += len(state_load)
+                state_load = []
+
+            if point["set_load"]:
+                summary["relay_switches"] += _switches(state_load, load)
+                summary["estimate_s"] += EST_LOAD_SWITCH_S
+
+            if point["set_vout"]:
+                summary["vout_changes"] += 1
+                summary["estimate_s"] += EST_VOUT_CHANGE_S
+
+            summary["estimate_s"] += EST_POINT_S + span_s
+            state_vout, state_load, state_resistance = vout, load, resistance
+            points.append(point)
+
+    summary["points"] = len(points)
+    return points, summary
+
+
+class SweepCheckpoint(object):
+    """ Completed sweep points, in a JSON lines file
+
+    - the first line is the sweep configuration, a checkpoint of a different
+      configuration is discarded
+    - each point is written as one line and fsync'ed, a partly written last line
+      (power loss) is ignored when the checkpoint is loaded
+    """
+
+    def __init__(self, path: str, config: dict):
+        """
+        :param path: checkpoint file
+        :param config: sweep configuration, must be JSON serializable, for example the
+                       unit serial, VOUT list, loads, span and limits
+        """
+        self.path = path
+        self.config_hash = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+        self.done = set()  # point_key() of the points in the checkpoint
+
+    def load(self) -> list:
+        """ Load the points of a previous run, and start the checkpoint
+
+        :return: list of point dicts, in the order measured, empty if there is no
+                 checkpoint or the configuration is different
+        """
+        points = []
+        try:
+            with open(self.path, "r") as f:
+                lines = f.read().splitlines()
+
+        except FileNotFoundError:
+            lines = []
+
+        try:
+            resume = bool(lines) and json.loads(lines[0]).get("config") == self.config_hash
+
+        except ValueError:
+            resume = False
+
+        if resume:
+            for line in lines[1:]:
+                try:
+                    record = json.loads(line)
+
+                except ValueError:
+                    break  # partly written
+
+                points.append(record["point"])
+                self.done.add(point_key(*record["key"]))
+
+        # rewrite, drops any partly written line and a checkpoint of another configuration
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps({"config": self.config_hash}) + "\n")
+            for point in points:
+                f.write(json.dumps({"key": [point["vout"], point["load"]], "point": point}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+        return points
+
+    def append(self, point: dict):
+        """ Save a completed point
+
+        :param point: dict of the point results, must include 'vout' and 'load', JSON serializable
+        :return: None
+        """
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": [point["vout"], point["load"]], "point": point}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.done.add(point_key(point["vout"], point["load"]))
+
+    def remove(self):
+        """ Remove the checkpoint, when the sweep is complete
+
+        :return: None
+        """
+        if os.path.exists(self.path): os.remove(self.path)
+
+
+if __name__ == "__main__":
+    VOUT = [1800, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 5500, 6000, 6500, 7000, 7500, 8000, 8200]
+    LOADS = [([P1125API.DEMO_CAL_LOAD_2M], 2000000.0),
+             ([P1125API.DEMO_CAL_LOAD_200K], 200000.0),
+             ([P1125API.DEMO_CAL_LOAD_20K], 20000.0),
+             ([P1125API.DEMO_CAL_LOAD_2K], 2000.0),
+             ([P1125API.DEMO_CAL_LOAD_200], 200.0),
+             ([P1125API.DEMO_CAL_LOAD_20], 20.0),
+             ([P1125API.DEMO_CAL_LOAD_8, P1125API.DEMO_CAL_LOAD_20], 8.0)]
+
+    points, summary = plan_sweep(VOUT, LOADS)
+    for point in points:
+        print("{clear_load:d} {set_vout:d} {set_load:d} {vout:5d} mV {resistance:10.1f} Ohms {expected_i_ua:10.1f} uA".format(**point))
+
+    print({key: value for key, value in summary.items() if key != "skipped"}, len(summary["skipped"]), "skipped")
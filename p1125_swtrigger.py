@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2020-2022 sistemicorp
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Software trigger on the Integrated Current (mAhr) stream.
+
+The P1125 hardware trigger (TRIG_SRC_*) only applies to scope captures.
+SoftwareTrigger applies a level trigger, with slope, hysteresis and holdoff,
+to the 10ms mAhr samples of successive intcurr_data() windows, and returns
+only the segments of data around each trigger, with pre and post trigger
+context that can span window boundaries,
+
+    trigger = SoftwareTrigger(level_ua=5000, pre_s=2.0, post_s=5.0)
+    for every window:
+        for segment in trigger.process(intcurr_result):
+            save(segment)  # {'t_trigger': [...], 't': [...], 'i': [...], 'i_max': [...]}
+
+    for segment in trigger.flush(): save(segment)
+
+Segment times are seconds since the first window, where each window is
+taken to follow the previous one.
+
+Requirements:
+1) Python 3.6+ and numpy
+"""
+import numpy as np
+
+from P1125 import P1125API
+
+PLOT_KEYS = ["t", "i", "i_max"]
+
+
+class SoftwareTrigger(object):
+    """ Level trigger over the mAhr stream
+
+    - TRIG_SLOPE_RISE triggers when the signal reaches level_ua after having been
+      below level_ua - hysteresis_ua, TRIG_SLOPE_FALL when it reaches level_ua after
+      having been above level_ua + hysteresis_ua, TRIG_SLOPE_EITHER on both
+    - triggers within holdoff_s of the previous trigger are ignored
+    - segments of overlapping triggers are merged into one segment
+    """
+
+    def __init__(self, level_ua: float, slope: str=P1125API.TRIG_SLOPE_RISE, hysteresis_ua: float=0.0,
+                 holdoff_s: float=0.0, pre_s: float=1.0, post_s: float=1.0, key: str="i_max"):
+        """
+        :param level_ua: trigger level, uA
+        :param slope: <P1125API.TRIG_SLOPE_*>
+        :param hysteresis_ua: hysteresis, uA
+        :param holdoff_s: minimum time between triggers, seconds
+        :param pre_s: data kept before each trigger, seconds
+        :param post_s: data kept after each trigger, seconds
+        :param key: plot key to trigger on, 'i_max' (peak) or 'i' (average)
+        """
+        if slope not in P1125API.TRIG_SLOPE_LIST: raise ValueError("invalid slope {}".format(slope))
+
+        self.level_ua = level_ua
+        self.slope = slope
+        self.hysteresis_ua = hysteresis_ua
+        self.holdoff_s = holdoff_s
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.key = key
+
+        self._state = {P1125API.TRIG_SLOPE_RISE: 0, P1125API.TRIG_SLOPE_FALL: 0}  # -1 armed, +1 past level, 0 unknown
+        self._offset_s = 0.0           # time of the start of the next window
+        self._last_trigger = -np.inf
+        self._last_t = -np.inf         # last sample time put in a segment
+        self._carry = None             # pre trigger context from previous windows
+        self._open = None              # segment waiting for post trigger data
+
+        self.triggers = 0              # triggers found
+        self.samples_in = 0            # samples processed
+        self.samples_out = 0           # samples in segments
+
+    def _edges(self, x, slope):
+        """ Hysteresis (Schmitt) edges, vectorized
+
+        :return: numpy bool array, True where the trigger fires
+        """
+        if slope == P1125API.TRIG_SLOPE_RISE:
+            past, armed = x >= self.level_ua, x < self.level_ua - self.hysteresis_ua
+
+        else:
+            past, armed = x <= self.level_ua, x > self.level_ua + self.hysteresis_ua
+
+        mark = np.where(past, 1, np.where(armed, -1, 0))
+        n = np.arange(x.size)
+        last = np.maximum.accumulate(np.where(mark != 0, n, -1))  # index of the latest mark, at or before each sample
+        before = np.concatenate(([-1], last[:-1]))
+        prev = np.where(before >= 0, mark[np.maximum(before, 0)], self._state[slope])
+
+        if x.size and last[-1] >= 0: self._state[slope] = int(mark[last[-1]])
+        return (mark == 1) & (prev == -1)
+
+    def _detect(self, t, x):
+        """ Trigger times of a window
+
+        :return: list of trigger times, seconds
+        """
+        if self.slope == P1125API.TRIG_SLOPE_EITHER:
+            fire = self._edges(x, P1125API.TRIG_SLOPE_RISE) | self._edges(x, P1125API.TRIG_SLOPE_FALL)
+
+        else:
+            fire = self._edges(x, self.slope)
+
+        triggers = []
+        for t_trigger in t[fire]:
+            if t_trigger - self._last_trigger < self.holdoff_s: continue
+            triggers.append(float(t_trigger))
+            self._last_trigger = t_trigger
+
+        self.triggers += len(triggers)
+        return triggers
+
+    def _emit(self, segment):
+        data = {key: np.concatenate([part[key] for part in segment["parts"]]) for key in PLOT_KEYS}
+        self.samples_out += data["t"].size
+        data["t_trigger"] = segment["t_trigger"]
+        return data
+
+    def process(self, intcurr_result: dict) -> list:
+        """ Process the next window
+
+        :param intcurr_result: dict from p1125.intcurr_data()
+        :return: list of completed segments, {'t_trigger': [...], 't': <array>, 'i': <array>, 'i_max': <array>}
+        """
+        plot = intcurr_result["plot"]
+        window = {key: np.asarray(plot.get(key, plot["i"]), dtype=np.float64) for key in PLOT_KEYS}
+        window["t"] = window["t"] + self._offset_s
+        self._offset_s += intcurr_result["time_s"]
+        self.samples_in += window["t"].size
+        if window["t"].size == 0: return []
+
+        triggers = self._detect(window["t"], window[self.key])
+
+        if self._carry is not None:
+            data = {key: np.concatenate((self._carry[key], window[key])) for key in PLOT_KEYS}
+
+        else:
+            data = window
+
+        # segments, merged where they overlap, an open segment from the previous window goes first
+        segments = [] if self._open is None else [self._open]
+        self._open = None
+        for t_trigger in triggers:
+            start, end = t_trigger - self.pre_s, t_trigger + self.post_s
+            if segments and start <= segments[-1]["end"]:
+                segments[-1]["end"] = max(segments[-1]["end"], end)
+                segments[-1]["t_trigger"].append(t_trigger)
+
+            else:
+                segments.append({"t_trigger": [t_trigger], "start": start, "end": end, "parts": []})
+
+        completed = []
+        t_end = window["t"][-1]
+        for segment in segments:
+            mask = (data["t"] >= segment["start"]) & (data["t"] <= segment["end"]) & (data["t"] > self._last_t)
+            if mask.any():
+                segment["parts"].append({key: data[key][mask] for key in PLOT_KEYS})
+                self._last_t = data["t"][mask][-1]
+
+            if segment["end"] > t_end: self._open = segment  # only the last segment can be open
+            elif segment["parts"]: completed.append(self._emit(segment))
+
+        keep = data["t"] >= t_end - self.pre_s
+        self._carry = {key: data[key][keep] for key in PLOT_KEYS}
+        return completed
+
+    def flush(self) -> list:
+        """ Complete any open segment, at the end of the run
+
+        :return: list of completed segments, see process()
+        """
+        segment, self._open = self._open, None
+        if segment is None or not segment["parts"]: return []
+        return [self._emit(segment)]
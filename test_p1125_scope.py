@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Tests for p1125_scope.py, run with
+
+    $python3 -m pytest test_p1125_scope.py
+
+A stand-in P1125 answers the JSON-RPC requests, no P1125 is needed.
+"""
+import numpy as np
+
+from P1125 import P1125, P1125API
+from p1125_scope import autorange, wait_settled, TBASE_SPAN_S, SAMPLE_RATE_HZ
+
+
+class StandInP1125(P1125):
+    """ P1125 that answers requests locally, captures are a 1 mA pulse over 5 ms on a 1 uA baseline """
+
+    def __init__(self):
+        super().__init__(url="http://stand-in/api/V1")
+        self.span = P1125API.TBASE_SPAN_100MS
+        self.capture = None
+
+    def _response(self, payload: dict) -> (bool, dict):
+        method, params = payload["method"], payload.get("params", {})
+        if method == "V1.timebase":
+            self.span = params["span"]
+        elif method == "V1.acquire_start":
+            n = int(TBASE_SPAN_S[self.span] * SAMPLE_RATE_HZ)
+            t = np.arange(n) * 1000.0 / SAMPLE_RATE_HZ
+            i = np.where(t < 5.0, 1000.0, 1.0)
+            self.capture = {"success": True, "t": t.tolist(), "i": i.tolist()}
+        elif method == "V1.acquire_is_triggered":
+            return True, {"success": True, "triggered": True}
+        elif method == "V1.plot_data":
+            return True, self.capture
+        return True, {"success": True}
+
+
+def test_autorange_keeps_poll_interval():
+    p1125 = StandInP1125()
+    success, result = autorange(p1125, span=P1125API.TBASE_SPAN_100MS, poll_s=0.001)
+    assert success
+    assert result["span"] == P1125API.TBASE_SPAN_10MS
+    assert p1125.DELAY_WAIT_ACQUISITION_POLL_S == P1125.DELAY_WAIT_ACQUISITION_POLL_S
+
+
+def test_wait_settled_keeps_poll_interval():
+    p1125 = StandInP1125()
+    p1125.DELAY_WAIT_ACQUISITION_POLL_S = 0.25
+    success, result = wait_settled(p1125, timeout_s=1.0, restore_span=P1125API.TBASE_SPAN_500MS, poll_s=0.001)
+    assert success
+    assert result["captures"] > 0
+    assert p1125.DELAY_WAIT_ACQUISITION_POLL_S == 0.25
+    assert p1125.span == P1125API.TBASE_SPAN_500MS
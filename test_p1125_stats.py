@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Tests for p1125_stats.py, run with
+
+    $python3 -m pytest test_p1125_stats.py
+
+Samples are synthetic, no P1125 is needed.
+"""
+import numpy as np
+
+from p1125_stats import StreamStats, capture_stats
+
+
+def samples(n=10000, seed=1125):
+    """ Log normal currents over several decades, like a sleeping/waking device, uA """
+    return np.random.default_rng(seed).lognormal(mean=3.0, sigma=2.0, size=n)
+
+
+def test_merge_matches_one_update():
+    i = samples()
+    whole = StreamStats().update(i)
+
+    merged = StreamStats()
+    for chunk in np.array_split(i, [1, 7, 3000, 3001, 9000]):
+        merged.merge(StreamStats().update(chunk))
+
+    assert merged.count == whole.count == i.size
+    assert np.isclose(merged.mean, whole.mean)
+    assert np.isclose(merged.stdev, whole.stdev)
+    assert merged.min == whole.min and merged.max == whole.max
+    for name, p in StreamStats.PERCENTILES:
+        assert merged.percentile(p) == whole.percentile(p)
+
+
+def test_unweighted_matches_numpy():
+    i = samples()
+    stats = StreamStats().update(i)
+    assert np.isclose(stats.mean, np.mean(i))
+    assert np.isclose(stats.stdev, np.std(i))
+    assert stats.min == i.min() and stats.max == i.max()
+
+    # within the width of a sketch bucket
+    for name, p in StreamStats.PERCENTILES:
+        assert np.isclose(stats.percentile(p), np.percentile(i, p), rtol=0.03)
+
+
+def test_weighted_merge():
+    i = samples()
+    w = np.random.default_rng(0).uniform(0.001, 0.02, size=i.size)  # sample durations, s
+    whole = StreamStats().update(i, weights=w)
+
+    merged = StreamStats()
+    for ic, wc in zip(np.array_split(i, 4), np.array_split(w, 4)):
+        merged.merge(StreamStats().update(ic, weights=wc))
+
+    mean = np.average(i, weights=w)
+    assert np.isclose(whole.mean, mean)
+    assert np.isclose(whole.stdev, np.sqrt(np.average(np.square(i - mean), weights=w)))
+    assert np.isclose(merged.mean, whole.mean)
+    assert np.isclose(merged.stdev, whole.stdev)
+    assert np.isclose(merged.weight, w.sum())
+    assert merged.count == i.size
+    for name, p in StreamStats.PERCENTILES:
+        assert merged.percentile(p) == whole.percentile(p)
+
+    # a long sample moves the time average, a count average would not see it
+    stats = StreamStats().update([10.0, 1000.0], weights=[0.99, 0.01])
+    assert np.isclose(stats.mean, 19.9)
+    assert stats.percentile(50) < 11.0
+
+
+def test_merge_empty():
+    stats = StreamStats().update(samples(n=100))
+    before = stats.result()
+
+    stats.merge(StreamStats())
+    stats.merge(StreamStats().update([]))
+    assert stats.result() == before
+
+    empty = StreamStats().merge(StreamStats())
+    assert empty.result()["count"] == 0
+    assert empty.result()["mean"] is None
+    assert empty.percentile(50) is None
+
+    empty.merge(stats)
+    assert empty.result() == before
+
+
+def test_capture_stats_batch_matches_single():
+    rng = np.random.default_rng(41)
+    expected = np.array([900.0, 900.0, 10.0, 10.0])
+    batch = expected[:, None] + rng.normal(0.0, [[1.0], [40.0], [0.1], [0.1]], size=(4, 600))
+    batch[3, :300] += 5.0  # avg error
+    n = np.array([600, 600, 450, 300])
+    batch[2, 450:] = 1e6   # past the valid samples, ignored
+
+    result = capture_stats(batch, expected, n=n)
+    for row in range(batch.shape[0]):
+        single = capture_stats(batch[row, :n[row]], expected[row])
+        for key, value in single.items():
+            assert np.isclose(result[key][row], value), key
+
+    assert result["passed"].tolist() == [True, False, True, False]
+    assert result["fail_sigma"][1] and result["fail_avg"][3]
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Tests for p1125_sweep.py, run with
+
+    $python3 -m pytest test_p1125_sweep.py
+
+The planned steps are replayed against a model of the load relays, no P1125 is needed.
+"""
+from P1125 import P1125API
+from p1125_sweep import plan_sweep, point_key, _current_ua
+
+VOUTS = [1800, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 5500, 6000, 6500, 7000, 7500, 8000, 8200]
+LOADS = [([P1125API.DEMO_CAL_LOAD_2M], 2000000.0),
+         ([P1125API.DEMO_CAL_LOAD_200K], 200000.0),
+         ([P1125API.DEMO_CAL_LOAD_20K], 20000.0),
+         ([P1125API.DEMO_CAL_LOAD_2K], 2000.0),
+         ([P1125API.DEMO_CAL_LOAD_200], 200.0),
+         ([P1125API.DEMO_CAL_LOAD_20], 20.0),
+         ([P1125API.DEMO_CAL_LOAD_8, P1125API.DEMO_CAL_LOAD_20], 8.0)]
+
+
+def replay(points):
+    """ Apply the steps as p1125_example_plot_cal_loads.py does, clear, VOUT, then load
+
+    :return: list of every current the P1125 sources, including the intermediate states, uA
+    """
+    currents = []
+    vout, load, resistance = None, [], None
+    for point in points:
+        if point["clear_load"]: load, resistance = [], None
+
+        if point["set_vout"]:
+            vout = point["vout"]
+            if load: currents.append(_current_ua(vout, resistance))  # previous load at the new VOUT
+
+        if point["set_load"]:
+            if load: currents.append(_current_ua(vout, resistance) + point["expected_i_ua"])  # both loads on
+            load, resistance = point["load"], point["resistance"]
+
+        assert vout == point["vout"]
+        assert sorted(load) == sorted(point["load"])
+        currents.append(_current_ua(vout, resistance))
+
+    return currents
+
+
+def test_no_state_reaches_the_limit():
+    for current_max_ua in [1100000.0, 500000.0, 300000.0, 100000.0]:
+        points, summary = plan_sweep(VOUTS, LOADS, current_max_ua=current_max_ua)
+        assert points
+        assert max(replay(points)) < current_max_ua
+
+
+def test_load_is_cleared_when_needed():
+    # at 5500 mV, 20 Ohms is 275 mA, switching to 200 Ohms would have both on, 302.5 mA
+    loads = [([P1125API.DEMO_CAL_LOAD_20], 20.0), ([P1125API.DEMO_CAL_LOAD_200], 200.0)]
+    points, summary = plan_sweep([5000, 5500], loads, current_max_ua=290000.0)
+    assert any(point["clear_load"] for point in points)
+    assert max(replay(points)) < 290000.0
+
+    # the model catches the state the clear avoids
+    unsafe = [dict(point, clear_load=False) for point in points]
+    assert max(replay(unsafe)) >= 290000.0
+
+
+def test_order():
+    points, summary = plan_sweep(VOUTS, LOADS)
+
+    # VOUTs ascending, each VOUT set once
+    vouts = [point["vout"] for point in points]
+    assert vouts == sorted(vouts)
+    assert sum(point["set_vout"] for point in points) == len(set(vouts)) == summary["vout_changes"]
+
+    # every point in range exactly once, the others skipped
+    keys = [point_key(point["vout"], point["load"]) for point in points]
+    assert len(keys) == len(set(keys)) == summary["points"]
+    for vout in VOUTS:
+        for load, resistance in LOADS:
+            in_range = 1.0 < _current_ua(vout, resistance) < 1100000.0
+            assert (point_key(vout, load) in keys) == in_range
+            assert any(s[:2] == (vout, resistance) for s in summary["skipped"]) != in_range
+
+    # the load is kept across a VOUT change, the first point of a VOUT uses the last load of the previous one
+    for previous, point in zip(points, points[1:]):
+        if point["set_vout"] and not point["clear_load"]:
+            assert point["load"] == previous["load"]
+            assert not point["set_load"]
+
+
+def test_done_points_left_out():
+    points, summary = plan_sweep(VOUTS, LOADS)
+    done = {point_key(point["vout"], point["load"]) for point in points[::2]}
+
+    remaining, summary = plan_sweep(VOUTS, LOADS, done=done)
+    assert len(remaining) == len(points) - len(done)
+    assert not done & {point_key(point["vout"], point["load"]) for point in remaining}
+    assert max(replay(remaining)) < 1100000.0
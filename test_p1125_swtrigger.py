@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Tests for p1125_swtrigger.py, run with
+
+    $python3 -m pytest test_p1125_swtrigger.py
+
+Windows are made up from a synthetic 10ms current stream, no P1125 is needed.
+"""
+import numpy as np
+
+from P1125 import P1125API
+from p1125_swtrigger import SoftwareTrigger
+
+DT_S = P1125API.MAHR_SAMPLE_TIME_S
+
+
+def stream(n=3000, pulses=(500, 1490, 1510, 2995), width=5, base_ua=10.0, pulse_ua=8000.0):
+    """ Current samples with pulses starting at the given sample indexes """
+    i = np.full(n, base_ua)
+    for start in pulses: i[start:start + width] = pulse_ua
+    return i
+
+
+def windows(i, sizes):
+    """ Split a stream into intcurr_data() like windows, times relative to each window """
+    result, start = [], 0
+    for size in sizes:
+        chunk = i[start:start + size]
+        t = np.arange(chunk.size) * DT_S
+        result.append({"time_s": chunk.size * DT_S, "plot": {"t": t, "i": chunk, "i_max": chunk}})
+        start += size
+    return result
+
+
+def run(trigger, window_list):
+    segments = []
+    for window in window_list: segments += trigger.process(window)
+    return segments + trigger.flush()
+
+
+def test_windows_match_one_window():
+    i = stream()
+    whole = run(SoftwareTrigger(level_ua=5000, pre_s=1.0, post_s=2.0), windows(i, [i.size]))
+
+    # pulses and their pre/post context cross the window boundaries
+    trigger = SoftwareTrigger(level_ua=5000, pre_s=1.0, post_s=2.0)
+    split = run(trigger, windows(i, [502, 1000, 7, 991, 500]))
+
+    assert trigger.triggers == 4
+    assert trigger.samples_in == i.size
+    assert len(split) == len(whole)
+    assert np.allclose(np.concatenate([s["t_trigger"] for s in split]), np.concatenate([s["t_trigger"] for s in whole]))
+    for a, b in zip(split, whole):
+        for key in ["t", "i", "i_max"]: assert np.allclose(a[key], b[key])
+
+    # overlapping triggers are one segment, samples are not repeated
+    assert len(split) == 3
+    t = np.concatenate([s["t"] for s in split])
+    assert np.all(np.diff(t) > 0)
+    assert trigger.samples_out == t.size
+
+
+def test_pre_trigger_context_from_previous_window():
+    i = stream(n=1000, pulses=[500])
+    trigger = SoftwareTrigger(level_ua=5000, pre_s=1.0, post_s=1.0)
+    segments = run(trigger, windows(i, [500, 500]))
+
+    assert len(segments) == 1
+    assert np.isclose(segments[0]["t_trigger"][0], 500 * DT_S)
+    assert np.isclose(segments[0]["t"][0], 400 * DT_S)
+    assert np.isclose(segments[0]["t"][-1], 600 * DT_S)
+
+
+def test_hysteresis_and_holdoff():
+    # jitter around the level, re-arms without hysteresis
+    i = np.tile([4990.0, 5010.0], 50)
+    trigger = SoftwareTrigger(level_ua=5000)
+    run(trigger, windows(i, [i.size]))
+    assert trigger.triggers == 50
+
+    trigger = SoftwareTrigger(level_ua=5000, hysteresis_ua=100)
+    run(trigger, windows(i, [i.size]))
+    assert trigger.triggers == 0  # never armed, never below level - hysteresis
+
+    trigger = SoftwareTrigger(level_ua=5000, holdoff_s=0.095)  # a trigger every 20ms, one in 5 kept
+    run(trigger, windows(i, [37, 63]))
+    assert trigger.triggers == 10
+
+
+def test_slope_state_carries_across_windows():
+    # the signal is above the level at the end of the first window, a fall trigger needs the state
+    i = np.concatenate([np.full(10, 10.0), np.full(20, 8000.0), np.full(10, 10.0)])
+    trigger = SoftwareTrigger(level_ua=5000, slope=P1125API.TRIG_SLOPE_FALL, pre_s=0.0, post_s=0.0)
+    segments = run(trigger, windows(i, [20, 20]))
+    assert trigger.triggers == 1
+    assert np.isclose(segments[0]["t_trigger"][0], 30 * DT_S)